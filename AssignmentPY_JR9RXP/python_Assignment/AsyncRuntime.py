@@ -0,0 +1,74 @@
+import asyncio
+import random
+
+POLLED_ATTRIBUTES = ("brightness", "temperature", "recording", "infrared")
+
+
+class AsyncRuntime:
+    """Drives an automation system as asyncio tasks: one rule loop plus one poll loop per device."""
+
+    def __init__(self, automation_system, rule_interval=5, seed=None):
+        """Create a runtime for the given automation system; nothing runs until run() is awaited."""
+        self.automation_system = automation_system
+        self.rule_interval = rule_interval
+        self.random = random.Random(seed)  # Staggers poll start times so devices don't poll in lockstep
+        self.polls = 0
+        self.changes = 0  # Polls that found the device changed since its previous poll
+        self.commands = 0
+        self._tasks = []
+
+    def submit(self, device_id, method_name, *args):
+        """Schedule a device command and return its task; commands to different devices overlap."""
+        device = self.automation_system.registry.get(device_id)
+        if device is None:
+            raise KeyError(f"Unknown device {device_id}.")
+        self.commands += 1
+        return asyncio.ensure_future(device.command_async(method_name, *args))
+
+    async def run(self, duration=None):
+        """Run the rule and poll tasks for duration seconds, or until cancelled."""
+        self._tasks = [asyncio.ensure_future(self._rule_loop())]
+        for device in list(self.automation_system.devices):
+            self._tasks.append(asyncio.ensure_future(self._poll_loop(device)))
+        try:
+            if duration is None:
+                await asyncio.gather(*self._tasks)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Cancel all running tasks and wait for them to finish."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _rule_loop(self):
+        # Periodic rule evaluation, the asyncio counterpart of main.run_simulation.
+        while True:
+            await asyncio.sleep(self.rule_interval)
+            self.automation_system.run_simulation()
+
+    async def _poll_loop(self, device):
+        # Polls one device at its class's interval; each poll pays the simulated read latency and
+        # reports the device only when its state differs from the previous poll, so an
+        # event-driven automation system re-evaluates its rules for real changes only.
+        interval = type(device).POLL_INTERVAL
+        await asyncio.sleep(self.random.uniform(0, interval))
+        last_state = None
+        while True:
+            await asyncio.sleep(device.IO_LATENCY)
+            self.polls += 1
+            state = polled_state(device)
+            if last_state is not None and state != last_state:
+                self.changes += 1
+                self.automation_system.device_changed(device)
+            last_state = state
+            await asyncio.sleep(interval)
+
+
+def polled_state(device):
+    """Return the state a poll reads from a device: its status and whichever attributes it has."""
+    return (device.status,) + tuple(getattr(device, name, None) for name in POLLED_ATTRIBUTES)
@@ -1,6 +1,15 @@
+import threading
+from contextlib import contextmanager
 from SmartLight import SmartLight
 from Thermostat import Thermostat
 from SecurityCamera import SecurityCamera
+from DeviceRegistry import DeviceRegistry
+from RuleEngine import DEFAULT_RULES, RuleEngine
+from EventLog import get_log
+from Metrics import nested_commands, timed
+
+# The automation rules _run_vectorized_simulation implements as column operations
+VECTORIZED_RULES = [definition for definition in DEFAULT_RULES if "automation" in definition["groups"]]
 
 # Custom exception class for automation system errors
 class AutomationError(Exception):
@@ -8,87 +17,265 @@ class AutomationError(Exception):
     pass
 
 class AutomationSystem:
-    def __init__(self):
+    def __init__(self, store=None, rules=DEFAULT_RULES):
         # Constructor for the AutomationSystem class.
-        # It initializes an empty list to store devices.
-        self.devices = []
+        # It initializes an empty registry that indexes devices by id, type and status, and
+        # compiles the declarative rule definitions into a rule engine over that registry.
+        # An optional FleetStore holds the state of the devices made by create_device in columns,
+        # and lets run_simulation evaluate the default rules as vectorized operations.
+        self.registry = DeviceRegistry()
+        self.rules = RuleEngine(self.registry, rules)
+        self.store = store
+        self._unstored_devices = 0  # Registered devices the store does not hold
+        # Held by device commands, rule ticks and registry changes, so commands that a
+        # CommandDispatcher runs on pool threads never interleave with the owning thread.
+        self.lock = threading.RLock()
+        # Set by CommandDispatcher.attach: slow camera commands then run on its thread pool.
+        self.dispatcher = None
+        # Set by ThermalModel.attach: thermostats then report their room's simulated temperature.
+        self.thermal_model = None
+        # Event-driven mode state: devices waiting to be evaluated.
+        self.event_driven = False
+        self._pending_changes = {}
+        self._dispatching = False
+        # Batch state: nesting depth and whether a recording check was requested meanwhile.
+        self._batch_depth = 0
+        self._recording_check_pending = False
+        # Callables notified with every device that reports a state change (e.g. the GUI).
+        self._change_listeners = []
+        # Callables notified at the start of every run_simulation tick (e.g. a trace recorder).
+        self._tick_listeners = []
+
+    @property
+    def devices(self):
+        # All registered devices, in the order they were added.
+        return self.registry.all()
+
+    def create_device(self, device_class, device_id):
+        # Creates an unregistered device; with a store, its state lives in the store's columns.
+        if self.store is None:
+            return device_class(device_id, self)
+        return self.store.create(device_class, device_id, self)
 
     def add_device(self, device):
         # Adds a device to the automation system.
         if not hasattr(device, 'device_id'):
             raise AutomationError("Device must have a 'device_id' attribute.")
-        self.devices.append(device)
-        print(f"Device {device.device_id} added to the automation system.")
+        if device.device_id in self.registry:
+            raise AutomationError(f"Device {device.device_id} is already registered.")
         device.automation_system = self
+        with self.lock:
+            self.registry.add(device)
+            self._register_in_store([device])
+            self.rules.device_added(device)
+        get_log().info("AutomationSystem", "Device {} added to the automation system.", device.device_id)
+
+    def add_devices(self, devices):
+        # Adds many devices at once: they are validated together and indexed in bulk, with
+        # one log message for the whole batch.
+        devices = list(devices)
+        ids = set()
+        for device in devices:
+            if not hasattr(device, 'device_id'):
+                raise AutomationError("Device must have a 'device_id' attribute.")
+            if device.device_id in ids or device.device_id in self.registry:
+                raise AutomationError(f"Device {device.device_id} is already registered.")
+            ids.add(device.device_id)
+        for device in devices:
+            device.automation_system = self
+        with self.lock:
+            self.registry.add_many(devices)
+            self._register_in_store(devices)
+            self.rules.devices_added(devices)
+        get_log().info("AutomationSystem", "{} devices added to the automation system.", len(devices))
+
+    def _register_in_store(self, devices):
+        # Store rows only count in the vectorized rules once their device is registered, so a
+        # device that fails to register never shows up in them.
+        if self.store is not None:
+            for device in devices:
+                if not self.store.register(device):
+                    self._unstored_devices += 1
+
+    def device_status_changed(self, device, old_status):
+        # Called by devices whenever their status changes, keeps the status indexes current.
+        self.registry.update_status(device, old_status)
+
+    def enable_event_driven(self):
+        # Switches from polling to event-driven mode: rules are re-evaluated only for devices
+        # that report a change through device_changed, so an idle home costs nothing.
+        self.event_driven = True
+        self.rules.reset()
+        for device in list(self.devices):
+            self.device_changed(device)
+
+    def add_change_listener(self, listener):
+        # Registers listener(device) to be called whenever a registered device changes state.
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        # Stops notifying a listener added with add_change_listener.
+        self._change_listeners.remove(listener)
+
+    def add_tick_listener(self, listener):
+        # Registers listener() to be called at the start of every run_simulation tick.
+        self._tick_listeners.append(listener)
+
+    def remove_tick_listener(self, listener):
+        # Stops notifying a listener added with add_tick_listener.
+        self._tick_listeners.remove(listener)
+
+    def device_changed(self, device):
+        # Called by devices after every state update. The rule conditions on the device's type
+        # are updated and listeners notified first; in event-driven mode, changes raised while
+        # rules are running are queued and handled in the same dispatch loop instead of recursing.
+        if self.registry.get(device.device_id) is not device:
+            return
+        with self.lock:
+            self.rules.device_changed(device)
+            for listener in self._change_listeners:
+                listener(device)
+            if not self.event_driven:
+                return
+            self._pending_changes[device.device_id] = device
+            if not self._dispatching and not self._batch_depth:
+                self._dispatch_pending_changes()
+
+    def _dispatch_pending_changes(self):
+        # Evaluates rules for queued device changes until no more changes are raised.
+        self._dispatching = True
+        try:
+            while self._pending_changes:
+                changed = self._pending_changes.pop(next(iter(self._pending_changes)))
+                try:
+                    self.rules.react(changed)
+                except AutomationError as e:
+                    get_log().error("AutomationSystem", "Error during event handling: {}", e)
+        finally:
+            self._dispatching = False
+
+    @contextmanager
+    def batch(self):
+        # Applies many device commands as one unit: recording checks and change events raised
+        # inside the block are deferred and run once when the outermost batch exits.
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._commit_batch()
+
+    def apply_bulk(self, commands):
+        # Runs (device_id, method_name, *args) commands inside a single batch.
+        with self.batch():
+            for device_id, method_name, *args in commands:
+                device = self.registry.get(device_id)
+                if device is None:
+                    raise AutomationError(f"Unknown device {device_id}.")
+                getattr(device, method_name)(*args)
+
+    def _commit_batch(self):
+        # Runs the work deferred by batch(): one recording check, then the queued change events.
+        if self._recording_check_pending:
+            self._recording_check_pending = False
+            self.check_and_start_recording()
+        if self._pending_changes and not self._dispatching:
+            self._dispatch_pending_changes()
 
     def discover_devices(self):
         # Discovers and prints information about devices in the automation system.
-        print("Discovering devices...")
+        log = get_log()
+        log.info("AutomationSystem", "Discovering devices...")
         for device in self.devices:
-            print(f"Device ID: {device.device_id}, Type: {type(device).__name__}")
+            log.info("AutomationSystem", "Device ID: {}, Type: {}", device.device_id, type(device).__name__)
 
+    @timed("automation_tick_seconds", "Duration of one run_simulation tick")
     def run_simulation(self):
         # Runs the simulation for the automation system.
-        print("Running simulation...")
-        for device in self.devices:
+        # Every rule whose conditions hold runs its action once per tick; whether a rule holds
+        # is known from the rule engine's conditions without scanning the devices.
+        # Device commands issued by the rules are part of the tick, not inputs of their own.
+        get_log().info("AutomationSystem", "Running simulation...")
+        with self.lock, nested_commands():
+            for listener in self._tick_listeners:
+                listener()
+            if self._can_vectorize():
+                self._run_vectorized_simulation()
+                return
             try:
-                self._process_device_actions(device)
+                self.rules.evaluate()
             except AutomationError as e:
-                print(f"Error during simulation: {e}")
+                get_log().error("AutomationSystem", "Error during simulation: {}", e)
+
+    def _can_vectorize(self):
+        # The column operations only stand in for the default automation rules, and only see
+        # devices that live in the store.
+        return (self.store is not None and not self._unstored_devices
+                and self.rules.group_definitions() == VECTORIZED_RULES)
+
+    def _run_vectorized_simulation(self):
+        # Same rules as run_simulation, evaluated over the store's columns; the rule actions only
+        # go to the cameras that actually need to change, through the rule engine's dispatch.
+        try:
+            if self.store.any_dim_light_on():
+                self.rules.fire("dim_light_infrared", self.store.cameras_on_without("infrared"))
+            if self.store.recording_condition():
+                self.rules.fire("idle_home_recording", self.store.cameras_on_without("recording"))
+        except AutomationError as e:
+            get_log().error("AutomationSystem", "Error during simulation: {}", e)
 
     def _process_device_actions(self, device):
-        # Processes actions for different types of devices.
-        if isinstance(device, SmartLight) and device.status == "on":
-            self._handle_smart_light_actions(device)
-        elif isinstance(device, Thermostat) and device.status == "off":
-            self._handle_thermostat_actions()
-
-    def _handle_smart_light_actions(self, light):
-        # Handles actions for smart lights.
-        if light.brightness < 50:
-            self._activate_camera_infrared()
-
-    def _handle_thermostat_actions(self):
-        # Handles actions for thermostats.
-        if self._are_all_lights_off():
-            self._start_camera_recording()
+        # Processes the rules that involve the device's type.
+        self.rules.evaluate_device(device)
 
     def _are_all_lights_off(self):
         # Checks if all smart lights are off.
-        return all(isinstance(device, SmartLight) and device.status == "off" for device in self.devices)
-
-    def _start_camera_recording(self):
-        # Starts recording for security cameras that are on.
-        for cam in filter(lambda d: isinstance(d, SecurityCamera) and d.status == "on", self.devices):
-            cam.start_recording()
+        return self.registry.all_have_status(SmartLight, "off")
 
-    def _activate_camera_infrared(self):
-        # Activates infrared mode for security cameras.
-        for cam in filter(lambda d: isinstance(d, SecurityCamera), self.devices):
-            cam.enable_infrared()
+    def sync_camera_infrared(self):
+        # Interactive infrared rules used by the GUI: while any light is on, cameras that are on
+        # use infrared if one of those lights is below 50% brightness and switch it off otherwise.
+        self.rules.evaluate("interactive")
 
+    @timed("automation_rule_seconds", "Duration of automation rule evaluations", rule="check_and_start_recording")
     def check_and_start_recording(self):
         # Checks conditions and starts camera recording if met.
+        if self._batch_depth:
+            self._recording_check_pending = True
+            return
         try:
             if self._are_all_lights_off() and self._are_all_thermostats_off():
                 self._start_camera_recording_and_turn_on()
             else:
-                print("Not all lights and thermostats are off.")
+                get_log().info("AutomationSystem", "Not all lights and thermostats are off.")
         except AutomationError as e:
-            print(f"Error when checking conditions: {e}")
+            get_log().error("AutomationSystem", "Error when checking conditions: {}", e)
 
     def _are_all_thermostats_off(self):
         # Checks if all thermostats are off.
-        return all(isinstance(device, Thermostat) and device.status == "off" for device in self.devices)
+        return self.registry.all_have_status(Thermostat, "off")
 
     def _start_camera_recording_and_turn_on(self):
-        # Starts camera recording and turns on cameras.
-        print("Checking conditions...")
-        for cam in filter(lambda d: isinstance(d, SecurityCamera), self.devices):
+        # Starts camera recording and turns on cameras. With a dispatcher the commands are queued
+        # per camera, so all cameras switch in parallel and each one still turns on before it
+        # records; the futures are returned without waiting for them.
+        get_log().info("AutomationSystem", "Checking conditions...")
+        futures = []
+        for cam in list(self.registry.of_type(SecurityCamera)):
             if cam.status == "off":
-                print(f"Turning on Camera {cam.device_id}...")
-                cam.turn_on()
+                get_log().info("AutomationSystem", "Turning on Camera {}...", cam.device_id)
+                futures.append(self._command(cam, "turn_on"))
             if not cam.recording:
-                print(f"Starting recording for Camera {cam.device_id}...")
-                cam.start_recording()
-            cam.status_var.set(f"Status: {cam.status}, Recording: {cam.recording}, Infrared: {cam.infrared}")
+                get_log().info("AutomationSystem", "Starting recording for Camera {}...", cam.device_id)
+                futures.append(self._command(cam, "start_recording"))
+        return [future for future in futures if future is not None]
+
+    def _command(self, device, method_name, *args):
+        # Runs a device command directly, or queues it on the dispatcher and returns its future.
+        if self.dispatcher is None:
+            getattr(device, method_name)(*args)
+            return None
+        future = self.dispatcher.submit(device, method_name, *args)
+        future.add_done_callback(self.dispatcher.log_failure)
+        return future
@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+from EventLog import get_log
+
+# Immutable copy of a device's state, safe to hand to another thread; unused fields are None
+DeviceSnapshot = namedtuple("DeviceSnapshot", "device_id device_type status brightness temperature recording infrared")
+
+
+def snapshot_device(device):
+    """Capture the current state of a device as a DeviceSnapshot."""
+    status = str(device.status)
+    if isinstance(device, SmartLight):
+        return DeviceSnapshot(device.device_id, "SmartLight", status, device.brightness, None, None, None)
+    if isinstance(device, Thermostat):
+        return DeviceSnapshot(device.device_id, "Thermostat", status, None, device.temperature, None, None)
+    if isinstance(device, SecurityCamera):
+        return DeviceSnapshot(device.device_id, "SecurityCamera", status, None, None, device.recording, device.infrared)
+    return DeviceSnapshot(device.device_id, type(device).__name__, status, None, None, None, None)
+
+
+class AutomationWorker(threading.Thread):
+    """Runs an automation system on its own thread, fed by a command queue.
+
+    Commands are callables taking the automation system. After each burst of commands the
+    worker puts a list of snapshots of the devices that changed on the result queue, which
+    the GUI drains on its own thread, so device objects are never touched from both threads.
+    """
+
+    def __init__(self, automation_system, rule_interval=None):
+        """Create the worker; rule_interval, if given, also runs run_simulation periodically."""
+        super().__init__(name="AutomationWorker", daemon=True)
+        self.automation_system = automation_system
+        self.rule_interval = rule_interval
+        self.commands = queue.Queue()
+        self.results = queue.Queue()
+        self._changed = {}  # device_id -> device changed since the last published snapshot
+        self._stopped = threading.Event()
+
+    def submit(self, command):
+        """Queue a callable to run on the worker thread with the automation system as argument."""
+        self.commands.put(command)
+
+    def submit_command(self, device_id, method_name, *args):
+        """Queue a device method call by device id."""
+        self.submit(lambda system: getattr(system.registry.get(device_id), method_name)(*args))
+
+    def stop(self):
+        """Ask the worker to finish after the current command."""
+        self._stopped.set()
+        self.commands.put(None)  # Wake the worker if it is waiting for a command
+
+    def run(self):
+        """Worker loop: run queued commands, optional rule ticks, then publish changed snapshots."""
+        system = self.automation_system
+        system.add_change_listener(self._on_device_changed)
+        self.results.put([snapshot_device(device) for device in system.devices])
+        next_tick = time.monotonic() + self.rule_interval if self.rule_interval else None
+        try:
+            while not self._stopped.is_set():
+                timeout = max(0, next_tick - time.monotonic()) if next_tick else None
+                try:
+                    command = self.commands.get(timeout=timeout)
+                    while command is not None:
+                        self._run_command(command)
+                        command = self.commands.get_nowait()  # Drain the burst before publishing
+                except queue.Empty:
+                    pass
+                if next_tick and time.monotonic() >= next_tick:
+                    self._run_command(lambda system: system.run_simulation())
+                    next_tick = time.monotonic() + self.rule_interval
+                self._publish_changes()
+        finally:
+            system.remove_change_listener(self._on_device_changed)
+
+    def _run_command(self, command):
+        # Errors in one command are logged and never stop the worker.
+        try:
+            command(self.automation_system)
+        except Exception as e:
+            get_log().error("AutomationWorker", "Error running command: {}", e)
+
+    def _on_device_changed(self, device):
+        self._changed[device.device_id] = device
+
+    def _publish_changes(self):
+        # Applies the interactive infrared rule if a light or camera changed, then sends
+        # snapshots of everything that changed as one result. The rule is guarded like a
+        # command, so an error in it is logged instead of ending the worker.
+        if any(isinstance(device, (SmartLight, SecurityCamera)) for device in self._changed.values()):
+            self._run_command(lambda system: system.sync_camera_infrared())
+        if self._changed:
+            changed, self._changed = self._changed, {}
+            self.results.put([snapshot_device(device) for device in changed.values()])
@@ -0,0 +1,114 @@
+from DeviceStatus import DeviceStatus
+from EventLog import get_log
+from FleetLoader import create_device, describe_device
+from MessageBus import command_topic, state_topic
+from RuleEngine import call_device
+from SecurityCamera import SecurityCamera
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+
+# The only methods a command message may call, per device type
+DEVICE_COMMANDS = {
+    SmartLight: frozenset({"turn_on", "turn_off", "adjust_brightness", "set_brightness", "detect_motion",
+                           "toggle_light"}),
+    Thermostat: frozenset({"turn_on", "turn_off", "toggle_thermostat", "set_temperature"}),
+    SecurityCamera: frozenset({"turn_on", "turn_off", "toggle_camera", "toggle_recording", "start_recording",
+                               "stop_recording", "enable_infrared", "disable_infrared", "detect_motion"}),
+}
+
+
+class DeviceEndpoint:
+    """Connects the devices of an automation system to a message bus.
+
+    Every state change the devices report is published on home/<id>/state, and commands arriving
+    on home/<id>/command are run on the device if they name one of its DEVICE_COMMANDS. The process
+    hosting the devices needs no rules; a BusController elsewhere runs them.
+    """
+
+    def __init__(self, automation_system, bus):
+        self.automation_system = automation_system
+        self.bus = bus
+        self._token = None
+
+    def attach(self):
+        """Start accepting commands, then publish every device's current state and later changes."""
+        self._token = self.bus.subscribe(command_topic("+"), self._on_command)
+        for device in self.automation_system.devices:
+            self.publish(device)
+        self.automation_system.add_change_listener(self.publish)
+        return self
+
+    def detach(self):
+        """Stop publishing changes and accepting commands."""
+        self.automation_system.remove_change_listener(self.publish)
+        if self._token is not None:
+            self.bus.unsubscribe(self._token)
+            self._token = None
+
+    def publish(self, device):
+        """Change listener: publish the device's full state."""
+        self.bus.publish(state_topic(device.device_id), describe_device(device))
+
+    def _on_command(self, topic, message):
+        device_id = topic.split("/")[1]
+        device = self.automation_system.registry.get(device_id)
+        if device is None:
+            get_log().warning("DeviceEndpoint", "Command for unknown device {} ignored.", device_id)
+            return
+        call = message.get("call")
+        args = message.get("args", [])
+        if call not in DEVICE_COMMANDS.get(type(device), ()) or not isinstance(args, list):
+            get_log().error("DeviceEndpoint", "Rejected command {!r} with args {!r} for {}.", call, args, device_id)
+            return
+        getattr(device, call)(*args)
+
+
+class BusController:
+    """Runs an automation system's rules over devices that live behind a message bus.
+
+    State messages are mirrored into local device objects, created on first sight, and the mirror
+    reports each change to the automation system so its rules and listeners react. Rule actions
+    are published as commands instead of being called on the mirror, which is updated when the
+    device's new state comes back. With a SocketBus, create it with threaded=False and call
+    bus.deliver() from the thread that owns the automation system.
+    """
+
+    def __init__(self, automation_system, bus):
+        self.automation_system = automation_system
+        self.bus = bus
+        self._token = None
+
+    def attach(self):
+        """Subscribe to device state and route rule actions to the bus."""
+        self.automation_system.rules.dispatch = self.send_command
+        self._token = self.bus.subscribe(state_topic("+"), self._on_state)
+        return self
+
+    def detach(self):
+        """Stop mirroring state; rule actions are called on the local devices again."""
+        self.automation_system.rules.dispatch = call_device
+        if self._token is not None:
+            self.bus.unsubscribe(self._token)
+            self._token = None
+
+    def send_command(self, device, call, args=()):
+        """Ask a device to run a command."""
+        self.bus.publish(command_topic(device.device_id), {"call": call, "args": list(args)})
+
+    def _on_state(self, topic, message):
+        system = self.automation_system
+        device = system.registry.get(message["id"])
+        if device is None:
+            device = create_device(message, system)
+            system.add_device(device)
+        else:
+            # The status setter keeps the registry's status index current
+            device.status = DeviceStatus(message["status"])
+            if isinstance(device, SmartLight):
+                device.brightness = message["brightness"]
+            elif isinstance(device, Thermostat):
+                device.temperature = message["temperature"]
+            else:
+                device.recording = message["recording"]
+                device.infrared = message["infrared"]
+        system.device_changed(device)
@@ -0,0 +1,49 @@
+import time
+
+
+class WallClock:
+    """Clock backed by real time."""
+
+    def now(self):
+        """Return the current time as a Unix timestamp."""
+        return time.time()
+
+    def sleep(self, seconds):
+        """Block for the given number of seconds."""
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Clock that only moves when a simulator advances it."""
+
+    def __init__(self, start=None):
+        """Start at the given Unix timestamp, or at the current real time."""
+        self._now = time.time() if start is None else start
+
+    def now(self):
+        """Return the current virtual time as a Unix timestamp."""
+        return self._now
+
+    def sleep(self, seconds):
+        """Advance virtual time instead of blocking."""
+        self._now += seconds
+
+    def advance_to(self, timestamp):
+        """Move the clock forward to timestamp; virtual time never goes backwards."""
+        if timestamp > self._now:
+            self._now = timestamp
+
+
+_current_clock = WallClock()
+
+
+def get_clock():
+    """Return the clock used to timestamp device events."""
+    return _current_clock
+
+
+def set_clock(clock):
+    """Replace the clock used to timestamp device events and return the previous one."""
+    global _current_clock
+    previous, _current_clock = _current_clock, clock
+    return previous
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import nullcontext
+from EventLog import get_log
+from Metrics import get_metrics, in_nested_commands, nested_commands
+
+
+class CommandTimeout(TimeoutError):
+    """Raised when a device does not answer a command within its timeout."""
+    pass
+
+
+def simulated_driver(device, method_name, args, timeout):
+    """Default driver: one blocking round trip of the device's simulated network latency."""
+    time.sleep(getattr(device, "IO_LATENCY", 0))
+
+
+class CommandDispatcher:
+    """Runs device commands on a bounded thread pool, in order per device and in parallel across devices.
+
+    A command first makes its blocking driver call (the real device I/O) on a pool thread, without
+    holding any lock, and is then applied to the device object under the automation system's
+    lock, which device commands and rule ticks on every other thread hold as well, so the
+    registry, rules and change listeners still see one state change at a time. A command
+    submitted from inside another command or a rule tick stays a nested command on the pool.
+
+    A driver call with a timeout runs on a separate I/O thread and is abandoned with CommandTimeout
+    once the timeout passes, so drivers need not enforce timeouts themselves. Driver errors
+    (timeouts and other OSErrors) are retried with exponential backoff; the future returned by
+    submit() holds the device method's result or the final error.
+    """
+
+    BURST = 16  # Commands run for one device before its worker goes back to the end of the pool queue
+
+    def __init__(self, automation_system, workers=64, driver=simulated_driver, timeout=None, retries=0,
+                 retry_delay=0.05):
+        """Create a dispatcher; timeout and retries are the defaults for commands that don't set their own."""
+        self.automation_system = automation_system
+        self.driver = driver
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.lock = automation_system.lock  # Serializes applying commands to the device objects
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CommandDispatcher")
+        # Driver calls with a timeout; a call that timed out keeps its thread until it returns
+        self._io_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CommandDriver")
+        self._queues = {}  # device_id -> deque of commands; present while the device has a worker
+        self._queues_lock = threading.Lock()
+        self._closed = False
+
+        metrics = get_metrics()
+        self.duration = metrics.histogram("device_command_seconds", "Time from submitting a device command to its result")
+        self.retried = metrics.counter("device_command_retries_total", "Device commands retried after a driver error")
+        self.failed = metrics.counter("device_command_failures_total", "Device commands that failed")
+
+    def attach(self):
+        """Run the automation system's rule actions and camera startup through the dispatcher."""
+        self.automation_system.dispatcher = self
+        self.automation_system.rules.dispatch = self.dispatch
+        return self
+
+    def submit(self, device, method_name, *args, timeout=None, retries=None):
+        """Queue device.method_name(*args) behind the device's earlier commands; returns a Future.
+
+        Raises RuntimeError once the dispatcher is closed.
+        """
+        future = Future()
+        command = (future, method_name, args, self.timeout if timeout is None else timeout,
+                   self.retries if retries is None else retries, in_nested_commands(), time.perf_counter())
+        with self._queues_lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit a command to a closed CommandDispatcher.")
+            queue = self._queues.get(device.device_id)
+            if queue is not None:
+                queue.append(command)
+                return future
+            self._queues[device.device_id] = deque((command,))
+        try:
+            self._executor.submit(self._drain, device)
+        except RuntimeError:
+            with self._queues_lock:
+                del self._queues[device.device_id]
+            raise
+        return future
+
+    def dispatch(self, device, call, args=()):
+        """Rule engine dispatch hook: submit the action and log its failure instead of raising."""
+        self.submit(device, call, *args).add_done_callback(self.log_failure)
+
+    def close(self, wait=True):
+        """Stop accepting commands; with wait, return once every queued command has finished."""
+        with self._queues_lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait)
+        self._io_executor.shutdown(wait=False)
+
+    def _drain(self, device):
+        # Runs on a pool thread that owns the device until its queue is empty
+        queue = self._queues[device.device_id]
+        while True:
+            for _ in range(self.BURST):
+                with self._queues_lock:
+                    if not queue:
+                        del self._queues[device.device_id]
+                        return
+                    command = queue.popleft()
+                self._run(device, *command)
+            # Give other devices' commands a turn before continuing with this one
+            try:
+                self._executor.submit(self._drain, device)
+                return
+            except RuntimeError:
+                pass  # Shutting down: finish the device's queue on this thread
+
+    def _run(self, device, future, method_name, args, timeout, retries, nested, submitted):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    self._call_driver(device, method_name, args, timeout)
+                    break
+                except OSError as e:
+                    if attempt == retries:
+                        raise
+                    self.retried.value += 1
+                    get_log().warning("CommandDispatcher", "{} on {} failed ({}), retrying.", method_name, device.device_id, e)
+                    time.sleep(self.retry_delay * 2 ** attempt)
+            with self.lock, nested_commands() if nested else nullcontext():
+                result = getattr(device, method_name)(*args)
+        except Exception as e:
+            self.failed.value += 1
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self.duration.observe(time.perf_counter() - submitted)
+
+    def _call_driver(self, device, method_name, args, timeout):
+        if timeout is None:
+            self.driver(device, method_name, args, timeout)
+            return
+        try:
+            call = self._io_executor.submit(self.driver, device, method_name, args, timeout)
+        except RuntimeError:
+            # Closed without waiting: the remaining commands call the driver directly
+            self.driver(device, method_name, args, timeout)
+            return
+        try:
+            call.result(timeout)
+        except FutureTimeout:
+            call.cancel()
+            raise CommandTimeout(f"{device.device_id} did not answer {method_name} within {timeout}s.") from None
+
+    @staticmethod
+    def log_failure(future):
+        """Done callback for fire-and-forget commands: log the error, if any."""
+        error = future.exception()
+        if error is not None:
+            get_log().error("CommandDispatcher", "Device command failed: {}", error)
@@ -0,0 +1,268 @@
+import bisect
+from array import array
+from collections import namedtuple
+from Clock import get_clock
+from DeviceStatus import DeviceStatus
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+
+# Attributes recorded per device type; status is stored as 1.0 for on and 0.0 for off
+TRACKED_ATTRIBUTES = {
+    SmartLight: ("status", "brightness"),
+    Thermostat: ("status", "temperature"),
+    SecurityCamera: ("status", "recording", "infrared"),
+}
+# (bucket seconds, buckets kept): one day of minutes and thirty days of hours
+DEFAULT_RESOLUTIONS = ((60, 1440), (3600, 720))
+
+# mean_of_changes averages the recorded values, not weighted by how long each one held
+HistorySummary = namedtuple("HistorySummary", "count minimum maximum mean_of_changes resolution")
+
+
+class Ring:
+    """Fixed-capacity ring buffer of float columns stored in array('d').
+
+    Columns grow on demand up to capacity, then the oldest row is overwritten. Views returned by
+    views() point into the live arrays; if a column must grow while a view of it is held, the
+    column is copied first, so the caller's view stays valid.
+    """
+
+    __slots__ = ("columns", "capacity", "head")
+
+    def __init__(self, capacity, width):
+        self.columns = [array("d") for _ in range(width)]
+        self.capacity = capacity
+        self.head = 0  # Physical index of the oldest row once the ring is full
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __getitem__(self, index):
+        # Logical row index -> time column value, oldest first, so bisect can search the ring
+        return self.columns[0][(self.head + index) % len(self.columns[0])]
+
+    def append(self, *row):
+        columns = self.columns
+        size = len(columns[0])
+        if size < self.capacity:
+            try:
+                for column, value in zip(columns, row):
+                    column.append(value)
+            except BufferError:
+                # A caller holds a view of a column; grow copies of the columns not yet appended to
+                for position, column in enumerate(columns):
+                    if len(column) == size:
+                        columns[position] = array("d", column)
+                        columns[position].append(row[position])
+        else:
+            head = self.head
+            for column, value in zip(columns, row):
+                column[head] = value
+            self.head = (head + 1) % self.capacity
+
+    def oldest_time(self):
+        return self[0] if len(self) else None
+
+    def locate(self, start, end):
+        # Logical [lo, hi) of rows with start <= time <= end; times are appended in order
+        lo = 0 if start is None else bisect.bisect_left(self, start)
+        hi = len(self) if end is None else bisect.bisect_right(self, end)
+        return lo, max(lo, hi)
+
+    def views(self, column, lo, hi):
+        """Zero-copy memoryviews of one column for logical rows [lo, hi), oldest first (at most two)."""
+        count = hi - lo
+        if count <= 0:
+            return []
+        data = memoryview(self.columns[column])
+        size = len(self)
+        first = (self.head + lo) % size
+        if first + count <= size:
+            return [data[first:first + count]]
+        return [data[first:], data[:first + count - size]]
+
+
+class Tier:
+    """One downsampled resolution: closed buckets of (start, min, max, sum, count) plus the open bucket."""
+
+    __slots__ = ("resolution", "ring", "bucket", "low", "high", "total", "count")
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.ring = Ring(capacity, 5)
+        self.bucket = None
+
+    def add(self, timestamp, value):
+        bucket = timestamp - timestamp % self.resolution
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                self.ring.append(self.bucket, self.low, self.high, self.total, self.count)
+            self.bucket, self.low, self.high, self.total, self.count = bucket, value, value, 0.0, 0
+        if value < self.low:
+            self.low = value
+        if value > self.high:
+            self.high = value
+        self.total += value
+        self.count += 1
+
+    def summarize(self, start, end):
+        # Buckets are selected by overlap with [start, end], not just by their start time
+        ring = self.ring
+        lo, hi = ring.locate(None if start is None else start - self.resolution, end)
+        if lo < hi and start is not None and ring[lo] <= start - self.resolution:
+            lo += 1
+        count = sum(sum(view) for view in self.ring.views(4, lo, hi))
+        total = sum(sum(view) for view in self.ring.views(3, lo, hi))
+        lows = [min(view) for view in self.ring.views(1, lo, hi)]
+        highs = [max(view) for view in self.ring.views(2, lo, hi)]
+        if self.bucket is not None and (start is None or self.bucket + self.resolution > start) \
+                and (end is None or self.bucket <= end):
+            count, total = count + self.count, total + self.total
+            lows.append(self.low)
+            highs.append(self.high)
+        if not count:
+            return None
+        return HistorySummary(int(count), min(lows), max(highs), total / count, self.resolution)
+
+
+class Series:
+    """History of one device attribute: raw changes plus downsampled tiers."""
+
+    __slots__ = ("raw", "tiers", "last_value", "last_change")
+
+    def __init__(self, raw_capacity, resolutions):
+        self.raw = Ring(raw_capacity, 2)  # (time, value)
+        self.tiers = [Tier(resolution, capacity) for resolution, capacity in resolutions]
+        self.last_value = None
+        self.last_change = None
+
+    def add(self, timestamp, value):
+        # Only changes are stored; the value holds until the next sample
+        if value == self.last_value:
+            return
+        self.last_value = value
+        self.last_change = timestamp
+        self.raw.append(timestamp, value)
+        for tier in self.tiers:
+            tier.add(timestamp, value)
+
+    def summarize(self, start=None, end=None):
+        # Raw samples answer the query if they reach back to start; otherwise the finest tier that does
+        raw = self.raw
+        if len(raw) < raw.capacity or (start is not None and raw.oldest_time() <= start):
+            lo, hi = raw.locate(start, end)
+            views = raw.views(1, lo, hi)
+            if not views:
+                return None
+            count = hi - lo
+            return HistorySummary(count, min(min(view) for view in views), max(max(view) for view in views),
+                                  sum(sum(view) for view in views) / count, 0)
+        for tier in self.tiers:
+            oldest = tier.ring.oldest_time()
+            if len(tier.ring) < tier.ring.capacity or (start is not None and oldest is not None and oldest <= start):
+                return tier.summarize(start, end)
+        return self.tiers[-1].summarize(start, end) if self.tiers else None
+
+
+class DeviceHistory:
+    """Per-device, per-attribute time series fed by the automation system's change notifications.
+
+    Every state update a device publishes (SmartLight._update_status, Thermostat._update_status_var,
+    SecurityCamera._update_status_var) reaches record(), which appends the attributes that changed.
+    Storage is array-backed and allocated on a device's first change; until then attach() only
+    keeps a tuple of the device's starting values, which becomes the first sample.
+    """
+
+    def __init__(self, automation_system=None, raw_capacity=1024, resolutions=DEFAULT_RESOLUTIONS):
+        """Create a history; if an automation system is given, start recording its devices."""
+        self.raw_capacity = raw_capacity
+        self.resolutions = tuple(resolutions)
+        self._series = {}  # device_id -> {attribute: Series}
+        self._initial = {}  # device_id -> (timestamp, attributes, values) of devices without series yet
+        self._attributes = {}  # device class -> tracked attribute names
+        if automation_system is not None:
+            self.attach(automation_system)
+
+    def attach(self, automation_system):
+        """Note every registered device's current state and record all later changes."""
+        timestamp = get_clock().now()
+        for device in automation_system.devices:
+            if device.device_id not in self._series:
+                attributes = self._attributes_of(type(device))
+                values = tuple(getattr(device, name) for name in attributes)
+                self._initial[device.device_id] = (timestamp, attributes, values)
+        automation_system.add_change_listener(self.record)
+
+    def detach(self, automation_system):
+        """Stop recording changes of the automation system's devices."""
+        automation_system.remove_change_listener(self.record)
+
+    def record(self, device, timestamp=None):
+        """Change listener: append the device's tracked attributes that changed."""
+        if timestamp is None:
+            timestamp = get_clock().now()
+        series = self._series.get(device.device_id)
+        if series is None:
+            series = self._create_series(device.device_id, self._attributes_of(type(device)))
+        for attribute, entry in series.items():
+            entry.add(timestamp, self._sample(attribute, getattr(device, attribute)))
+
+    def series(self, device_id, attribute):
+        """Return the Series for a device attribute, or None if nothing was recorded."""
+        series = self._series.get(device_id)
+        if series is None:
+            if device_id not in self._initial:
+                return None
+            series = self._create_series(device_id, None)
+        return series.get(attribute)
+
+    def samples(self, device_id, attribute, start=None, end=None):
+        """Raw (times, values) memoryview pairs for samples in [start, end], oldest first, without copying."""
+        entry = self.series(device_id, attribute)
+        if entry is None:
+            return []
+        lo, hi = entry.raw.locate(start, end)
+        return list(zip(entry.raw.views(0, lo, hi), entry.raw.views(1, lo, hi)))
+
+    def summary(self, device_id, attribute, start=None, end=None):
+        """Count, min, max and mean of the values recorded in [start, end], or None if there are none.
+
+        Raw samples are used while they cover the range; older ranges are answered from the finest
+        downsampled resolution that still does, which the summary's resolution field reports.
+        """
+        entry = self.series(device_id, attribute)
+        return None if entry is None else entry.summarize(start, end)
+
+    def last_change(self, device_id, attribute):
+        """Time at which the attribute last changed, or None if it was never recorded."""
+        entry = self.series(device_id, attribute)
+        return None if entry is None else entry.last_change
+
+    def __len__(self):
+        return sum(len(series) for series in self._series.values())
+
+    def _attributes_of(self, device_class):
+        attributes = self._attributes.get(device_class)
+        if attributes is None:
+            attributes = self._attributes[device_class] = next(
+                (names for cls, names in TRACKED_ATTRIBUTES.items() if issubclass(device_class, cls)), ())
+        return attributes
+
+    def _create_series(self, device_id, attributes):
+        # Allocates a device's series, starting with the values noted by attach() if there are any
+        initial = self._initial.pop(device_id, None)
+        if attributes is None:
+            attributes = initial[1]
+        series = self._series[device_id] = {
+            attribute: Series(self.raw_capacity, self.resolutions) for attribute in attributes}
+        if initial is not None:
+            timestamp, _, values = initial
+            for (attribute, entry), value in zip(series.items(), values):
+                entry.add(timestamp, self._sample(attribute, value))
+        return series
+
+    @staticmethod
+    def _sample(attribute, value):
+        # Status is stored as 1.0 for on and 0.0 for off
+        return (1.0 if value == DeviceStatus.ON else 0.0) if attribute == "status" else float(value)
@@ -0,0 +1,234 @@
+import tkinter as tk  # gui package
+from tkinter import ttk
+from Thermostat import Thermostat
+
+# Filter label -> device type name; None means every device
+DEVICE_TYPE_FILTERS = {"All devices": None, "Smart Lights": "SmartLight", "Thermostats": "Thermostat", "Security Cameras": "SecurityCamera"}
+STATUS_FILTERS = {"Any status": None, "On": "on", "Off": "off"}
+
+
+def describe_snapshot(snapshot):
+    # Status text shown for a device snapshot, by type.
+    if snapshot.device_type == "SmartLight":
+        return f"Status: {snapshot.status}, Brightness: {snapshot.brightness}%"
+    if snapshot.device_type == "Thermostat":
+        return f"Status: {snapshot.status}, Temperature: {snapshot.temperature}°C"
+    if snapshot.device_type == "SecurityCamera":
+        return f"Status: {snapshot.status}, Recording: {snapshot.recording}, Infrared: {snapshot.infrared}"
+    return f"Status: {snapshot.status}"
+
+
+def toggle_camera(system, device_id):
+    # Camera On/Off button: switching a camera off also stops recording and infrared.
+    camera = system.registry.get(device_id)
+    camera.toggle_camera()
+    if camera.status == "off":
+        camera.toggle_recording()
+        camera.disable_infrared()
+
+
+class DeviceRow(ttk.Frame):
+    def __init__(self, parent, worker):
+        # One reusable row of device controls; bind_snapshot() points it at a different device while
+        # scrolling. Buttons and the slider only queue commands on the automation worker.
+        super().__init__(parent, style='TFrame')
+        self.worker = worker
+        self.snapshot = None
+        self._status_text = None  # Last text written to status_var, to skip no-op updates
+        self._binding = False  # Set while binding moves the slider, so that doesn't send a command
+        self.name_var = tk.StringVar()
+        self.status_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.name_var, width=22, font=("Bookman Old Style", 12)).pack(side=tk.LEFT, padx=5)
+        ttk.Label(self, textvariable=self.status_var, width=48).pack(side=tk.LEFT, padx=5)
+        self.primary_button = ttk.Button(self, command=self._on_primary, style='Device.TButton')
+        self.primary_button.pack(side=tk.LEFT, padx=5)
+        self.secondary_button = ttk.Button(self, command=self._on_secondary, style='Device.TButton')
+        self.scale = ttk.Scale(self, command=self._on_scale, style='Device.Horizontal.TScale')
+
+    @property
+    def device_id(self):
+        return self.snapshot.device_id if self.snapshot is not None else None
+
+    def bind_snapshot(self, snapshot):
+        # Shows the given device in this row, swapping controls if its type differs.
+        rebinding = self.device_id != snapshot.device_id
+        self.snapshot = snapshot
+        if rebinding:
+            self.name_var.set(f"Device: {snapshot.device_id}")
+            self.secondary_button.pack_forget()
+            self.scale.pack_forget()
+            self._binding = True
+            if snapshot.device_type == "SmartLight":
+                self.primary_button.configure(text="Toggle Light")
+                self.scale.configure(from_=0, to=100)
+                self.scale.set(snapshot.brightness)
+                self.scale.pack(side=tk.LEFT, padx=5, fill="x", expand=True)
+            elif snapshot.device_type == "Thermostat":
+                self.primary_button.configure(text="On/Off")
+                self.scale.configure(from_=Thermostat.MIN_TEMPERATURE, to=Thermostat.MAX_TEMPERATURE)
+                self.scale.set(snapshot.temperature)
+                self.scale.pack(side=tk.LEFT, padx=5, fill="x", expand=True)
+            elif snapshot.device_type == "SecurityCamera":
+                self.primary_button.configure(text="Camera On/Off")
+                self.secondary_button.configure(text="Recording On/Off")
+                self.secondary_button.pack(side=tk.LEFT, padx=5)
+            self._binding = False
+        self.refresh()
+
+    def unbind(self):
+        self.snapshot = None
+        self._status_text = None
+
+    def refresh(self):
+        # Re-renders the status text of the bound snapshot, touching Tk only if it changed.
+        if self.snapshot is not None:
+            text = describe_snapshot(self.snapshot)
+            if text != self._status_text:
+                self._status_text = text
+                self.status_var.set(text)
+
+    def _on_primary(self):
+        device_type = self.snapshot.device_type
+        if device_type == "SmartLight":
+            self.worker.submit_command(self.device_id, "toggle_light")
+        elif device_type == "Thermostat":
+            self.worker.submit_command(self.device_id, "toggle_thermostat")
+        elif device_type == "SecurityCamera":
+            device_id = self.device_id
+            self.worker.submit(lambda system: toggle_camera(system, device_id))
+
+    def _on_secondary(self):
+        if self.snapshot.device_type == "SecurityCamera" and self.snapshot.status == "on":
+            self.worker.submit_command(self.device_id, "toggle_recording")
+
+    def _on_scale(self, val):
+        if self._binding or self.snapshot is None:
+            return
+        if self.snapshot.device_type == "SmartLight":
+            self.worker.submit_command(self.device_id, "set_brightness", int(round(float(val))))
+        elif self.snapshot.device_type == "Thermostat":
+            self.worker.submit_command(self.device_id, "set_temperature", int(float(val)))
+
+
+class DeviceListView(ttk.Frame):
+    ROW_HEIGHT = 40  # Pixel height of one device row
+
+    def __init__(self, parent, worker):
+        # Virtualized device list: only as many DeviceRow widgets as fit on screen are created,
+        # and they are re-bound to other devices as the list scrolls or the filters change.
+        # The list shows snapshots received from the automation worker, never live devices.
+        super().__init__(parent, style='TFrame')
+        self.worker = worker
+        self.snapshots = {}  # device_id -> latest DeviceSnapshot
+        self.filtered = []  # Device ids matching the current search and filters
+        self.offset = 0  # Index in self.filtered of the device shown in the first row
+        self.rows = []
+
+        toolbar = ttk.Frame(self, style='TFrame')
+        toolbar.pack(side=tk.TOP, fill="x", padx=10, pady=5)
+        ttk.Label(toolbar, text="Search:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *_: self.apply_filters())
+        ttk.Entry(toolbar, textvariable=self.search_var, width=20).pack(side=tk.LEFT, padx=5)
+        self.type_var = tk.StringVar(value=next(iter(DEVICE_TYPE_FILTERS)))
+        self.status_filter_var = tk.StringVar(value=next(iter(STATUS_FILTERS)))
+        for variable, choices in ((self.type_var, DEVICE_TYPE_FILTERS), (self.status_filter_var, STATUS_FILTERS)):
+            combo = ttk.Combobox(toolbar, textvariable=variable, values=list(choices), state="readonly", width=16)
+            combo.bind("<<ComboboxSelected>>", lambda _: self.apply_filters())
+            combo.pack(side=tk.LEFT, padx=5)
+        self.count_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.count_var).pack(side=tk.LEFT, padx=5)
+        self.toolbar = toolbar
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.row_frame = ttk.Frame(self, style='TFrame')
+        self.row_frame.pack(side=tk.LEFT, fill="both", expand=True)
+        self.row_frame.bind("<Configure>", self._on_resize)
+        self.row_frame.bind("<Enter>", lambda _: self._bind_mousewheel(True))
+        self.row_frame.bind("<Leave>", lambda _: self._bind_mousewheel(False))
+
+        self.apply_filters()
+
+    def apply_filters(self):
+        # Rebuilds the filtered list of device ids from the latest snapshots.
+        device_type = DEVICE_TYPE_FILTERS[self.type_var.get()]
+        status = STATUS_FILTERS[self.status_filter_var.get()]
+        search = self.search_var.get().strip().lower()
+        self.filtered = [
+            snapshot.device_id for snapshot in self.snapshots.values()
+            if (device_type is None or snapshot.device_type == device_type)
+            and (status is None or snapshot.status == status)
+            and (not search or search in snapshot.device_id.lower())
+        ]
+        self.count_var.set(f"{len(self.filtered)} of {len(self.snapshots)} devices")
+        self.scroll_to(0)
+
+    def update_snapshots(self, snapshots):
+        # Stores snapshots from the worker and refreshes only the visible rows they affect.
+        # New devices are added to the list; existing ones keep their position until refiltered.
+        added = False
+        for snapshot in snapshots:
+            added = added or snapshot.device_id not in self.snapshots
+            self.snapshots[snapshot.device_id] = snapshot
+        if added:
+            self.apply_filters()
+            return
+        changed = {snapshot.device_id for snapshot in snapshots}
+        for row in self.rows:
+            if row.device_id in changed:
+                row.bind_snapshot(self.snapshots[row.device_id])
+
+    def scroll_to(self, offset):
+        # Shows the filtered list starting at the given index.
+        max_offset = max(0, len(self.filtered) - len(self.rows))
+        self.offset = min(max(0, offset), max_offset)
+        self.render()
+
+    def render(self):
+        # Re-binds every pooled row to the device it should currently show.
+        for index, row in enumerate(self.rows):
+            position = self.offset + index
+            if position < len(self.filtered):
+                row.bind_snapshot(self.snapshots[self.filtered[position]])
+                row.pack(side=tk.TOP, fill="x", padx=10, pady=2)
+            else:
+                row.unbind()
+                row.pack_forget()
+        total = max(len(self.filtered), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + len(self.rows)) / total))
+
+    def refresh(self):
+        # Updates the status text of the visible rows only.
+        for row in self.rows:
+            row.refresh()
+
+    def _on_resize(self, event):
+        # Grows or shrinks the row pool to match the available height.
+        wanted = max(1, event.height // self.ROW_HEIGHT)
+        if wanted == len(self.rows):
+            return
+        while len(self.rows) < wanted:
+            self.rows.append(DeviceRow(self.row_frame, self.worker))
+        for row in self.rows[wanted:]:
+            row.destroy()
+        del self.rows[wanted:]
+        self.scroll_to(self.offset)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        # Handles "moveto <fraction>" and "scroll <n> units|pages" from the scrollbar.
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.filtered)))
+        elif action == "scroll":
+            step = len(self.rows) if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def _bind_mousewheel(self, active):
+        # Mouse wheel scrolls the list only while the pointer is over it.
+        if active:
+            self.bind_all("<MouseWheel>", lambda e: self.scroll_to(self.offset - (1 if e.delta > 0 else -1)))
+            self.bind_all("<Button-4>", lambda _: self.scroll_to(self.offset - 1))
+            self.bind_all("<Button-5>", lambda _: self.scroll_to(self.offset + 1))
+        else:
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                self.unbind_all(sequence)
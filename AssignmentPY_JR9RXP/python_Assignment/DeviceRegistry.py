@@ -0,0 +1,76 @@
+class DeviceRegistry:
+    """Indexes devices by id, type and status so automation rules avoid full fleet scans."""
+
+    def __init__(self):
+        """Initialize empty indexes."""
+        self._by_id = {}  # device_id -> device, in insertion order
+        self._by_type = {}  # device class -> {device_id: device}
+        self._by_status = {}  # (device class, status) -> {device_id: device}
+
+    def add(self, device):
+        """Register a device under its class and every base class, so lookups behave like isinstance."""
+        self._by_id[device.device_id] = device
+        for cls in self._classes_of(device):
+            self._by_type.setdefault(cls, {})[device.device_id] = device
+            self._by_status.setdefault((cls, device.status), {})[device.device_id] = device
+
+    def add_many(self, devices):
+        """Register many devices at once; each index is updated per class and status, not per device."""
+        devices = list(devices)
+        self._by_id.update((device.device_id, device) for device in devices)
+        groups = {}  # (device class, status) -> devices
+        for device in devices:
+            groups.setdefault((type(device), device.status), []).append(device)
+        for (device_class, status), group in groups.items():
+            members = {device.device_id: device for device in group}
+            for cls in device_class.__mro__[:-1]:
+                self._by_type.setdefault(cls, {}).update(members)
+                self._by_status.setdefault((cls, status), {}).update(members)
+
+    def update_status(self, device, old_status):
+        """Move a device between status indexes after its status changed from old_status."""
+        if self._by_id.get(device.device_id) is not device:
+            return  # Not registered (yet); it is indexed with its current status when added
+        for cls in self._classes_of(device):
+            self._by_status.get((cls, old_status), {}).pop(device.device_id, None)
+            self._by_status.setdefault((cls, device.status), {})[device.device_id] = device
+
+    def get(self, device_id):
+        """Return the device with the given id, or None."""
+        return self._by_id.get(device_id)
+
+    def all(self):
+        """Return a live view of all registered devices, in the order they were added."""
+        return self._by_id.values()
+
+    def of_type(self, device_class):
+        """Return a live view of all devices that are instances of device_class."""
+        return self._by_type.get(device_class, {}).values()
+
+    def with_status(self, device_class, status):
+        """Return a live view of devices of device_class whose status equals status."""
+        return self._by_status.get((device_class, status), {}).values()
+
+    def count(self, device_class, status=None):
+        """Count devices of device_class, optionally only those with the given status."""
+        if status is None:
+            return len(self._by_type.get(device_class, ()))
+        return len(self._by_status.get((device_class, status), ()))
+
+    def all_have_status(self, device_class, status):
+        """Check in O(1) whether every device of device_class has the given status."""
+        return self.count(device_class, status) == self.count(device_class)
+
+    def __contains__(self, device_id):
+        return device_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @staticmethod
+    def _classes_of(device):
+        # Every class in the device's MRO except object
+        return type(device).__mro__[:-1]
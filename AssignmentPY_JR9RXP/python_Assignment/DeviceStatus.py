@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class DeviceStatus(str, Enum):
+    """Power status shared by all devices; members compare equal to the plain strings "on"/"off"."""
+
+    ON = "on"
+    OFF = "off"
+
+    def __str__(self):
+        return self.value
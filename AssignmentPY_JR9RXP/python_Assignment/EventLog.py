@@ -0,0 +1,167 @@
+import atexit
+import logging
+import os
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from Clock import get_clock
+
+# Per-source levels can be set without code changes, e.g. "SecurityCamera=WARNING,SmartLight=ERROR"
+LEVELS_ENV_VAR = "SMARTHOME_LOG_LEVELS"
+
+
+class EventLog:
+    """Buffered structured log: records are queued unformatted and written out in batches."""
+
+    def __init__(self, stream=None, path=None, capacity=65536, batch_size=1024, flush_interval=0.2,
+                 background=True, default_level=logging.INFO, levels=None):
+        """Create a log writing to stream (sys.stdout at flush time by default) and/or a file."""
+        self.stream = stream
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.default_level = default_level
+        self.dropped = 0  # Records discarded because the ring buffer was full
+        self._levels = dict(levels or {})
+        self._levels.update(self._levels_from_env())
+        self._records = deque(maxlen=capacity)  # Ring buffer of (time, template, args)
+        self._flush_lock = threading.Lock()
+        self._file = None
+        self._timestamp_second = None
+        self._timestamp_text = ""
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        self._writer = None
+        if background:
+            self._writer = threading.Thread(target=self._run_writer, name="EventLogWriter", daemon=True)
+            self._writer.start()
+
+    def set_level(self, source, level):
+        """Set the minimum level for one source, e.g. a device class name."""
+        self._levels[source] = self._parse_level(level)
+
+    def is_enabled(self, source, level):
+        """Check whether records of this level from this source would be kept."""
+        return level >= self._levels.get(source, self.default_level)
+
+    def log(self, source, level, template, *args):
+        """Queue a record; template is only formatted with args when the record is written."""
+        if level < self._levels.get(source, self.default_level):
+            return
+        records = self._records
+        if len(records) == records.maxlen:
+            self.dropped += 1
+        records.append((get_clock().now(), template, args))
+        if len(records) >= self.batch_size:
+            if self._writer is not None:
+                self._wake.set()
+            else:
+                self.flush()
+
+    def debug(self, source, template, *args):
+        self.log(source, logging.DEBUG, template, *args)
+
+    def info(self, source, template, *args):
+        self.log(source, logging.INFO, template, *args)
+
+    def warning(self, source, template, *args):
+        self.log(source, logging.WARNING, template, *args)
+
+    def error(self, source, template, *args):
+        self.log(source, logging.ERROR, template, *args)
+
+    def flush(self):
+        """Format and write every queued record in one batch."""
+        with self._flush_lock:
+            records = self._records
+            lines = []
+            while records:
+                created, template, args = records.popleft()
+                lines.append(template.format(*args, timestamp=self._timestamp(created)))
+            if not lines:
+                return
+            text = "\n".join(lines) + "\n"
+            if self.path is not None:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(text)
+                self._file.flush()
+            if self.stream is not None or self.path is None:
+                stream = self.stream if self.stream is not None else sys.stdout
+                stream.write(text)
+                stream.flush()
+
+    def close(self):
+        """Stop the background writer and write out anything still queued."""
+        self._closed.set()
+        self._wake.set()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _timestamp(self, created):
+        # Timestamps only change once a second, so the formatted text is cached per second.
+        second = int(created)
+        if second != self._timestamp_second:
+            self._timestamp_second = second
+            self._timestamp_text = datetime.fromtimestamp(second).strftime("[%Y-%m-%d %H:%M:%S]")
+        return self._timestamp_text
+
+    def _run_writer(self):
+        # Background writer: flushes whenever a batch fills up or flush_interval passes.
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    @staticmethod
+    def _levels_from_env():
+        # Parses "Source=LEVEL,..." pairs from the environment.
+        levels = {}
+        for entry in os.environ.get(LEVELS_ENV_VAR, "").split(","):
+            source, _, level = entry.partition("=")
+            if source.strip() and level.strip():
+                try:
+                    levels[source.strip()] = EventLog._parse_level(level)
+                except ValueError:
+                    pass  # Ignore unknown level names rather than failing at startup
+        return levels
+
+    @staticmethod
+    def _parse_level(level):
+        # Accepts numeric levels or standard level names such as "WARNING".
+        if isinstance(level, int):
+            return level
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level: {level}")
+        return value
+
+
+_current_log = None
+
+
+def get_log():
+    """Return the shared event log, creating a background stdout log on first use."""
+    global _current_log
+    if _current_log is None:
+        _current_log = EventLog()
+    return _current_log
+
+
+def set_log(event_log):
+    """Replace the shared event log, closing the previous one."""
+    global _current_log
+    previous, _current_log = _current_log, event_log
+    if previous is not None:
+        previous.close()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _current_log is not None:
+        _current_log.close()
@@ -0,0 +1,290 @@
+import json
+import struct
+import threading
+import time
+from collections import namedtuple
+from AutomationSystem import AutomationSystem
+from Clock import get_clock
+from EventLog import get_log
+from Metrics import add_command_hook, remove_command_hook
+from RuleEngine import DEFAULT_RULES
+from StateStore import PersistenceError, apply_states, device_state
+
+TRACE_MAGIC = b"SHTRACE1"
+TRACE_HEADER = struct.Struct("<8sd")  # magic, clock time of the first record
+# Every record starts with its kind and the microseconds since the previous record; a CLOCK record
+# carries an absolute time instead, written when the gap does not fit or the clock went backwards
+RECORD_PREFIX = struct.Struct("<BI")
+NAME, COMMAND, STATE, TICK, CLOCK = 1, 2, 3, 4, 5
+NAME_BODY = struct.Struct("<H")  # length of the UTF-8 name that follows; names are numbered in order
+COMMAND_BODY = struct.Struct("<IHH")  # device name, command name, length of the JSON args that follow
+STATE_BODY = struct.Struct("<IBBhBB")  # device name, then the StateStore state tuple
+CLOCK_BODY = struct.Struct("<d")
+MAX_DELTA = 0xFFFFFFFF
+
+TraceEvent = namedtuple("TraceEvent", "kind timestamp device_id data")  # data: (command, args), state tuple or None
+ReplayReport = namedtuple("ReplayReport", "events commands ticks elapsed events_per_second max_lag "
+                                          "latencies rule_latencies differences")
+
+
+class TraceError(Exception):
+    """Raised when a trace file cannot be read."""
+    pass
+
+
+class TraceRecorder:
+    """Records every top-level device command, state change and rule tick of an automation system.
+
+    The trace starts with the state of every device, so it can be replayed from scratch. Device
+    ids and command names are written once and then referred to by number, and times are
+    microsecond deltas, so a command costs about 13 bytes and a state change 15.
+    """
+
+    def __init__(self, path, buffer_size=64 * 1024):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.automation_system = None
+        self.records = 0
+        self._file = open(path, "wb")
+        self._buffer = bytearray()
+        self._names = {}  # name -> number
+        self._last_time = None
+        self._lock = threading.RLock()
+
+    def attach(self, automation_system):
+        """Write the state of every device, then record commands, changes and ticks from now on."""
+        self.automation_system = automation_system
+        with self._lock:
+            for device in automation_system.devices:
+                self._device(device)
+        add_command_hook(self.command)
+        automation_system.add_change_listener(self.state_changed)
+        automation_system.add_tick_listener(self.tick)
+        return self
+
+    def detach(self):
+        """Stop recording; the trace stays open until close()."""
+        if self.automation_system is not None:
+            remove_command_hook(self.command)
+            self.automation_system.remove_change_listener(self.state_changed)
+            self.automation_system.remove_tick_listener(self.tick)
+            self.automation_system = None
+
+    def command(self, device, command, args):
+        """Command hook: record a command about to run on one of the system's devices."""
+        if device.automation_system is not self.automation_system:
+            return
+        # Hooks and listeners run inside device commands; a recording error must not fail the command
+        try:
+            encoded_args = json.dumps(args, separators=(",", ":")).encode("utf-8") if args else b""
+            with self._lock:
+                device_number = self._device(device)
+                command_number = self._name(command)
+                self._record(COMMAND, COMMAND_BODY.pack(device_number, command_number, len(encoded_args)) + encoded_args)
+        except Exception as e:
+            get_log().error("TraceRecorder", "Error recording {} on {}: {}", command, device.device_id, e)
+
+    def state_changed(self, device):
+        """Change listener: record the device's full state."""
+        try:
+            with self._lock:
+                self._state(self._name(device.device_id), device)
+        except Exception as e:
+            get_log().error("TraceRecorder", "Error recording the state of {}: {}", device.device_id, e)
+
+    def tick(self):
+        """Tick listener: record a run_simulation tick."""
+        try:
+            with self._lock:
+                self._record(TICK, b"")
+        except Exception as e:
+            get_log().error("TraceRecorder", "Error recording a tick: {}", e)
+
+    def flush(self):
+        with self._lock:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+            self._file.flush()
+
+    def close(self):
+        """Stop recording and write out the rest of the trace."""
+        self.detach()
+        with self._lock:
+            if not self._file.closed:
+                self.flush()
+                self._file.close()
+
+    def _device(self, device):
+        # A device seen for the first time gets its name and current state written first
+        number = self._names.get(device.device_id)
+        if number is None:
+            number = self._name(device.device_id)
+            self._state(number, device)
+        return number
+
+    def _state(self, number, device):
+        # Uses the StateStore's validation: a state no record can hold is logged and left out
+        try:
+            state = device_state(device)
+        except PersistenceError as e:
+            get_log().error("TraceRecorder", "{}", e)
+            return
+        self._record(STATE, STATE_BODY.pack(number, *state))
+
+    def _name(self, name):
+        number = self._names.get(name)
+        if number is None:
+            number = self._names[name] = len(self._names)
+            encoded = name.encode("utf-8")
+            self._record(NAME, NAME_BODY.pack(len(encoded)) + encoded)
+        return number
+
+    def _record(self, kind, body):
+        now = get_clock().now()
+        if self._last_time is None:
+            self._buffer += TRACE_HEADER.pack(TRACE_MAGIC, now)
+            self._last_time = now
+        delta = round((now - self._last_time) * 1e6)
+        if 0 <= delta <= MAX_DELTA:
+            self._last_time += delta / 1e6
+        else:
+            self._buffer += RECORD_PREFIX.pack(CLOCK, 0) + CLOCK_BODY.pack(now)
+            self._last_time, delta = now, 0
+        self._buffer += RECORD_PREFIX.pack(kind, delta)
+        self._buffer += body
+        if kind != NAME:
+            self.records += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+
+def read_trace(path):
+    """Yield the TraceEvents of a trace file in order; name records are resolved, not yielded."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        return
+    if len(data) < TRACE_HEADER.size or data[:8] != TRACE_MAGIC:
+        raise TraceError(f"{path} is not a trace file.")
+    _, now = TRACE_HEADER.unpack_from(data)
+    names = []
+    offset = TRACE_HEADER.size
+    try:
+        while offset < len(data):
+            kind, delta = RECORD_PREFIX.unpack_from(data, offset)
+            offset += RECORD_PREFIX.size
+            now += delta / 1e6
+            if kind == NAME:
+                (length,) = NAME_BODY.unpack_from(data, offset)
+                start = offset + NAME_BODY.size
+                names.append(data[start:start + length].decode("utf-8"))
+                offset = start + length
+            elif kind == COMMAND:
+                device_number, command_number, length = COMMAND_BODY.unpack_from(data, offset)
+                start = offset + COMMAND_BODY.size
+                args = tuple(json.loads(data[start:start + length])) if length else ()
+                offset = start + length
+                yield TraceEvent(COMMAND, now, names[device_number], (names[command_number], args))
+            elif kind == STATE:
+                device_number, *state = STATE_BODY.unpack_from(data, offset)
+                offset += STATE_BODY.size
+                yield TraceEvent(STATE, now, names[device_number], tuple(state))
+            elif kind == TICK:
+                yield TraceEvent(TICK, now, None, None)
+            elif kind == CLOCK:
+                (now,) = CLOCK_BODY.unpack_from(data, offset)
+                offset += CLOCK_BODY.size
+            else:
+                raise TraceError(f"{path}: unknown record kind {kind} at byte {offset - RECORD_PREFIX.size}.")
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise TraceError(f"{path}: truncated or corrupt record at byte {offset}: {e}")
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """{point: value} for the given percentiles of values, plus "max"; empty if there are none."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {point: ordered[min(len(ordered) - 1, len(ordered) * point // 100)] for point in points}
+    result["max"] = ordered[-1]
+    return result
+
+
+class TraceReplayer:
+    """Feeds a recorded trace into a fresh, headless automation system.
+
+    The leading state records build the fleet; commands and ticks are then replayed at the
+    recorded pace divided by speed, or back to back when speed is None. Later state records are
+    the recorded outcome: the replayed system's final state is compared against them.
+    """
+
+    def __init__(self, path, rules=DEFAULT_RULES, event_driven=False):
+        self.path = path
+        self.automation_system = AutomationSystem(rules=rules)
+        self.event_driven = event_driven
+
+    def run(self, speed=None):
+        """Replay the whole trace and return a ReplayReport."""
+        system = self.automation_system
+        events = read_trace(self.path)
+        initial = {}
+        expected = {}
+        event = next(events, None)
+        while event is not None and event.kind == STATE:
+            initial[event.device_id] = expected[event.device_id] = event.data
+            event = next(events, None)
+        apply_states(system, initial)
+        if self.event_driven:
+            system.enable_event_driven()
+        for rule in system.rules.rules.values():
+            rule.histogram.reset()
+
+        latencies = {"command": [], "tick": []}
+        first_time = None if event is None else event.timestamp
+        start = time.perf_counter()
+        max_lag = 0.0
+        while event is not None:
+            if event.kind == STATE:
+                if event.device_id not in system.registry:
+                    apply_states(system, {event.device_id: event.data})  # Added during the recording
+                expected[event.device_id] = event.data
+                event = next(events, None)
+                continue
+            if speed:
+                due = start + (event.timestamp - first_time) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            began = time.perf_counter()
+            if event.kind == COMMAND:
+                command, args = event.data
+                device = system.registry.get(event.device_id)
+                if device is None:
+                    raise TraceError(f"{self.path}: command {command} for unknown device {event.device_id}.")
+                getattr(device, command)(*args)
+                latencies["command"].append(time.perf_counter() - began)
+            else:
+                system.run_simulation()
+                latencies["tick"].append(time.perf_counter() - began)
+            event = next(events, None)
+        elapsed = time.perf_counter() - start
+
+        differences = []
+        for device_id, state in expected.items():
+            device = system.registry.get(device_id)
+            try:
+                replayed = None if device is None else device_state(device)
+            except PersistenceError:
+                replayed = None  # The trace could not record this state either
+            if replayed != state:
+                differences.append((device_id, state, replayed))
+        replayed_events = len(latencies["command"]) + len(latencies["tick"])
+        rule_latencies = {name: {"count": rule.histogram.count, 50: rule.histogram.quantile(0.5),
+                                 99: rule.histogram.quantile(0.99)}
+                          for name, rule in system.rules.rules.items() if rule.histogram.count}
+        return ReplayReport(replayed_events, len(latencies["command"]), len(latencies["tick"]), elapsed,
+                            replayed_events / elapsed if elapsed else 0.0, max_lag,
+                            {kind: percentiles(values) for kind, values in latencies.items()},
+                            rule_latencies, differences)
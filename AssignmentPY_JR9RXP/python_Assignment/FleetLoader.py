@@ -0,0 +1,131 @@
+import csv
+import json
+import os
+from DeviceStatus import DeviceStatus
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+
+DEVICE_CLASSES = {"SmartLight": SmartLight, "Thermostat": Thermostat, "SecurityCamera": SecurityCamera}
+CSV_FIELDS = ["id", "type", "status", "brightness", "temperature", "recording", "infrared"]
+BRIGHTNESS_RANGE = (0, 100)
+
+
+class FleetConfigError(Exception):
+    """Raised when a fleet file contains an invalid device definition."""
+    pass
+
+
+def iter_definitions(path, file_format=None):
+    """Stream (line number, definition dict) pairs from a JSON Lines or CSV fleet file.
+
+    The format follows the file extension (.jsonl/.json or .csv) unless file_format is given.
+    CSV files have a header row with the CSV_FIELDS columns; empty cells mean "default".
+    """
+    file_format = file_format or ("csv" if os.path.splitext(path)[1].lower() == ".csv" else "jsonl")
+    with open(path, encoding="utf-8", newline="") as f:
+        if file_format == "csv":
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, {key: value for key, value in row.items() if value not in ("", None)}
+        elif file_format == "jsonl":
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        raise FleetConfigError(f"{path}:{line_number}: invalid JSON: {e}")
+        else:
+            raise FleetConfigError(f"Unknown fleet file format: {file_format}")
+
+
+def create_device(definition, automation_system):
+    """Create an unregistered device in the state the definition describes."""
+    device_class = DEVICE_CLASSES.get(definition.get("type"))
+    if device_class is None:
+        raise ValueError(f"unknown device type {definition.get('type')!r}")
+    device_id = definition.get("id")
+    if not device_id:
+        raise ValueError("missing device id")
+    device = automation_system.create_device(device_class, str(device_id))
+    # State is set before registration, so nothing is logged or re-indexed per attribute
+    device._status = DeviceStatus(definition.get("status", "off"))
+    if device_class is SmartLight:
+        default = SmartLight.DEFAULT_BRIGHTNESS if device._status == DeviceStatus.ON else 0
+        device.brightness = int(definition.get("brightness", default))
+    elif device_class is Thermostat:
+        device.temperature = int(definition.get("temperature", Thermostat.DEFAULT_TEMPERATURE))
+    else:
+        device.recording = _flag(definition.get("recording", False))
+        device.infrared = _flag(definition.get("infrared", False))
+    return device
+
+
+def describe_device(device):
+    """Return a device's current state as a definition that create_device accepts."""
+    definition = {"id": device.device_id, "type": type(device).__name__, "status": str(device.status)}
+    if isinstance(device, SmartLight):
+        definition["brightness"] = device.brightness
+    elif isinstance(device, Thermostat):
+        definition["temperature"] = device.temperature
+    else:
+        definition["recording"] = device.recording
+        definition["infrared"] = device.infrared
+    return definition
+
+
+def load_fleet(automation_system, path, file_format=None, batch_size=10000):
+    """Stream device definitions from a fleet file and register them in batches; returns the count.
+
+    The whole file is checked before any device is registered, so an invalid file registers nothing.
+    """
+    devices = []
+    ids = set()
+    for line_number, definition in iter_definitions(path, file_format):
+        try:
+            _check_ranges(definition)
+            device = create_device(definition, automation_system)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise FleetConfigError(f"{path}:{line_number}: {e}")
+        if device.device_id in ids:
+            raise FleetConfigError(f"{path}:{line_number}: duplicate device id {device.device_id}")
+        if device.device_id in automation_system.registry:
+            raise FleetConfigError(f"{path}:{line_number}: device {device.device_id} is already registered")
+        ids.add(device.device_id)
+        devices.append(device)
+    for start in range(0, len(devices), batch_size):
+        automation_system.add_devices(devices[start:start + batch_size])
+    return len(devices)
+
+
+def write_fleet(path, definitions):
+    """Write device definitions to a JSON Lines or CSV file, chosen by the file extension."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(definitions)
+        else:
+            for definition in definitions:
+                f.write(json.dumps(definition) + "\n")
+
+
+def _check_ranges(definition):
+    # Fleet files are held to the same limits as set_brightness and set_temperature;
+    # create_device itself accepts any value a device can hold
+    if definition.get("type") == "SmartLight" and "brightness" in definition:
+        _in_range("brightness", definition["brightness"], *BRIGHTNESS_RANGE)
+    elif definition.get("type") == "Thermostat" and "temperature" in definition:
+        _in_range("temperature", definition["temperature"], Thermostat.MIN_TEMPERATURE, Thermostat.MAX_TEMPERATURE)
+
+
+def _in_range(name, value, low, high):
+    value = int(value)
+    if not low <= value <= high:
+        raise ValueError(f"{name} {value} is outside {low}-{high}")
+
+
+def _flag(value):
+    # JSON gives booleans, CSV gives strings such as "true" or "0"
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
@@ -0,0 +1,228 @@
+try:
+    import numpy as np  # optional dependency, only needed for the columnar backend
+except ImportError:
+    np = None
+from DeviceStatus import DeviceStatus
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+
+
+class ColumnTable:
+    """Growable set of NumPy columns for one device type, plus bit-packed boolean columns.
+
+    Every table has a "registered" column: a row is reserved when its view is created, but only
+    counts for the fleet-wide queries once the device is registered with an automation system.
+    """
+
+    def __init__(self, dtypes, bit_columns=(), capacity=1024):
+        """Allocate zeroed columns for `capacity` rows."""
+        self.size = 0
+        self.capacity = capacity
+        self.views = []  # Row index -> device view object
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in dict(dtypes, registered=np.bool_).items()}
+        self.bits = {name: np.zeros((capacity + 7) // 8, np.uint8) for name in bit_columns}
+
+    def append(self, view):
+        """Reserve a new row for a view and return its index."""
+        if self.size == self.capacity:
+            self._grow(self.capacity * 2)
+        row = self.size
+        self.size += 1
+        self.views.append(view)
+        return row
+
+    def column(self, name):
+        """Return the used part of a column (no copy)."""
+        return self.columns[name][:self.size]
+
+    def registered_column(self, name):
+        """Return a bool column with the rows of unregistered devices cleared."""
+        return self.column(name) & self.column("registered")
+
+    def set_int(self, name, row, value):
+        """Write an integer to a column, clamped to the column's range instead of overflowing."""
+        limits = np.iinfo(self.columns[name].dtype)
+        self.columns[name][row] = min(max(int(value), limits.min), limits.max)
+
+    def bit_column(self, name):
+        """Return a bit-packed column unpacked to a bool array."""
+        return np.unpackbits(self.bits[name], count=self.size, bitorder="little").astype(bool)
+
+    def get_bit(self, name, row):
+        """Read one bit of a bit-packed column."""
+        return bool((self.bits[name][row >> 3] >> (row & 7)) & 1)
+
+    def set_bit(self, name, row, value):
+        """Write one bit of a bit-packed column."""
+        if value:
+            self.bits[name][row >> 3] |= np.uint8(1 << (row & 7))
+        else:
+            self.bits[name][row >> 3] &= np.uint8(~(1 << (row & 7)) & 0xFF)
+
+    def views_where(self, mask):
+        """Return the device views whose rows are set in a bool mask."""
+        return [self.views[row] for row in np.flatnonzero(mask)]
+
+    def _grow(self, capacity):
+        # Reallocate every column with the new capacity and copy the existing rows across.
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+        for name, bits in self.bits.items():
+            grown = np.zeros((capacity + 7) // 8, np.uint8)
+            grown[:len(bits)] = bits
+            self.bits[name] = grown
+        self.capacity = capacity
+
+
+class FleetStore:
+    """Columnar state for a whole fleet: one row per device instead of one object's attributes."""
+
+    def __init__(self, capacity=1024):
+        """Create empty light, thermostat and camera tables."""
+        if np is None:
+            raise ImportError("FleetStore requires numpy.")
+        # int16, so out-of-range values that the device classes accept (adjust_brightness(300))
+        # are kept as they are; set_int clamps anything beyond the int16 range
+        self.lights = ColumnTable({"status": np.bool_, "brightness": np.int16}, capacity=capacity)
+        self.thermostats = ColumnTable({"status": np.bool_, "temperature": np.int16}, capacity=capacity)
+        self.cameras = ColumnTable({"status": np.bool_}, bit_columns=("recording", "infrared"), capacity=capacity)
+
+    def __len__(self):
+        return self.lights.size + self.thermostats.size + self.cameras.size
+
+    def create_light(self, device_id, automation_system):
+        """Create a SmartLight backed by a new row of the light table."""
+        return StoreSmartLight(self, device_id, automation_system)
+
+    def create_thermostat(self, device_id, automation_system=None):
+        """Create a Thermostat backed by a new row of the thermostat table."""
+        return StoreThermostat(self, device_id, automation_system)
+
+    def create_camera(self, device_id, automation_system):
+        """Create a SecurityCamera backed by a new row of the camera table."""
+        return StoreSecurityCamera(self, device_id, automation_system)
+
+    def register(self, device):
+        """Count a device's row in the fleet-wide queries; returns False if the device is not
+        backed by this store."""
+        table = getattr(device, "_table", None)
+        if table not in (self.lights, self.thermostats, self.cameras) or table.views[device._row] is not device:
+            return False
+        table.columns["registered"][device._row] = True
+        return True
+
+    def create(self, device_class, device_id, automation_system):
+        """Create a SmartLight, Thermostat or SecurityCamera backed by a new row of its table."""
+        if issubclass(device_class, SmartLight):
+            return self.create_light(device_id, automation_system)
+        if issubclass(device_class, Thermostat):
+            return self.create_thermostat(device_id, automation_system)
+        if issubclass(device_class, SecurityCamera):
+            return self.create_camera(device_id, automation_system)
+        raise TypeError(f"FleetStore cannot hold {device_class.__name__} devices.")
+
+    def any_dim_light_on(self):
+        """Check whether any light is on below 50% brightness."""
+        return bool(np.any(self.lights.registered_column("status") & (self.lights.column("brightness") < 50)))
+
+    def recording_condition(self):
+        """Check whether at least one thermostat is off while every light is off."""
+        thermostats_off = self.thermostats.column("registered") & ~self.thermostats.column("status")
+        return bool(thermostats_off.any() and not self.lights.registered_column("status").any())
+
+    def cameras_on_without(self, bit_column):
+        """Return cameras that are on but have the given bit column (recording/infrared) unset."""
+        mask = self.cameras.registered_column("status") & ~self.cameras.bit_column(bit_column)
+        return self.cameras.views_where(mask)
+
+
+class StoreSmartLight(SmartLight):
+    """SmartLight whose status and brightness live in a FleetStore row."""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, store, device_id, automation_system):
+        self._table = store.lights
+        self._row = self._table.append(self)
+        super().__init__(device_id, automation_system)
+
+    @property
+    def _status(self):
+        return DeviceStatus.ON if self._table.columns["status"][self._row] else DeviceStatus.OFF
+
+    @_status.setter
+    def _status(self, value):
+        self._table.columns["status"][self._row] = value == "on"
+
+    @property
+    def brightness(self):
+        return int(self._table.columns["brightness"][self._row])
+
+    @brightness.setter
+    def brightness(self, value):
+        self._table.set_int("brightness", self._row, value)
+
+
+class StoreThermostat(Thermostat):
+    """Thermostat whose status and temperature live in a FleetStore row."""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, store, device_id, automation_system=None):
+        self._table = store.thermostats
+        self._row = self._table.append(self)
+        super().__init__(device_id, automation_system)
+
+    @property
+    def _status(self):
+        return DeviceStatus.ON if self._table.columns["status"][self._row] else DeviceStatus.OFF
+
+    @_status.setter
+    def _status(self, value):
+        self._table.columns["status"][self._row] = value == "on"
+
+    @property
+    def temperature(self):
+        return int(self._table.columns["temperature"][self._row])
+
+    @temperature.setter
+    def temperature(self, value):
+        self._table.set_int("temperature", self._row, value)
+
+
+class StoreSecurityCamera(SecurityCamera):
+    """SecurityCamera whose status, recording and infrared flags live in a FleetStore row."""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, store, device_id, automation_system):
+        self._table = store.cameras
+        self._row = self._table.append(self)
+        super().__init__(device_id, automation_system)
+
+    @property
+    def _status(self):
+        return DeviceStatus.ON if self._table.columns["status"][self._row] else DeviceStatus.OFF
+
+    @_status.setter
+    def _status(self, value):
+        self._table.columns["status"][self._row] = value == "on"
+
+    @property
+    def recording(self):
+        return self._table.get_bit("recording", self._row)
+
+    @recording.setter
+    def recording(self, value):
+        self._table.set_bit("recording", self._row, value)
+
+    @property
+    def infrared(self):
+        return self._table.get_bit("infrared", self._row)
+
+    @infrared.setter
+    def infrared(self, value):
+        self._table.set_bit("infrared", self._row, value)
@@ -0,0 +1,467 @@
+import itertools
+import json
+import os
+import queue
+import selectors
+import socket
+import struct
+import threading
+from EventLog import get_log
+from Metrics import get_metrics
+
+# Every frame is a little-endian body length and a kind, followed by the body. A publish body is
+# the topic, a NUL byte and the JSON message; subscribe, unsubscribe and ack bodies are the pattern.
+FRAME = struct.Struct("<IB")
+PUBLISH, SUBSCRIBE, UNSUBSCRIBE, ACK = 1, 2, 3, 4
+RECEIVE_SIZE = 256 * 1024
+MAX_OUTPUT = 8 * 1024 * 1024
+
+
+class BusError(Exception):
+    """Raised when the message bus cannot be reached or a frame is malformed."""
+    pass
+
+
+def state_topic(device_id):
+    """Topic on which a device publishes its full state after every change."""
+    return f"home/{device_id}/state"
+
+
+def command_topic(device_id):
+    """Topic on which a device receives commands, {"call": method name, "args": [...]}."""
+    return f"home/{device_id}/command"
+
+
+def topic_matches(pattern, topic):
+    """MQTT-style matching: "+" matches one topic level, a trailing "#" matches the rest."""
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    for position, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if position >= len(topic_levels) or (level != "+" and level != topic_levels[position]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+def encode_frame(kind, topic, message=None):
+    """Encode one frame; message, if given, is serialized as compact JSON after the topic."""
+    body = topic.encode("utf-8")
+    if message is not None:
+        body += b"\0" + json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return FRAME.pack(len(body), kind) + body
+
+
+def decode_publish(body):
+    """Split a publish body into (topic, message)."""
+    topic, _, payload = bytes(body).partition(b"\0")
+    return topic.decode("utf-8"), json.loads(payload)
+
+
+def iter_frames(buffer):
+    """Yield (kind, start, end) of each complete frame body in buffer; returns the bytes consumed."""
+    offset = 0
+    size = len(buffer)
+    while size - offset >= FRAME.size:
+        length, kind = FRAME.unpack_from(buffer, offset)
+        end = offset + FRAME.size + length
+        if end > size:
+            break
+        yield kind, offset + FRAME.size, end
+        offset = end
+    return offset
+
+
+class LocalBus:
+    """In-process backend: publish() calls the matching subscribers synchronously, in order."""
+
+    def __init__(self):
+        self._subscriptions = {}  # token -> (pattern, callback)
+        self._routes = {}  # topic -> callbacks, cached until the subscriptions change
+        self._tokens = itertools.count(1)
+
+    def subscribe(self, pattern, callback):
+        """Call callback(topic, message) for every message on a matching topic; returns a token."""
+        token = next(self._tokens)
+        self._subscriptions[token] = (pattern, callback)
+        self._routes.clear()
+        return token
+
+    def unsubscribe(self, token):
+        """Remove a subscription made with subscribe()."""
+        self._subscriptions.pop(token, None)
+        self._routes.clear()
+
+    def patterns(self):
+        """Patterns with at least one subscriber."""
+        return {pattern for pattern, _ in self._subscriptions.values()}
+
+    def publish(self, topic, message):
+        """Deliver a message to the subscribers of its topic; errors in one subscriber are logged."""
+        callbacks = self._routes.get(topic)
+        if callbacks is None:
+            callbacks = self._routes[topic] = [callback for pattern, callback in self._subscriptions.values()
+                                               if topic_matches(pattern, topic)]
+        for callback in callbacks:
+            try:
+                callback(topic, message)
+            except Exception as e:
+                get_log().error("MessageBus", "Error in subscriber for {}: {}", topic, e)
+
+    def flush(self):
+        """Nothing is buffered in process."""
+
+    def deliver(self, timeout=0):
+        """Messages are delivered as they are published; always returns 0."""
+        return 0
+
+    def close(self):
+        self._subscriptions.clear()
+        self._routes.clear()
+
+
+class BusBroker:
+    """Unix-domain-socket broker routing published frames to the connections subscribed to them.
+
+    One selector thread serves every connection. Sockets are non-blocking and each connection has
+    an output buffer, so a slow subscriber never stalls the others; all frames routed to a
+    connection while handling one read are sent with a single send call. A subscriber whose
+    buffer grows past max_output bytes is not keeping up and is disconnected.
+    """
+
+    def __init__(self, path, max_output=MAX_OUTPUT):
+        self.path = path
+        self.max_output = max_output
+        self._selector = selectors.DefaultSelector()
+        self._listener = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._inputs = {}  # connection -> bytearray of received, unparsed bytes
+        self._outputs = {}  # connection -> bytearray of frames waiting to be sent
+        self._patterns = {}  # connection -> set of subscribed patterns
+        self._routes = {}  # topic -> connections, cached until the subscriptions change
+
+    def start(self):
+        """Listen on the socket path and serve connections on a background thread."""
+        self._listen()
+        self._thread = threading.Thread(target=self._serve, name="BusBroker", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Listen on the socket path and serve connections on the calling thread until close()."""
+        self._listen()
+        self._serve()
+
+    def close(self):
+        """Stop serving, close every connection and remove the socket file."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _listen(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(128)
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ)
+
+    def _serve(self):
+        try:
+            while not self._stopped.is_set():
+                for key, events in self._selector.select(timeout=0.1):
+                    if key.fileobj is self._listener:
+                        self._accept()
+                        continue
+                    if key.fileobj not in self._inputs:
+                        continue  # Dropped while handling an earlier event of this batch
+                    if events & selectors.EVENT_READ:
+                        self._read(key.fileobj)
+                    if events & selectors.EVENT_WRITE and key.fileobj in self._outputs:
+                        self._write(key.fileobj)
+        finally:
+            for connection in list(self._inputs):
+                self._drop(connection)
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            self._selector.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _accept(self):
+        connection, _ = self._listener.accept()
+        connection.setblocking(False)
+        self._inputs[connection] = bytearray()
+        self._outputs[connection] = bytearray()
+        self._patterns[connection] = set()
+        self._selector.register(connection, selectors.EVENT_READ)
+
+    def _read(self, connection):
+        try:
+            data = connection.recv(RECEIVE_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(connection)
+            return
+        buffer = self._inputs[connection]
+        buffer.extend(data)
+        touched = set()
+        slow = set()
+        with memoryview(buffer) as view:
+            frames = iter_frames(view)
+            while True:
+                try:
+                    kind, start, end = next(frames)
+                except StopIteration as done:
+                    consumed = done.value
+                    break
+                if kind == PUBLISH:
+                    topic = bytes(view[start:end]).partition(b"\0")[0].decode("utf-8")
+                    for subscriber in self._route(topic):
+                        output = self._outputs[subscriber]
+                        if len(output) > self.max_output:
+                            slow.add(subscriber)
+                            continue
+                        output += view[start - FRAME.size:end]
+                        touched.add(subscriber)
+                elif kind in (SUBSCRIBE, UNSUBSCRIBE):
+                    pattern = bytes(view[start:end]).decode("utf-8")
+                    if kind == SUBSCRIBE:
+                        self._patterns[connection].add(pattern)
+                    else:
+                        self._patterns[connection].discard(pattern)
+                    self._routes.clear()
+                    self._outputs[connection] += encode_frame(ACK, pattern)
+                    touched.add(connection)
+        del buffer[:consumed]
+        for subscriber in slow:
+            get_log().warning("MessageBus", "Disconnecting a subscriber with {} bytes of unsent messages.",
+                              len(self._outputs[subscriber]))
+            self._drop(subscriber)
+        for subscriber in touched - slow:
+            self._write(subscriber)
+
+    def _write(self, connection):
+        output = self._outputs.get(connection)
+        if output is None:
+            return
+        try:
+            sent = connection.send(output) if output else 0
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._drop(connection)
+            return
+        del output[:sent]
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if output else selectors.EVENT_READ
+        if self._selector.get_key(connection).events != events:
+            self._selector.modify(connection, events)
+
+    def _route(self, topic):
+        connections = self._routes.get(topic)
+        if connections is None:
+            connections = self._routes[topic] = [
+                connection for connection, patterns in self._patterns.items()
+                if any(topic_matches(pattern, topic) for pattern in patterns)]
+        return connections
+
+    def _drop(self, connection):
+        if connection not in self._inputs:
+            return
+        self._selector.unregister(connection)
+        connection.close()
+        del self._inputs[connection], self._outputs[connection], self._patterns[connection]
+        self._routes.clear()
+
+
+class PooledConnection:
+    """A publishing connection to the broker with its own frame buffer."""
+
+    __slots__ = ("sock", "frames", "lock")
+
+    def __init__(self):
+        self.sock = None
+        self.frames = []
+        self.lock = threading.Lock()
+
+
+class SocketBus:
+    """Client of a BusBroker, with the same interface as LocalBus.
+
+    Publishes are buffered and sent as one write once batch_size frames are waiting, or by the
+    flusher thread after at most flush_interval seconds. Publishing threads share a small pool of
+    connections; each thread always uses the same one, so its messages arrive in order. Messages
+    for subscriptions arrive on a separate connection and are passed to the callbacks on the
+    reader thread, or, with threaded=False, queued until the owner calls deliver().
+    """
+
+    def __init__(self, path, pool_size=2, batch_size=64, flush_interval=0.002, threaded=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.threaded = threaded
+        self._pool = [PooledConnection() for _ in range(pool_size)]
+        self._assigned = threading.local()
+        self._next_connection = itertools.count()
+        self._local = LocalBus()  # Dispatches received messages to this client's callbacks
+        self._subscriber = None
+        self._subscribe_lock = threading.Lock()
+        self._acks = queue.Queue()
+        self._inbox = queue.Queue()
+        self._reader = None
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._run_flusher, name="BusFlusher", daemon=True)
+        self._flusher.start()
+
+        metrics = get_metrics()
+        self.published = metrics.counter("bus_messages_total", "Messages sent or received by bus clients",
+                                         direction="published")
+        self.received = metrics.counter("bus_messages_total", "Messages sent or received by bus clients",
+                                        direction="received")
+        self.batches = metrics.counter("bus_batches_total", "Batched writes sent to the broker")
+
+    def publish(self, topic, message):
+        """Queue a message for the broker; it is sent with the next batch."""
+        frame = encode_frame(PUBLISH, topic, message)
+        connection = self._connection()
+        with connection.lock:
+            connection.frames.append(frame)
+            if len(connection.frames) >= self.batch_size:
+                self._send(connection)
+
+    def flush(self):
+        """Send every buffered publish now."""
+        for connection in self._pool:
+            with connection.lock:
+                self._send(connection)
+
+    def subscribe(self, pattern, callback):
+        """Subscribe callback(topic, message) to a pattern; returns once the broker has confirmed it."""
+        with self._subscribe_lock:
+            new_pattern = pattern not in self._local.patterns()
+            token = self._local.subscribe(pattern, callback)
+            if new_pattern:
+                self._request(SUBSCRIBE, pattern)
+        return token
+
+    def unsubscribe(self, token):
+        """Remove a subscription; the broker stops routing a pattern once no callback uses it."""
+        with self._subscribe_lock:
+            patterns = self._local.patterns()
+            self._local.unsubscribe(token)
+            for pattern in patterns - self._local.patterns():
+                self._request(UNSUBSCRIBE, pattern)
+
+    def deliver(self, timeout=0):
+        """Run the callbacks for queued messages on the calling thread (threaded=False); returns how many."""
+        delivered = 0
+        try:
+            item = self._inbox.get(timeout=timeout) if timeout else self._inbox.get_nowait()
+            while True:
+                self._local.publish(*item)
+                delivered += 1
+                item = self._inbox.get_nowait()
+        except queue.Empty:
+            return delivered
+
+    def close(self):
+        """Send buffered publishes, then close every connection."""
+        self.flush()
+        self._stopped.set()
+        self._flusher.join()
+        for connection in self._pool:
+            if connection.sock is not None:
+                connection.sock.close()
+        if self._subscriber is not None:
+            self._subscriber.shutdown(socket.SHUT_RDWR)
+            self._reader.join()
+            self._subscriber.close()
+
+    def _connection(self):
+        # Threads are spread over the pool on first use and keep their connection afterwards
+        connection = getattr(self._assigned, "connection", None)
+        if connection is None:
+            connection = self._assigned.connection = self._pool[next(self._next_connection) % len(self._pool)]
+        return connection
+
+    def _send(self, connection):
+        # Caller holds connection.lock
+        if not connection.frames:
+            return
+        if connection.sock is None:
+            connection.sock = self._connect()
+        data = b"".join(connection.frames)
+        count = len(connection.frames)
+        connection.frames.clear()
+        try:
+            connection.sock.sendall(data)
+        except OSError as e:
+            connection.sock.close()
+            connection.sock = None
+            raise BusError(f"Cannot publish to {self.path}: {e}")
+        self.published.value += count
+        self.batches.value += 1
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise BusError(f"Cannot connect to the message bus at {self.path}: {e}")
+        return sock
+
+    def _request(self, kind, pattern):
+        # Caller holds _subscribe_lock; the ack arrives on the subscriber connection in order
+        if self._subscriber is None:
+            self._subscriber = self._connect()
+            self._reader = threading.Thread(target=self._run_reader, name="BusReader", daemon=True)
+            self._reader.start()
+        self._subscriber.sendall(encode_frame(kind, pattern))
+        try:
+            self._acks.get(timeout=5)
+        except queue.Empty:
+            raise BusError(f"The message bus at {self.path} did not confirm {pattern}.")
+
+    def _run_flusher(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except BusError as e:
+                get_log().error("MessageBus", "Error flushing publishes: {}", e)
+
+    def _run_reader(self):
+        buffer = bytearray()
+        while True:
+            try:
+                data = self._subscriber.recv(RECEIVE_SIZE)
+            except OSError:
+                data = b""
+            if not data:
+                return
+            buffer.extend(data)
+            messages = []
+            with memoryview(buffer) as view:
+                frames = iter_frames(view)
+                while True:
+                    try:
+                        kind, start, end = next(frames)
+                    except StopIteration as done:
+                        consumed = done.value
+                        break
+                    if kind == PUBLISH:
+                        messages.append(decode_publish(view[start:end]))
+                    elif kind == ACK:
+                        self._acks.put(bytes(view[start:end]).decode("utf-8"))
+            del buffer[:consumed]
+            self.received.value += len(messages)
+            for topic, message in messages:
+                if self.threaded:
+                    self._local.publish(topic, message)
+                else:
+                    self._inbox.put((topic, message))
@@ -0,0 +1,309 @@
+import bisect
+import functools
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Upper bounds in seconds; rule and tick timings range from microseconds to seconds
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class CounterMetric:
+    """Monotonic counter."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def reset(self):
+        self.value = 0
+
+
+class GaugeMetric:
+    """Value that can go up and down, such as a queue depth."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        self.value = 0
+
+
+class HistogramMetric:
+    """Fixed-bucket histogram; observe() is a bisect and three additions."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (like histogram_quantile, without interpolation)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Named, labelled counters, gauges and histograms, exportable in the Prometheus text format.
+
+    Updates are not locked: under the GIL a lost increment between threads is possible but
+    rare, which is an acceptable trade for keeping collection cheap enough to leave on.
+    """
+
+    def __init__(self):
+        self._families = {}  # name -> (type, help, {label tuple: metric})
+        self.track_devices = False  # Also count commands per device id (high cardinality)
+        self.device_commands = Counter()
+        self.profiler = None
+
+    def counter(self, name, help_text="", **labels):
+        """Return the counter for name and labels, creating it on first use."""
+        return self._metric(name, "counter", help_text, labels, CounterMetric)
+
+    def gauge(self, name, help_text="", **labels):
+        """Return the gauge for name and labels, creating it on first use."""
+        return self._metric(name, "gauge", help_text, labels, GaugeMetric)
+
+    def histogram(self, name, help_text="", **labels):
+        """Return the histogram for name and labels, creating it on first use."""
+        return self._metric(name, "histogram", help_text, labels, HistogramMetric)
+
+    def reset(self):
+        """Zero every metric in place; decorated functions keep their references."""
+        for _, _, metrics in self._families.values():
+            for metric in metrics.values():
+                metric.reset()
+        self.device_commands.clear()
+
+    def to_prometheus_text(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, (metric_type, help_text, metrics) in sorted(self._families.items()):
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, metric in metrics.items():
+                if metric_type != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.bounds + (float("inf"),), metric.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+        if self.device_commands:
+            lines.append("# TYPE device_commands_by_id_total counter")
+            for device_id, count in self.device_commands.items():
+                lines.append(f"device_commands_by_id_total{_format_labels((('device_id', device_id),))} {count}")
+        if self.profiler is not None:
+            lines.extend(self.profiler.to_prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write the metrics to a file atomically, so scrapers never read a partial dump."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus_text())
+        os.replace(temporary, path)
+
+    def serve(self, address):
+        """Serve a metrics dump to every connection on a Unix socket path or a (host, port) pair."""
+        registry = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(registry.to_prometheus_text().encode("utf-8"))
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            server = socketserver.ThreadingUnixStreamServer(address, Handler)
+        else:
+            server = socketserver.ThreadingTCPServer(address, Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+        return server
+
+    def start_profiler(self, interval=0.005):
+        """Start a sampling profiler whose results are included in the export."""
+        if self.profiler is None:
+            self.profiler = SamplingProfiler(interval)
+            self.profiler.start()
+        return self.profiler
+
+    def stop_profiler(self):
+        """Stop the sampling profiler; its last results stay in the export."""
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def _metric(self, name, metric_type, help_text, labels, factory):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (metric_type, help_text, {})
+        key = tuple(sorted(labels.items()))
+        metrics = family[2]
+        metric = metrics.get(key)
+        if metric is None:
+            metric = metrics[key] = factory()
+        return metric
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples the innermost frame of every other thread at a fixed interval."""
+
+    def __init__(self, interval=0.005, top=50):
+        super().__init__(name="SamplingProfiler", daemon=True)
+        self.interval = interval
+        self.top = top
+        self.samples = Counter()  # "file:function" -> samples
+        self._stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    code = frame.f_code
+                    self.samples[f"{os.path.basename(code.co_filename)}:{code.co_name}"] += 1
+
+    def stop(self):
+        self._stopped.set()
+
+    def to_prometheus_lines(self):
+        lines = ["# HELP profile_samples_total Sampling profiler hits per innermost function",
+                 "# TYPE profile_samples_total counter"]
+        for function, count in self.samples.most_common(self.top):
+            lines.append(f"profile_samples_total{_format_labels((('function', function),))} {count}")
+        return lines
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = (f'{key}="{_escape_label_value(value)}"' for key, value in labels)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape_label_value(value):
+    # Exposition format escapes for label values: backslash, double quote and newline
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics = MetricsRegistry()
+_command_hooks = []  # Callables hook(device, command, args) told about every top-level device command
+_command_context = threading.local()  # Per-thread nesting depth of running device commands
+_no_lock = nullcontext()  # Used for devices that are not in an automation system
+
+
+def get_metrics():
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+def timed(name, help_text="", **labels):
+    """Decorator recording each call's duration in a histogram, which also counts the calls."""
+    def decorator(function):
+        histogram = _metrics.histogram(name, help_text, **labels)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def counted_command(method):
+    """Decorator for device command methods: counts calls per device type and command.
+
+    The command runs under its automation system's lock, so it and the rules and listeners it
+    triggers are one step even when a CommandDispatcher runs commands on pool threads.
+    """
+    counters = {}  # device class -> counter, so the lookup happens once per class
+    command = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        device_class = type(self)
+        counter = counters.get(device_class)
+        if counter is None:
+            counter = counters[device_class] = _metrics.counter(
+                "device_commands_total", "Device commands by device type and command",
+                device_type=device_class.__name__, command=command)
+        counter.value += 1
+        if _metrics.track_devices:
+            _metrics.device_commands[self.device_id] += 1
+        with getattr(self.automation_system, "lock", _no_lock):
+            if _command_hooks and not getattr(_command_context, "depth", 0):
+                for hook in _command_hooks:
+                    hook(self, command, args)
+                with nested_commands():
+                    return method(self, *args, **kwargs)
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def add_command_hook(hook):
+    """Call hook(device, command, args) before every top-level device command.
+
+    Commands run by another command (turn_on calling detect_motion) or inside nested_commands(),
+    such as the actions of a rule tick, are consequences rather than inputs and are not reported.
+    """
+    _command_hooks.append(hook)
+
+
+def remove_command_hook(hook):
+    """Stop calling a hook added with add_command_hook."""
+    _command_hooks.remove(hook)
+
+
+def in_nested_commands():
+    """Check whether the calling thread is inside a device command or a nested_commands() block."""
+    return getattr(_command_context, "depth", 0) > 0
+
+
+@contextmanager
+def nested_commands():
+    """Treat the device commands run inside the block as caused by the caller, not as top-level."""
+    depth = getattr(_command_context, "depth", 0)
+    _command_context.depth = depth + 1
+    try:
+        yield
+    finally:
+        _command_context.depth = depth
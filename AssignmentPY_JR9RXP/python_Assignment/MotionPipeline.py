@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+from Clock import get_clock
+from EventLog import get_log
+from Metrics import get_metrics
+
+
+class MotionPipeline:
+    """Ingests raw motion triggers and turns bursts of them into single detect_motion calls.
+
+    Sensors call submit() from any thread. Each camera has a bounded queue: once it is full,
+    further triggers are dropped and submit() returns False, so a producer can back off instead
+    of the queue growing without limit. Triggers within debounce seconds of the last handled
+    motion are discarded. A camera's pending triggers are coalesced for coalesce_window seconds
+    after the first one and then handled as one motion event; process() handles every camera
+    that is due in one pass inside a single automation batch. Call process() from the thread
+    that owns the automation system, e.g. as a periodic simulator event or a worker command.
+    """
+
+    def __init__(self, automation_system, queue_size=64, debounce=1.0, coalesce_window=0.1, max_batch=1024):
+        """Create a pipeline; times are in seconds of the shared clock (see Clock.get_clock)."""
+        self.automation_system = automation_system
+        self.queue_size = queue_size
+        self.debounce = debounce
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch  # Most cameras handled per process() call
+        self._queues = {}  # device_id -> deque of trigger timestamps, only while triggers are pending
+        self._due = {}  # device_id -> time its first pending trigger arrived, oldest first
+        self._last_handled = {}  # device_id -> time its last motion event was handled, oldest first
+        self._pending = 0  # Triggers waiting in this pipeline; the gauge sums every pipeline
+        self._lock = threading.Lock()
+
+        metrics = get_metrics()
+        help_text = "Motion triggers by outcome"
+        self.accepted = metrics.counter("motion_triggers_total", help_text, outcome="accepted")
+        self.dropped = metrics.counter("motion_triggers_total", help_text, outcome="dropped")
+        self.debounced = metrics.counter("motion_triggers_total", help_text, outcome="debounced")
+        self.coalesced = metrics.counter("motion_triggers_total", help_text, outcome="coalesced")
+        self.handled = metrics.counter("motion_events_handled_total", "Motion events passed to cameras")
+        self.queue_depth = metrics.gauge("motion_queue_depth", "Motion triggers waiting to be processed")
+        self.latency = metrics.histogram("motion_latency_seconds", "Time from first trigger to handling")
+        self.batch_duration = metrics.histogram("motion_batch_seconds", "Duration of a motion processing pass")
+
+    def submit(self, device_id, timestamp=None):
+        """Queue a motion trigger; returns False if it was dropped because the camera's queue is full."""
+        now = get_clock().now() if timestamp is None else timestamp
+        with self._lock:
+            last_handled = self._last_handled.get(device_id)
+            if last_handled is not None and now - last_handled < self.debounce:
+                self.debounced.value += 1
+                return True
+            queue = self._queues.get(device_id)
+            if queue is None:
+                queue = self._queues[device_id] = deque()
+            if len(queue) >= self.queue_size:
+                self.dropped.value += 1
+                return False
+            if not queue:
+                self._due[device_id] = now
+            queue.append(now)
+            self.accepted.value += 1
+            self.queue_depth.value += 1
+            self._pending += 1
+        return True
+
+    def pending(self):
+        """Number of triggers waiting to be processed by this pipeline."""
+        return self._pending
+
+    def next_due(self):
+        """Time at which the oldest pending camera is due, or None if nothing is pending."""
+        with self._lock:
+            first = next(iter(self._due.values()), None)
+        return None if first is None else first + self.coalesce_window
+
+    def process(self, now=None):
+        """Handle every camera whose coalescing window has passed, in one batch; returns how many."""
+        now = get_clock().now() if now is None else now
+        start = time.perf_counter()
+        due = []
+        with self._lock:
+            # _due is in arrival order, so the scan stops at the first camera not yet due
+            for device_id, first in self._due.items():
+                if now - first < self.coalesce_window or len(due) >= self.max_batch:
+                    break
+                due.append((device_id, first))
+            for device_id, first in due:
+                del self._due[device_id]
+                queue = self._queues.pop(device_id)
+                self.coalesced.value += len(queue) - 1
+                self.queue_depth.value -= len(queue)
+                self._pending -= len(queue)
+                # Re-inserted so _last_handled stays ordered by handling time
+                self._last_handled.pop(device_id, None)
+                self._last_handled[device_id] = now
+            self._forget_handled(now)
+        if not due:
+            return 0
+
+        registry = self.automation_system.registry
+        with self.automation_system.batch():
+            for device_id, first in due:
+                camera = registry.get(device_id)
+                if camera is None:
+                    get_log().warning("MotionPipeline", "Motion from unknown device {} ignored.", device_id)
+                    continue
+                camera.detect_motion()
+                self.handled.value += 1
+                self.latency.observe(now - first)
+        self.batch_duration.observe(time.perf_counter() - start)
+        return len(due)
+
+    def _forget_handled(self, now):
+        # Drops cameras whose debounce period is over, oldest first, so idle ids don't accumulate
+        last_handled = self._last_handled
+        while last_handled:
+            device_id = next(iter(last_handled))
+            if now - last_handled[device_id] < self.debounce:
+                break
+            del last_handled[device_id]
@@ -0,0 +1,299 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from Clock import get_clock
+from EventLog import get_log
+from Metrics import get_metrics
+from SecurityCamera import SecurityCamera
+
+SEGMENT_MAGIC = b"SHSEGM01"
+# Segments are fixed-size files: a header, then frames packed back to back, then zeros
+SEGMENT_HEADER = struct.Struct("<8sQ")  # magic, segment sequence number
+FRAME_HEADER = struct.Struct("<dI")  # capture timestamp, payload length; a zero length ends the segment
+
+
+class RecordingError(Exception):
+    """Raised when a frame cannot be stored, e.g. because the quota is too small."""
+    pass
+
+
+def iter_frames(path):
+    """Yield (timestamp, payload bytes) for every frame in a segment file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, _ = SEGMENT_HEADER.unpack_from(data)
+    if magic != SEGMENT_MAGIC:
+        raise RecordingError(f"{path} is not a recording segment.")
+    offset = SEGMENT_HEADER.size
+    while offset + FRAME_HEADER.size <= len(data):
+        timestamp, length = FRAME_HEADER.unpack_from(data, offset)
+        if not length:
+            return
+        offset += FRAME_HEADER.size
+        yield timestamp, data[offset:offset + length]
+        offset += length
+
+
+class Segment:
+    """One preallocated, memory-mapped segment file being filled by a camera."""
+
+    __slots__ = ("path", "sequence", "buffer", "offset", "dirty")
+
+    def __init__(self, path, sequence, size):
+        self.path = path
+        self.sequence = sequence
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # Reserve the blocks up front so writing never extends the file
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+            self.buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        SEGMENT_HEADER.pack_into(self.buffer, 0, SEGMENT_MAGIC, sequence)
+        self.offset = SEGMENT_HEADER.size
+        self.dirty = True
+
+    def fits(self, length):
+        # Room for the frame plus the zero header that marks the end
+        return self.offset + 2 * FRAME_HEADER.size + length <= len(self.buffer)
+
+    def append(self, timestamp, frame):
+        offset = self.offset
+        FRAME_HEADER.pack_into(self.buffer, offset, timestamp, len(frame))
+        end = offset + FRAME_HEADER.size + len(frame)
+        self.buffer[offset + FRAME_HEADER.size:end] = frame
+        self.offset = end
+        self.dirty = True
+
+    def sync(self):
+        if self.dirty:
+            self.buffer.flush()
+            self.dirty = False
+
+    def close(self):
+        self.sync()
+        self.buffer.close()
+
+
+class RecordingWriter:
+    """Simulated camera recording: synthetic frames written to rotating, fixed-size segment files.
+
+    Cameras submit frames from any thread; one shared writer thread takes whatever is queued,
+    copies each frame into its camera's memory-mapped segment and syncs the dirty segments at
+    most every sync_interval seconds, so many recording cameras cost one writer and few msync
+    calls however many frames they produce. When a segment is full the camera rotates to a new
+    one, and the oldest closed segments are deleted to keep the directory within quota bytes.
+    The queue is bounded: once max_pending frames are waiting, new frames are dropped and counted.
+    Once attached, every run_simulation tick captures frames_per_tick frames per recording camera.
+    """
+
+    def __init__(self, directory, segment_size=8 * 1024 * 1024, quota=1024 * 1024 * 1024, frame_size=64 * 1024,
+                 max_pending=4096, sync_interval=0.05, frames_per_tick=1):
+        """Create the writer; existing segments in directory count towards the quota."""
+        if quota < segment_size:
+            raise RecordingError("The quota must hold at least one segment.")
+        self.directory = directory
+        self.segment_size = segment_size
+        self.quota = quota
+        self.frame_size = frame_size
+        self.max_pending = max_pending
+        self.sync_interval = sync_interval
+        self.frames_per_tick = frames_per_tick
+        self.automation_system = None
+        os.makedirs(directory, exist_ok=True)
+        self._segments = {}  # camera id -> open Segment; only touched by the writer thread
+        self._closed = deque()  # (sequence, path) of finished segments, oldest first
+        self._sequence = 0
+        for path in sorted(glob.glob(os.path.join(directory, "*.seg")), key=self._sequence_of):
+            self._closed.append((self._sequence_of(path), path))
+            self._sequence = max(self._sequence, self._sequence_of(path) + 1)
+        self._recording = set()  # ids of cameras currently recording
+        self._failing = set()  # ids of cameras whose last frame could not be written; logged once
+        self._pattern = os.urandom(frame_size)  # Synthetic frame payload shared by every capture
+        self._pending = deque()  # (camera id, timestamp, frame or None to close, submit time)
+        self._sync_requested = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._idle = threading.Condition()
+        self._writer = threading.Thread(target=self._run_writer, name="RecordingWriter", daemon=True)
+        self._writer.start()
+
+        metrics = get_metrics()
+        self.frames = metrics.counter("recording_frames_total", "Frames written to recording segments")
+        self.bytes = metrics.counter("recording_bytes_total", "Bytes written to recording segments")
+        self.dropped = metrics.counter("recording_frames_dropped_total", "Frames dropped by the recording writer")
+        self.rotations = metrics.counter("recording_segments_total", "Recording segments opened")
+        self.deleted = metrics.counter("recording_segments_deleted_total", "Recording segments deleted for the quota")
+        self.latency = metrics.histogram("recording_frame_seconds", "Time from frame capture to its write")
+        self.batches = metrics.counter("recording_batches_total", "Batches of frames handled by the writer thread")
+
+    def attach(self, automation_system):
+        """Follow camera recording state and capture on every tick; stopped cameras close their segment."""
+        self.automation_system = automation_system
+        for device in automation_system.devices:
+            self.camera_changed(device)
+        automation_system.add_change_listener(self.camera_changed)
+        automation_system.add_tick_listener(self.tick)
+
+    def detach(self, automation_system=None):
+        automation_system = automation_system or self.automation_system
+        if automation_system is not None:
+            automation_system.remove_change_listener(self.camera_changed)
+            automation_system.remove_tick_listener(self.tick)
+            self.automation_system = None
+
+    def tick(self):
+        """Tick listener: capture frames_per_tick frames for every recording camera."""
+        for _ in range(self.frames_per_tick):
+            self.capture()
+
+    def camera_changed(self, device):
+        """Change listener: start or stop recording a camera."""
+        if not isinstance(device, SecurityCamera):
+            return
+        if device.recording and device.status == "on":
+            self._recording.add(device.device_id)
+        elif device.device_id in self._recording:
+            self._recording.discard(device.device_id)
+            self._enqueue((device.device_id, None, None, None))  # Closes the camera's segment
+
+    def recording(self):
+        """Ids of the cameras currently recording."""
+        return set(self._recording)
+
+    def capture(self, timestamp=None):
+        """Submit one synthetic frame for every recording camera; returns how many were accepted."""
+        timestamp = get_clock().now() if timestamp is None else timestamp
+        return sum(self.submit(camera_id, self._pattern, timestamp) for camera_id in list(self._recording))
+
+    def submit(self, camera_id, frame, timestamp=None):
+        """Queue a frame for the writer thread; returns False if it was dropped."""
+        if self._stopped.is_set():
+            raise RecordingError("The recording writer is closed.")
+        if len(frame) + 2 * FRAME_HEADER.size + SEGMENT_HEADER.size > self.segment_size:
+            raise RecordingError(f"A {len(frame)} byte frame does not fit in a segment.")
+        timestamp = get_clock().now() if timestamp is None else timestamp
+        return self._enqueue((camera_id, timestamp, frame, time.perf_counter()))
+
+    def flush(self):
+        """Wait until every queued frame is written and synced; returns at once after close()."""
+        with self._idle:
+            if not self._writer.is_alive():
+                return
+            self._sync_requested = True
+            self._wake.set()
+            self._idle.wait_for(lambda: not self._sync_requested or not self._writer.is_alive())
+
+    def close(self):
+        """Stop capturing, write the queued frames, close every segment and stop the writer thread."""
+        self.detach()
+        self._stopped.set()
+        self._wake.set()
+        self._writer.join()
+
+    def disk_usage(self):
+        """Bytes of segment files in the directory, open ones included."""
+        return (len(self._closed) + len(self._segments)) * self.segment_size
+
+    def _enqueue(self, item):
+        if len(self._pending) >= self.max_pending and item[2] is not None:
+            self.dropped.value += 1
+            return False
+        self._pending.append(item)
+        if len(self._pending) == 1:
+            self._wake.set()
+        return True
+
+    def _run_writer(self):
+        try:
+            self._write_pending()
+        finally:
+            with self._idle:
+                self._sync_requested = False
+                self._idle.notify_all()  # Nobody waits for a stopped writer
+
+    def _write_pending(self):
+        last_sync = time.perf_counter()
+        while True:
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+            pending = self._pending
+            written = 0
+            while pending:
+                camera_id, timestamp, frame, submitted = pending.popleft()
+                if frame is None:
+                    self._close_segment(camera_id)
+                    continue
+                try:
+                    self._write(camera_id, timestamp, frame)
+                except (RecordingError, OSError) as e:
+                    self.dropped.value += 1
+                    if camera_id not in self._failing:
+                        # Logged once until the camera writes again, not once per frame
+                        self._failing.add(camera_id)
+                        get_log().error("RecordingWriter", "Frames from {} are being dropped: {}", camera_id, e)
+                    continue
+                self._failing.discard(camera_id)
+                self.latency.observe(time.perf_counter() - submitted)
+                written += 1
+            if written:
+                self.batches.value += 1
+            now = time.perf_counter()
+            sync_requested = self._sync_requested
+            if now - last_sync >= self.sync_interval or sync_requested or self._stopped.is_set():
+                for segment in self._segments.values():
+                    segment.sync()
+                last_sync = now
+            with self._idle:
+                if sync_requested and not pending:
+                    self._sync_requested = False
+                    self._idle.notify_all()
+            if self._stopped.is_set() and not pending:
+                break
+        for camera_id in list(self._segments):
+            self._close_segment(camera_id)
+
+    def _write(self, camera_id, timestamp, frame):
+        segment = self._segments.get(camera_id)
+        if segment is not None and not segment.fits(len(frame)):
+            self._close_segment(camera_id)
+            segment = None
+        if segment is None:
+            segment = self._segments[camera_id] = self._open_segment(camera_id)
+        segment.append(timestamp, frame)
+        self.frames.value += 1
+        self.bytes.value += len(frame)
+
+    def _open_segment(self, camera_id):
+        # Makes room for one more segment by deleting the oldest finished ones
+        while self.disk_usage() + self.segment_size > self.quota:
+            if not self._closed:
+                raise RecordingError(f"The quota of {self.quota} bytes cannot hold a segment for every recording camera.")
+            _, path = self._closed.popleft()
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self.deleted.value += 1
+        sequence = self._sequence
+        self._sequence += 1
+        name = f"{camera_id.replace(os.sep, '_')}-{sequence:08d}.seg"
+        self.rotations.value += 1
+        return Segment(os.path.join(self.directory, name), sequence, self.segment_size)
+
+    def _close_segment(self, camera_id):
+        segment = self._segments.pop(camera_id, None)
+        if segment is not None:
+            segment.close()
+            self._closed.append((segment.sequence, segment.path))
+
+    @staticmethod
+    def _sequence_of(path):
+        return int(os.path.splitext(path)[0].rsplit("-", 1)[1])
@@ -0,0 +1,326 @@
+import json
+import operator
+import time
+from EventLog import get_log
+from Metrics import get_metrics
+
+# Comparison operators usable in "where" clauses; a bare value means "eq"
+OPERATORS = {"eq": operator.eq, "ne": operator.ne, "lt": operator.lt, "le": operator.le, "gt": operator.gt, "ge": operator.ge}
+QUANTIFIERS = ("any", "all", "none")
+
+# The home's automation rules. Each rule holds when every "when" condition holds over the
+# devices of its type, and then calls a method on every device matching "then".
+DEFAULT_RULES = [
+    {
+        # A light that is on below 50% brightness switches cameras that are on to infrared
+        "name": "dim_light_infrared",
+        "groups": ["automation", "interactive"],
+        "when": [{"type": "SmartLight", "match": "any", "where": {"status": "on", "brightness": {"lt": 50}}}],
+        "then": {"type": "SecurityCamera", "where": {"status": "on", "infrared": False}, "call": "enable_infrared"},
+    },
+    {
+        # With a thermostat off and every light off, cameras that are on start recording
+        "name": "idle_home_recording",
+        "groups": ["automation"],
+        "when": [
+            {"type": "Thermostat", "match": "any", "where": {"status": "off"}},
+            {"type": "SmartLight", "match": "all", "where": {"status": "off"}},
+        ],
+        "then": {"type": "SecurityCamera", "where": {"status": "on", "recording": False}, "call": "start_recording"},
+    },
+    {
+        # In the GUI, lights that are on but none of them dim switch infrared back off
+        "name": "bright_lights_infrared_off",
+        "groups": ["interactive"],
+        "when": [
+            {"type": "SmartLight", "match": "any", "where": {"status": "on"}},
+            {"type": "SmartLight", "match": "none", "where": {"status": "on", "brightness": {"lt": 50}}},
+        ],
+        "then": {"type": "SecurityCamera", "where": {"status": "on", "infrared": True}, "call": "disable_infrared"},
+    },
+]
+
+
+def call_device(device, call, args):
+    """Default action dispatch: call the method on the device object directly."""
+    return getattr(device, call)(*args)
+
+
+class RuleError(Exception):
+    """Raised when a rule definition cannot be compiled."""
+    pass
+
+
+class Condition:
+    """Network node: the ids of the devices of one type that currently pass a where clause.
+
+    Nodes are shared by every rule using the same type and clause, so a device change updates
+    each distinct condition once, however many rules read it.
+    """
+
+    __slots__ = ("device_type", "checks", "matching", "total")
+
+    def __init__(self, device_type, checks):
+        self.device_type = device_type
+        self.checks = checks  # ((attribute, compare, value), ...)
+        self.matching = set()
+        self.total = 0  # Registered devices of device_type
+
+    def test(self, device):
+        for attribute, compare, value in self.checks:
+            if not compare(getattr(device, attribute), value):
+                return False
+        return True
+
+    def update(self, device):
+        if self.test(device):
+            self.matching.add(device.device_id)
+        else:
+            self.matching.discard(device.device_id)
+
+    def add_all(self, devices):
+        # Bulk form of counting and testing newly registered devices
+        self.total += len(devices)
+        if len(self.checks) == 1:
+            (attribute, compare, value), = self.checks
+            self.matching.update(device.device_id for device in devices if compare(getattr(device, attribute), value))
+        else:
+            self.matching.update(device.device_id for device in devices if self.test(device))
+
+    def holds(self, quantifier):
+        if quantifier == "any":
+            return bool(self.matching)
+        if quantifier == "all":
+            return len(self.matching) == self.total
+        return not self.matching
+
+
+class Action:
+    """The "then" part of a rule: a method called on every device of a type passing a where clause."""
+
+    __slots__ = ("device_type", "status", "checks", "call", "args")
+
+    def __init__(self, device_type, checks, call, args):
+        self.device_type = device_type
+        # A status check is answered by the registry's status index instead of a scan
+        self.status = next((value for attribute, compare, value in checks
+                            if attribute == "status" and compare is operator.eq), None)
+        self.checks = tuple(check for check in checks if check[0] != "status" or check[1] is not operator.eq)
+        self.call = call
+        self.args = args
+
+    def accepts(self, device):
+        if self.status is not None and device.status != self.status:
+            return False
+        for attribute, compare, value in self.checks:
+            if not compare(getattr(device, attribute), value):
+                return False
+        return True
+
+    def targets(self, registry, device_class):
+        devices = registry.of_type(device_class) if self.status is None else registry.with_status(device_class, self.status)
+        return [device for device in devices if self.accepts(device)]
+
+
+class Rule:
+    """A compiled rule: (condition, quantifier) terms and the action run while they all hold."""
+
+    __slots__ = ("name", "groups", "terms", "action", "active", "histogram", "definition")
+
+    def __init__(self, name, groups, terms, action, definition=None):
+        self.name = name
+        self.definition = definition  # The declarative definition the rule was compiled from
+        self.groups = groups
+        self.terms = terms
+        self.action = action
+        self.active = False  # Whether the rule held at its last event-driven evaluation
+        self.histogram = get_metrics().histogram("automation_rule_seconds", "Duration of automation rule evaluations",
+                                                 rule=name)
+
+    def holds(self):
+        for condition, quantifier in self.terms:
+            if not condition.holds(quantifier):
+                return False
+        return True
+
+
+class RuleEngine:
+    """Compiles declarative rules into a network of shared conditions indexed by device type.
+
+    Rule definitions are plain dicts, so they can be written in Python or loaded from JSON.
+    Device changes only update the conditions on that device's type, and checking whether a
+    rule holds costs one set-size test per condition, never a scan of the fleet.
+    """
+
+    def __init__(self, registry, definitions=()):
+        """Create an engine over a DeviceRegistry and compile the given rule definitions."""
+        self.registry = registry
+        self.rules = {}  # name -> Rule, in definition order
+        self._conditions = {}  # (type name, checks) -> shared Condition
+        self._groups = {}  # group -> [Rule]
+        self._types = {}  # type name -> class, learned from registered devices
+        self._index = {}  # device class -> (conditions, rules) for that class and its bases
+        self.dispatch = call_device  # dispatch(device, call, args) runs an action on one target
+        self.load(definitions)
+
+    def load(self, definitions):
+        """Compile and add a list of rule definitions."""
+        for definition in definitions:
+            self.add_rule(definition)
+
+    def load_json(self, path):
+        """Compile and add the list of rule definitions in a JSON file."""
+        with open(path, encoding="utf-8") as f:
+            self.load(json.load(f))
+
+    def add_rule(self, definition):
+        """Compile one rule definition; its new conditions are primed with the registered devices."""
+        try:
+            name = definition["name"]
+            when = definition["when"]
+            then = definition["then"]
+        except (KeyError, TypeError):
+            raise RuleError(f"Rule definitions need 'name', 'when' and 'then': {definition!r}")
+        if name in self.rules:
+            raise RuleError(f"Rule {name} is already defined.")
+        if not when:
+            raise RuleError(f"Rule {name} has no conditions.")
+        terms = []
+        for clause in when:
+            quantifier = clause.get("match", "any")
+            if quantifier not in QUANTIFIERS:
+                raise RuleError(f"Rule {name}: unknown match {quantifier!r}, expected one of {QUANTIFIERS}.")
+            terms.append((self._condition(name, clause["type"], clause.get("where", {})), quantifier))
+        if not isinstance(then.get("call"), str):
+            raise RuleError(f"Rule {name}: 'then' needs the name of the method to call.")
+        action = Action(then["type"], self._compile_where(name, then.get("where", {})), then["call"],
+                        tuple(then.get("args", ())))
+        rule = Rule(name, tuple(definition.get("groups", ("automation",))), tuple(terms), action, definition)
+        self.rules[name] = rule
+        for group in rule.groups:
+            self._groups.setdefault(group, []).append(rule)
+        self._index.clear()
+        return rule
+
+    def group_definitions(self, group="automation"):
+        """The definitions of the rules in a group, in the order they run."""
+        return [rule.definition for rule in self._groups.get(group, ())]
+
+    def device_added(self, device):
+        """Count a newly registered device in the conditions on its type."""
+        for condition in self._index_for(type(device))[0]:
+            condition.total += 1
+            condition.update(device)
+
+    def devices_added(self, devices):
+        """Bulk form of device_added for many newly registered devices."""
+        by_class = {}
+        for device in devices:
+            by_class.setdefault(type(device), []).append(device)
+        for device_class, group in by_class.items():
+            for condition in self._index_for(device_class)[0]:
+                condition.add_all(group)
+
+    def device_changed(self, device):
+        """Re-test a changed device against the conditions on its type only."""
+        for condition in self._index_for(type(device))[0]:
+            condition.update(device)
+
+    def evaluate(self, group="automation"):
+        """Polling evaluation: run the action of every rule in the group that currently holds."""
+        fired = 0
+        for rule in self._groups.get(group, ()):
+            if rule.holds():
+                self._fire(rule)
+                fired += 1
+        return fired
+
+    def evaluate_device(self, device, group="automation"):
+        """Run the rules in the group that involve the device's type and currently hold."""
+        for rule, _ in self._index_for(type(device))[1]:
+            if group in rule.groups and rule.holds():
+                self._fire(rule)
+
+    def react(self, device, group="automation"):
+        """Event-driven evaluation after a device changed.
+
+        A rule that starts to hold runs its action on every target; while it keeps holding, a
+        changed device that has become a target is handled on its own.
+        """
+        for rule, targeted in self._index_for(type(device))[1]:
+            if group not in rule.groups:
+                continue
+            holds = rule.holds()
+            if holds and not rule.active:
+                self._fire(rule)
+            elif holds and targeted and rule.action.accepts(device):
+                self._fire(rule, [device])
+            rule.active = holds
+
+    def fire(self, name, targets):
+        """Run a rule's action on targets found by the caller, through the same dispatch."""
+        self._fire(self.rules[name], targets)
+
+    def reset(self):
+        """Forget which rules were holding, so the next react() treats them as new."""
+        for rule in self.rules.values():
+            rule.active = False
+
+    def _fire(self, rule, targets=None):
+        start = time.perf_counter()
+        try:
+            device_class = self._types.get(rule.action.device_type)
+            if targets is None:
+                targets = rule.action.targets(self.registry, device_class) if device_class else []
+            for device in targets:
+                self.dispatch(device, rule.action.call, rule.action.args)
+            if targets:
+                get_log().debug("RuleEngine", "Rule {} applied {} to {} device(s).", rule.name, rule.action.call, len(targets))
+        finally:
+            rule.histogram.observe(time.perf_counter() - start)
+
+    def _condition(self, rule_name, device_type, where):
+        checks = self._compile_where(rule_name, where)
+        key = (device_type, checks)
+        condition = self._conditions.get(key)
+        if condition is None:
+            condition = self._conditions[key] = Condition(device_type, checks)
+            device_class = self._types.get(device_type)
+            for device in self.registry.of_type(device_class) if device_class else ():
+                condition.total += 1
+                condition.update(device)
+        return condition
+
+    @staticmethod
+    def _compile_where(rule_name, where):
+        # {"brightness": {"lt": 50}, "status": "on"} -> (("brightness", operator.lt, 50), ("status", operator.eq, "on"))
+        checks = []
+        for attribute, test in sorted(where.items()):
+            if isinstance(test, dict):
+                if len(test) != 1:
+                    raise RuleError(f"Rule {rule_name}: '{attribute}' needs exactly one operator.")
+                (operator_name, value), = test.items()
+            else:
+                operator_name, value = "eq", test
+            if operator_name not in OPERATORS:
+                raise RuleError(f"Rule {rule_name}: unknown operator {operator_name!r} for '{attribute}'.")
+            try:
+                hash(value)
+            except TypeError:
+                raise RuleError(f"Rule {rule_name}: '{attribute}' must be compared with a single value.")
+            checks.append((attribute, OPERATORS[operator_name], value))
+        return tuple(checks)
+
+    def _index_for(self, device_class):
+        # Conditions on a device class and (rule, class is the rule's target) pairs, computed once per class
+        entry = self._index.get(device_class)
+        if entry is None:
+            for cls in device_class.__mro__[:-1]:
+                self._types.setdefault(cls.__name__, cls)
+            names = {cls.__name__ for cls in device_class.__mro__[:-1]}
+            conditions = [condition for condition in self._conditions.values() if condition.device_type in names]
+            rules = [(rule, rule.action.device_type in names) for rule in self.rules.values()
+                     if rule.action.device_type in names or any(condition.device_type in names
+                                                                 for condition, _ in rule.terms)]
+            entry = self._index[device_class] = (conditions, rules)
+        return entry
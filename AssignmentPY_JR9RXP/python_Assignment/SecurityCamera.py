@@ -1,26 +1,56 @@
-from datetime import datetime
+import sys
+from DeviceStatus import DeviceStatus
+from EventLog import get_log
+from Metrics import counted_command
 
 class SecurityCameraError(Exception):
     """Custom exception for security camera errors."""
     pass
 
 class SecurityCamera:
+    # Fixed attribute layout: no per-instance __dict__, which matters at fleet scale
+    __slots__ = ("device_id", "_status", "recording", "infrared", "automation_system")
+
+    POLL_INTERVAL = 1  # Seconds between state polls in the asyncio runtime
+    IO_LATENCY = 0.05  # Simulated network round trip for async commands, in seconds
+
     def __init__(self, device_id, automation_system):
         # Constructor for the SecurityCamera class.
         # It initializes various attributes of the security camera device.
-        self.device_id = device_id
-        self.status = "off"
+        self.device_id = sys.intern(device_id)  # Interned so equal ids share one string
+        self._status = DeviceStatus.OFF
         self.recording = False
         self.infrared = False
         self.automation_system = automation_system
-        self.status_var = None
 
+    @property
+    def status(self):
+        """Current status of the camera, "on" or "off"."""
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        """Set the status and let the automation system re-index the camera if it changed."""
+        value = DeviceStatus(value)
+        old_status = self._status
+        self._status = value
+        if old_status != value and self.automation_system:
+            self.automation_system.device_status_changed(self, old_status)
+
+    async def command_async(self, method_name, *args):
+        """Run a command after the simulated network latency, without blocking the event loop."""
+        import asyncio  # Imported here so headless startup without the asyncio runtime skips it
+        await asyncio.sleep(self.IO_LATENCY)
+        return getattr(self, method_name)(*args)
+
+    @counted_command
     def turn_on(self):
         """Turns on the security camera."""
         self.status = "on"
         self._update_status_var("turned on")
         self.detect_motion()
 
+    @counted_command
     def turn_off(self):
         """Turns off the security camera."""
         self.status = "off"
@@ -28,6 +58,7 @@ class SecurityCamera:
         self.infrared = False
         self._update_status_var("turned off")
 
+    @counted_command
     def toggle_camera(self):
         """Toggles the security camera on/off."""
         if self.status == "off":
@@ -39,6 +70,7 @@ class SecurityCamera:
             self.stop_recording()  # Assuming you want the camera to stop recording when it turns off
             self._update_status_var("turned off")
 
+    @counted_command
     def toggle_recording(self):
         """Toggles recording mode for the security camera."""
         if self.status == "on":
@@ -48,6 +80,7 @@ class SecurityCamera:
         else:
             self._log("is off. Cannot toggle recording.")
 
+    @counted_command
     def start_recording(self):
         """Starts recording for the security camera."""
         if self.status == "on":
@@ -57,6 +90,7 @@ class SecurityCamera:
         else:
             self._log("is off. Cannot start recording.")
 
+    @counted_command
     def stop_recording(self):
         """Stops recording for the security camera."""
         if self.status == "on":
@@ -68,6 +102,7 @@ class SecurityCamera:
         else:
             self._log("is off. Cannot stop recording.")
 
+    @counted_command
     def enable_infrared(self):
         """Enables infrared mode for the security camera."""
         if self.status == "on":
@@ -76,6 +111,7 @@ class SecurityCamera:
         else:
             self._log("is off. Cannot enable infrared.")
 
+    @counted_command
     def disable_infrared(self):
         """Disables infrared mode for the security camera."""
         if self.infrared:
@@ -84,6 +120,7 @@ class SecurityCamera:
         else:
             self._log("infrared is not enabled. Cannot disable.")
 
+    @counted_command
     def detect_motion(self):
         """Detects motion and takes appropriate actions."""
         self._log("detected motion")
@@ -93,14 +130,13 @@ class SecurityCamera:
             self.start_recording()
 
     def _update_status_var(self, action):
-        """Update the status variable with the current status and log the action."""
-        status_info = f"Status: {self.status}, Recording: {self.recording}, Infrared: {self.infrared}"
+        """Log the action and publish the camera's new state."""
         self._log(action)
-        if self.status_var:
-            self.status_var.set(status_info)
+
+        # Publish the change; the automation system and any GUI listening to it pick it up from here
+        if self.automation_system:
+            self.automation_system.device_changed(self)
 
     def _log(self, action):
-        """Log an action with a timestamp."""
-        timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-        full_message = f"{timestamp} SecurityCamera {self.device_id} {action}."
-        print(full_message)
+        """Log an action; the event log stamps it with the current (wall or virtual) clock when written."""
+        get_log().info("SecurityCamera", "{timestamp} SecurityCamera {} {}.", self.device_id, action)
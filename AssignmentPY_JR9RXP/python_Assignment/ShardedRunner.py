@@ -0,0 +1,128 @@
+import argparse
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+from AutomationSystem import AutomationSystem
+from EventLog import EventLog, set_log
+from Simulator import random_action
+
+
+def build_home(home_index, lights=3, thermostats=1, cameras=1):
+    """Creates one independent home with its own automation system and devices."""
+    home = AutomationSystem()
+    prefix = f"Home{home_index}-"
+    for i in range(lights):
+        home.add_device(SmartLight(f"{prefix}Light{i}", home))
+    for i in range(thermostats):
+        home.add_device(Thermostat(f"{prefix}Thermostat{i}", home))
+    for i in range(cameras):
+        home.add_device(SecurityCamera(f"{prefix}Camera{i}", home))
+    return home
+
+
+def run_shard(home_indices, ticks, actions_per_tick, layout, seed, log_level):
+    """Worker entry point: simulates a shard of homes for a number of rule ticks.
+
+    Each tick applies a few random device actions to every home and then runs its rules.
+    Returns plain counters so the coordinator can aggregate them cheaply.
+    """
+    # Device logs from thousands of homes would swamp stdout; keep only what the caller asked for
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False, default_level=log_level))
+    homes = [build_home(index, *layout) for index in home_indices]
+    # A seeded generator per shard picks the random device actions; same seed, same run
+    rng = random.Random(f"{seed}-{home_indices[0]}")
+    devices = [list(home.devices) for home in homes]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for home, home_devices in zip(homes, devices):
+            for _ in range(actions_per_tick):
+                random_action(rng.choice(home_devices), rng)
+            home.run_simulation()
+    elapsed = time.perf_counter() - start
+    recording = sum(1 for home in homes for cam in home.registry.of_type(SecurityCamera) if cam.recording)
+    return {
+        "pid": os.getpid(),
+        "homes": len(homes),
+        "devices": sum(len(home_devices) for home_devices in devices),
+        "home_ticks": len(homes) * ticks,
+        "elapsed": elapsed,
+        "cameras_recording": recording,
+    }
+
+
+class ShardedRunner:
+    """Coordinator that splits homes into shards and simulates them on a process pool."""
+
+    def __init__(self, homes, workers=None, ticks=100, actions_per_tick=1, layout=(3, 1, 1), seed=0,
+                 log_level=logging.WARNING):
+        """Configure a run; layout is (lights, thermostats, cameras) per home."""
+        self.homes = homes
+        self.workers = workers or os.cpu_count() or 1
+        self.ticks = ticks
+        self.actions_per_tick = actions_per_tick
+        self.layout = tuple(layout)
+        self.seed = seed
+        self.log_level = log_level
+
+    def shards(self):
+        """Split home indices into one contiguous shard per worker."""
+        size, remainder = divmod(self.homes, self.workers)
+        shards, start = [], 0
+        for worker in range(self.workers):
+            end = start + size + (1 if worker < remainder else 0)
+            if end > start:
+                shards.append(list(range(start, end)))
+            start = end
+        return shards
+
+    def run(self):
+        """Run every shard and return aggregated metrics."""
+        shards = self.shards()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            futures = [pool.submit(run_shard, shard, self.ticks, self.actions_per_tick, self.layout,
+                                   self.seed, self.log_level) for shard in shards]
+            results = [future.result() for future in futures]
+        wall_time = time.perf_counter() - start
+        home_ticks = sum(result["home_ticks"] for result in results)
+        slowest = max(result["elapsed"] for result in results)
+        return {
+            "workers": len(shards),
+            "homes": sum(result["homes"] for result in results),
+            "devices": sum(result["devices"] for result in results),
+            "home_ticks": home_ticks,
+            "cameras_recording": sum(result["cameras_recording"] for result in results),
+            "wall_time": wall_time,
+            "slowest_shard": slowest,
+            # Simulation throughput, excluding process start-up and home construction
+            "home_ticks_per_second": home_ticks / slowest if slowest else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many independent homes across worker processes.")
+    parser.add_argument("--homes", type=int, default=1000, help="number of homes to simulate")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--ticks", type=int, default=100, help="rule ticks per home")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for device actions")
+    parser.add_argument("--scaling", action="store_true", help="repeat the run with 1..workers processes")
+    args = parser.parse_args()
+
+    worker_counts = range(1, args.workers + 1) if args.scaling else [args.workers]
+    baseline = None
+    print(f"{'workers':>7} {'homes':>7} {'home-ticks':>11} {'home-ticks/s':>13} {'speedup':>8} {'wall s':>7}")
+    for workers in worker_counts:
+        metrics = ShardedRunner(args.homes, workers, args.ticks, seed=args.seed).run()
+        baseline = baseline or metrics["home_ticks_per_second"]
+        speedup = metrics["home_ticks_per_second"] / baseline
+        print(f"{metrics['workers']:>7} {metrics['homes']:>7} {metrics['home_ticks']:>11} "
+              f"{metrics['home_ticks_per_second']:>13.0f} {speedup:>8.2f} {metrics['wall_time']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
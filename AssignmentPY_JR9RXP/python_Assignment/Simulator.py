@@ -0,0 +1,84 @@
+import heapq
+import itertools
+import random
+from Clock import VirtualClock, set_clock
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+
+
+def random_action(device, rng):
+    """Apply a typical user or sensor action to a device, chosen with the random generator rng."""
+    if isinstance(device, SmartLight):
+        if rng.random() < 0.5:
+            device.toggle_light()
+        else:
+            device.set_brightness(rng.randint(0, 100))
+    elif isinstance(device, Thermostat):
+        if rng.random() < 0.5:
+            device.toggle_thermostat()
+        else:
+            device.set_temperature(rng.randint(device.MIN_TEMPERATURE, device.MAX_TEMPERATURE))
+    elif isinstance(device, SecurityCamera):
+        device.detect_motion()
+
+
+class DiscreteEventSimulator:
+    """Runs an automation system on a virtual clock, jumping straight from one event to the next."""
+
+    def __init__(self, automation_system, clock=None, seed=None):
+        """Create a simulator with its own virtual clock and seeded random generator."""
+        self.automation_system = automation_system
+        self.clock = clock if clock is not None else VirtualClock()
+        self.random = random.Random(seed)  # Deterministic for a given seed
+        self._queue = []  # Heap of (time, sequence, callback, args)
+        self._sequence = itertools.count()  # Tie-breaker keeps same-time events in FIFO order
+        self.events_processed = 0
+
+    def schedule_at(self, timestamp, callback, *args):
+        """Schedule callback(*args) at an absolute virtual time."""
+        heapq.heappush(self._queue, (timestamp, next(self._sequence), callback, args))
+
+    def schedule(self, delay, callback, *args):
+        """Schedule callback(*args) after delay seconds of virtual time."""
+        self.schedule_at(self.clock.now() + delay, callback, *args)
+
+    def schedule_periodic(self, interval, callback, *args):
+        """Run callback(*args) every interval seconds, starting one interval from now."""
+        def tick():
+            callback(*args)
+            self.schedule(interval, tick)
+        self.schedule(interval, tick)
+
+    def schedule_rule_ticks(self, interval=5):
+        """Run the automation system's rule evaluation every interval seconds."""
+        self.schedule_periodic(interval, self.automation_system.run_simulation)
+
+    def schedule_random_activity(self, mean_interval):
+        """Drive random device actions with exponentially distributed gaps of mean_interval seconds."""
+        devices = list(self.automation_system.devices)
+        if not devices:
+            return
+
+        def act():
+            random_action(self.random.choice(devices), self.random)
+            self.schedule(self.random.expovariate(1 / mean_interval), act)
+        self.schedule(self.random.expovariate(1 / mean_interval), act)
+
+    def run_until(self, end_time):
+        """Process every event scheduled up to end_time, then leave the clock at end_time."""
+        previous_clock = set_clock(self.clock)  # Device logs are stamped with virtual time
+        try:
+            while self._queue and self._queue[0][0] <= end_time:
+                timestamp, _, callback, args = heapq.heappop(self._queue)
+                self.clock.advance_to(timestamp)
+                callback(*args)
+                self.events_processed += 1
+            self.clock.advance_to(end_time)
+        finally:
+            set_clock(previous_clock)
+        return self.events_processed
+
+    def run_for(self, duration):
+        """Simulate duration seconds of virtual time from now."""
+        return self.run_until(self.clock.now() + duration)
@@ -1,15 +1,38 @@
+import sys
+from DeviceStatus import DeviceStatus
+from EventLog import get_log
+from Metrics import counted_command
+
 class SmartLight:
     """Represents a smart light with adjustable brightness and motion detection capabilities."""
 
+    # Fixed attribute layout: no per-instance __dict__, which matters at fleet scale
+    __slots__ = ("device_id", "_status", "brightness", "automation_system")
+
     DEFAULT_BRIGHTNESS = 90  # Default brightness level when the light is turned on
+    POLL_INTERVAL = 2  # Seconds between state polls in the asyncio runtime
+    IO_LATENCY = 0.05  # Simulated network round trip for async commands, in seconds
 
     def __init__(self, device_id, automation_system):
         """Initialize the smart light with a unique device ID and a reference to an automation system."""
-        self.device_id = device_id
-        self.status = "off"  # Initial status of the light is off
+        self.device_id = sys.intern(device_id)  # Interned so equal ids share one string
+        self._status = DeviceStatus.OFF  # Initial status of the light is off
         self.brightness = 0  # Initial brightness is set to 0
         self.automation_system = automation_system  # Reference to the automation system managing this light
-        self.status_var = None  # GUI variable to display status, initially set to None
+
+    @property
+    def status(self):
+        """Current status of the light, "on" or "off"."""
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        """Set the status and let the automation system re-index the light if it changed."""
+        value = DeviceStatus(value)
+        old_status = self._status
+        self._status = value
+        if old_status != value and self.automation_system:
+            self.automation_system.device_status_changed(self, old_status)
 
     def _update_status(self, status=None, brightness=None):
         """Private method to update the light's status and brightness."""
@@ -18,54 +41,66 @@ class SmartLight:
         if brightness is not None:
             self.brightness = brightness
 
-        # Create a message reflecting the current status and brightness
-        message = f"SmartLight {self.device_id} - Status: {self.status.capitalize()}, Brightness: {self.brightness}%"
-        print(message)
+        # Log the current status and brightness; the text is only formatted when written out
+        get_log().info("SmartLight", "SmartLight {} - Status: {}, Brightness: {}%",
+                       self.device_id, self.status.capitalize(), self.brightness)
+
+        # Publish the change; the automation system and any GUI listening to it pick it up from here
+        if self.automation_system:
+            self.automation_system.device_changed(self)
 
-        # Update the status variable for GUI, if set
-        if self.status_var:
-            self.status_var.set(message)
+    async def command_async(self, method_name, *args):
+        """Run a command after the simulated network latency, without blocking the event loop."""
+        import asyncio  # Imported here so headless startup without the asyncio runtime skips it
+        await asyncio.sleep(self.IO_LATENCY)
+        return getattr(self, method_name)(*args)
 
+    @counted_command
     def turn_on(self):
         """Turns on the smart light to the default brightness."""
         self._update_status(status="on", brightness=self.DEFAULT_BRIGHTNESS)
-        print(f"SmartLight {self.device_id} is now on.")
+        get_log().info("SmartLight", "SmartLight {} is now on.", self.device_id)
 
+    @counted_command
     def turn_off(self):
         """Turns off the smart light and resets its brightness to 0."""
         self._update_status(status="off", brightness=0)
-        print(f"SmartLight {self.device_id} is now off.")
+        get_log().info("SmartLight", "SmartLight {} is now off.", self.device_id)
 
         # Trigger automation system's check for recording, if applicable
         if self.automation_system:
             try:
                 self.automation_system.check_and_start_recording()
             except Exception as e:
-                print(f"Error during automation system recording for SmartLight {self.device_id}: {e}")
+                get_log().error("SmartLight", "Error during automation system recording for SmartLight {}: {}", self.device_id, e)
 
+    @counted_command
     def adjust_brightness(self, brightness):
         """Adjusts the brightness of the smart light."""
         brightness = int(brightness)  # Ensure brightness value is an integer
         self._update_status(brightness=brightness)
-        print(f"Brightness of SmartLight {self.device_id} adjusted to {brightness}%.")
+        get_log().info("SmartLight", "Brightness of SmartLight {} adjusted to {}%.", self.device_id, brightness)
 
+    @counted_command
     def set_brightness(self, brightness):
         """Sets the brightness of the light if it's on and within valid range."""
         if 0 <= brightness <= 100:
             if self.status == "on":
                 self._update_status(brightness=brightness)
-                print(f"Brightness of SmartLight {self.device_id} set to {brightness}%.")
+                get_log().info("SmartLight", "Brightness of SmartLight {} set to {}%.", self.device_id, brightness)
             else:
-                print(f"SmartLight {self.device_id} is off. Cannot adjust brightness.")
+                get_log().warning("SmartLight", "SmartLight {} is off. Cannot adjust brightness.", self.device_id)
         else:
-            print(f"Invalid brightness level: {brightness}. Must be between 0 and 100.")
+            get_log().warning("SmartLight", "Invalid brightness level: {}. Must be between 0 and 100.", brightness)
 
+    @counted_command
     def detect_motion(self):
         """Detects motion and turns the light on if it's currently off."""
-        print(f"Motion detected by SmartLight {self.device_id}.")
+        get_log().info("SmartLight", "Motion detected by SmartLight {}.", self.device_id)
         if self.status == "off":
             self.turn_on()
 
+    @counted_command
     def toggle_light(self):
         """Toggles the smart light on or off."""
         if self.status == "off":
@@ -0,0 +1,368 @@
+import glob
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from DeviceStatus import DeviceStatus
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+from EventLog import get_log
+from Metrics import get_metrics
+
+SNAPSHOT_MAGIC = b"SHSNAP01"
+JOURNAL_MAGIC = b"SHJRNL01"
+# Snapshots are columnar: after the header come n type codes, n statuses, n little-endian int16
+# brightness/temperature values, n recording flags, n infrared flags, the NUL-separated ids and
+# a CRC of everything after the header
+SNAPSHOT_HEADER = struct.Struct("<8sQQ")  # magic, first journal generation to replay, device count
+JOURNAL_HEADER = struct.Struct("<8sQ")  # magic, generation
+# type code, status (1 = on), brightness or temperature, recording, infrared, id length; the id follows
+RECORD = struct.Struct("<BBhBBH")
+VALUE_RANGE = (-32768, 32767)  # Brightness and temperature are stored as int16
+CRC = struct.Struct("<I")
+
+DEVICE_TYPES = {1: SmartLight, 2: Thermostat, 3: SecurityCamera}
+
+
+class PersistenceError(Exception):
+    """Raised when a snapshot or journal file cannot be read."""
+    pass
+
+
+def device_state(device):
+    """Return a device's full state as (type code, status, value, recording, infrared).
+
+    Raises PersistenceError when the brightness or temperature does not fit a record.
+    """
+    status = 1 if device.status == DeviceStatus.ON else 0
+    if isinstance(device, SmartLight):
+        return 1, status, _checked_value(device, int(device.brightness)), 0, 0
+    if isinstance(device, Thermostat):
+        return 2, status, _checked_value(device, int(device.temperature)), 0, 0
+    if isinstance(device, SecurityCamera):
+        return 3, status, 0, int(device.recording), int(device.infrared)
+    raise PersistenceError(f"Cannot persist device {device.device_id} of type {type(device).__name__}.")
+
+
+def _checked_value(device, value):
+    if not VALUE_RANGE[0] <= value <= VALUE_RANGE[1]:
+        raise PersistenceError(f"Cannot persist device {device.device_id}: value {value} is outside "
+                               f"{VALUE_RANGE[0]}..{VALUE_RANGE[1]}.")
+    return value
+
+
+def encode_device(device):
+    """Encode a device's full state as one journal record."""
+    device_id = device.device_id.encode("utf-8")
+    return RECORD.pack(*device_state(device), len(device_id)) + device_id
+
+
+def encode_snapshot(devices):
+    """Encode the state of all devices as the columnar snapshot body."""
+    states = [device_state(device) for device in devices]
+    types, statuses, values, recording, infrared = zip(*states) if states else ((),) * 5
+    values = array("h", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    ids = "\0".join(device.device_id for device in devices)
+    if ids.count("\0") != max(0, len(devices) - 1):
+        raise PersistenceError("Device ids must not contain NUL characters.")
+    return b"".join((bytes(types), bytes(statuses), values.tobytes(), bytes(recording), bytes(infrared),
+                     ids.encode("utf-8")))
+
+
+def decode_snapshot(body, count):
+    """Decode a columnar snapshot body, bytes or a memoryview, into a list of (device_id, state) pairs."""
+    body = memoryview(body)
+    offset = 0
+    columns = []
+    for width in (1, 1, 2, 1, 1):
+        column = body[offset:offset + count * width]
+        if width == 2:
+            column = array("h")
+            column.frombytes(body[offset:offset + count * width])
+            if sys.byteorder == "big":
+                column.byteswap()
+        columns.append(column)
+        offset += count * width
+    ids = str(body[offset:], "utf-8").split("\0") if count else []
+    if len(ids) != count:
+        raise PersistenceError("Snapshot device count does not match its contents.")
+    return list(zip(ids, zip(*columns)))
+
+
+def decode_record(buffer, offset):
+    """Decode the record at offset; returns (device_id, state tuple, offset after the record)."""
+    type_code, status, value, recording, infrared, id_length = RECORD.unpack_from(buffer, offset)
+    start = offset + RECORD.size
+    device_id = buffer[start:start + id_length].decode("utf-8")
+    return device_id, (type_code, status, value, recording, infrared), start + id_length
+
+
+def apply_states(automation_system, states):
+    """Apply {device_id: state tuple} quietly: registered devices are updated, missing ones created."""
+    registry = automation_system.registry
+    rules = automation_system.rules
+    created = []
+    updated = []
+    for device_id, (type_code, status, value, recording, infrared) in states.items():
+        status = DeviceStatus.ON if status else DeviceStatus.OFF
+        device = registry.get(device_id)
+        if device is None:
+            device = automation_system.create_device(DEVICE_TYPES[type_code], device_id)
+            device._status = status
+            created.append(device)
+        else:
+            device.status = status  # Goes through the setter so the registry re-indexes it
+            updated.append(device)
+        if type_code == 1:
+            device.brightness = value
+        elif type_code == 2:
+            device.temperature = value
+        else:
+            device.recording = bool(recording)
+            device.infrared = bool(infrared)
+    # Rule conditions are re-tested once every attribute has its restored value
+    for device in updated:
+        rules.device_changed(device)
+    registry.add_many(created)
+    automation_system._register_in_store(created)
+    rules.devices_added(created)
+
+
+class StateStore:
+    """Persists device state as a compact snapshot plus an append-only journal of changes.
+
+    Every record holds a device's full state, so replay is last-writer-wins. State changes only
+    mark the device dirty; a background writer encodes the dirty devices, appends them to the
+    journal and fsyncs once per group. Once the journal grows past snapshot_threshold bytes, a
+    checkpoint writes a fresh snapshot and starts a new journal generation, so a restore only
+    replays the changes made since the last snapshot. The list of devices to snapshot is taken
+    by the next change on the thread that owns the devices, never by the writer thread.
+    """
+
+    def __init__(self, directory, commit_interval=0.05, snapshot_threshold=4 * 1024 * 1024, background=True):
+        """Open a store in directory; commit_interval is the longest a change waits for its fsync."""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_threshold = snapshot_threshold
+        self.automation_system = None
+        self.generation = 0  # Journal generation new changes are appended to
+        self._dirty = {}  # device_id -> device changed since the last commit
+        self._dirty_lock = threading.Lock()  # Also guards the two checkpoint fields below
+        self._checkpoint_due = False  # The journal is full; the next change takes the device list
+        self._snapshot_devices = None  # Devices for the next commit to snapshot
+        self._io_lock = threading.Lock()  # Serializes journal writes and checkpoints
+        self._journal = None
+        self._journal_size = 0
+        self._commit_histogram = get_metrics().histogram("state_commit_seconds", "Duration of journal group commits")
+        self._records_counter = get_metrics().counter("state_journal_records_total", "Device records written to the journal")
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        self._writer = None
+        if background:
+            self._writer = threading.Thread(target=self._run_writer, name="StateStoreWriter", daemon=True)
+            self._writer.start()
+
+    def restore(self, automation_system):
+        """Load the snapshot, replay the journal tail and apply the result; returns the devices restored.
+
+        Registered devices get their saved state; devices missing from the system are created.
+        Restored state is applied quietly: no logs, change listeners or event-driven rules run.
+        """
+        states = {}
+        first_generation = self._read_snapshot(states)
+        generations = [generation for generation in self._journal_generations() if generation >= first_generation]
+        for generation in generations:
+            self._replay_journal(generation, states)
+        self.generation = max(generations, default=first_generation)
+        apply_states(automation_system, states)
+        return len(states)
+
+    def attach(self, automation_system):
+        """Journal every change of the system's devices from now on; call restore() first."""
+        self.automation_system = automation_system
+        path = self._journal_path(self.generation)
+        valid_length = self._replay_journal(self.generation, None) if os.path.exists(path) else 0
+        self._journal = open(path, "r+b" if valid_length else "wb")
+        if valid_length:
+            self._journal.truncate(valid_length)  # Drop a torn record left by a crash
+            self._journal.seek(valid_length)
+        else:
+            self._journal.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.generation))
+        self._journal_size = self._journal.tell()
+        automation_system.add_change_listener(self.record)
+
+    def record(self, device):
+        """Change listener: mark a device for the next group commit."""
+        with self._dirty_lock:
+            self._dirty[device.device_id] = device
+            if self._checkpoint_due:
+                self._checkpoint_due = False
+                self._snapshot_devices = list(self.automation_system.registry.all())
+
+    def commit(self):
+        """Write every dirty device to the journal and fsync, as one group."""
+        with self._io_lock:
+            if self._journal is None:
+                return
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, {}
+                devices, self._snapshot_devices = self._snapshot_devices, None
+            if devices is not None:
+                # Start the new generation before writing, so no change made after the device list
+                # was taken ends up only in a journal the snapshot replaces
+                self._start_generation()
+            if dirty:
+                start = time.perf_counter()
+                chunks = []
+                for device in dirty.values():
+                    # Encoded one at a time, so a device that cannot be persisted only loses its own change
+                    try:
+                        record = encode_device(device)
+                    except PersistenceError as e:
+                        get_log().error("StateStore", "{}", e)
+                        continue
+                    chunks.append(record)
+                    chunks.append(CRC.pack(zlib.crc32(record)))
+                data = b"".join(chunks)
+                self._journal.write(data)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._journal_size += len(data)
+                self._records_counter.inc(len(chunks) // 2)
+                self._commit_histogram.observe(time.perf_counter() - start)
+            if devices is not None:
+                self._write_snapshot(devices)
+            elif self._journal_size >= self.snapshot_threshold:
+                with self._dirty_lock:
+                    self._checkpoint_due = True
+
+    def checkpoint(self):
+        """Write a snapshot of every device and start a new journal generation; call it from the
+        thread that owns the devices."""
+        with self._dirty_lock:
+            self._checkpoint_due = False
+            self._snapshot_devices = list(self.automation_system.registry.all())
+        self.commit()
+
+    def close(self):
+        """Stop the background writer, commit what is pending and close the journal."""
+        self._closed.set()
+        self._wake.set()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join()
+        self.commit()
+        with self._io_lock:
+            if self._journal is not None:
+                if self.automation_system is not None:
+                    self.automation_system.remove_change_listener(self.record)
+                self._journal.close()
+                self._journal = None
+
+    def _start_generation(self):
+        # Called with the I/O lock held. New changes go to the next generation first, so the
+        # snapshot may already contain some of them; replaying those records again is harmless.
+        self._journal.close()
+        self.generation += 1
+        self._journal = open(self._journal_path(self.generation), "wb")
+        self._journal.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.generation))
+        self._journal.flush()
+        self._journal_size = self._journal.tell()
+
+    def _write_snapshot(self, devices):
+        # Called with the I/O lock held, after _start_generation
+        start = time.perf_counter()
+        body = encode_snapshot(devices)
+        temporary = os.path.join(self.directory, "snapshot.bin.tmp")
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.generation, len(devices)))
+            f.write(body)
+            f.write(CRC.pack(zlib.crc32(body)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self._snapshot_path())
+        self._fsync_directory()
+        for generation in self._journal_generations():
+            if generation < self.generation:
+                os.remove(self._journal_path(generation))
+        get_log().info("StateStore", "Snapshot of {} devices written in {:.3f}s.", len(devices), time.perf_counter() - start)
+
+    def _read_snapshot(self, states):
+        # Maps the snapshot and decodes its records into states; returns the first journal
+        # generation to replay on top of it.
+        path = self._snapshot_path()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if len(view) < SNAPSHOT_HEADER.size + CRC.size:
+                raise PersistenceError(f"Snapshot {path} is truncated.")
+            magic, generation, count = SNAPSHOT_HEADER.unpack_from(view, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise PersistenceError(f"{path} is not a snapshot file.")
+            end = len(view) - CRC.size
+            with memoryview(view)[SNAPSHOT_HEADER.size:end] as body:
+                if zlib.crc32(body) != CRC.unpack_from(view, end)[0]:
+                    raise PersistenceError(f"Snapshot {path} is corrupt.")
+                states.update(decode_snapshot(body, count))
+        return generation
+
+    def _replay_journal(self, generation, states):
+        # Applies the journal's records to states (if given) and returns the length of its valid
+        # prefix: replay stops at the first incomplete or corrupt record.
+        with open(self._journal_path(generation), "rb") as f:
+            data = f.read()
+        if len(data) < JOURNAL_HEADER.size or JOURNAL_HEADER.unpack_from(data, 0)[0] != JOURNAL_MAGIC:
+            return 0
+        offset = JOURNAL_HEADER.size
+        while offset + RECORD.size <= len(data):
+            end = offset + RECORD.size + RECORD.unpack_from(data, offset)[-1]
+            if end + CRC.size > len(data) or zlib.crc32(data[offset:end]) != CRC.unpack_from(data, end)[0]:
+                break
+            if states is not None:
+                device_id, state, _ = decode_record(data, offset)
+                states[device_id] = state
+            offset = end + CRC.size
+        return offset
+
+    def _run_writer(self):
+        # Background writer: group-commits the dirty devices every commit_interval.
+        while not self._closed.is_set():
+            self._wake.wait(self.commit_interval)
+            try:
+                self.commit()
+            except Exception as e:
+                # Keep journaling; the dirty devices of a failed group are lost, later changes are not
+                get_log().error("StateStore", "Error committing the journal: {}", e)
+
+    def _journal_generations(self):
+        generations = []
+        for path in glob.glob(os.path.join(self.directory, "journal-*.bin")):
+            try:
+                generations.append(int(os.path.basename(path)[len("journal-"):-len(".bin")]))
+            except ValueError:
+                pass
+        return sorted(generations)
+
+    def _journal_path(self, generation):
+        return os.path.join(self.directory, f"journal-{generation:08d}.bin")
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, "snapshot.bin")
+
+    def _fsync_directory(self):
+        # Makes the snapshot rename durable; not every platform can open a directory.
+        try:
+            descriptor = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
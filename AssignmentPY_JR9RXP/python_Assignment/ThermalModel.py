@@ -0,0 +1,175 @@
+try:
+    import numpy as np  # optional dependency, only needed for the thermal model
+except ImportError:
+    np = None
+from Clock import get_clock
+from DeviceStatus import DeviceStatus
+from FleetStore import ColumnTable
+from Metrics import timed
+from Thermostat import Thermostat
+
+ROOM_COLUMNS = {
+    "temperature": "f8",  # Current room temperature, °C
+    "setpoint": "f8",  # Thermostat target, °C
+    "enabled": "?",  # Thermostat on
+    "heating": "?",  # Heater currently running
+    "loss_rate": "f8",  # Fraction of the indoor/outdoor difference lost per second
+    "heater_power": "f8",  # Temperature rise per second from the heater alone, °C/s
+    "heater_seconds": "f8",  # Time the heater has been running
+    "added_at": "f8",  # Model time at which the room was added
+}
+
+
+class ThermalModel:
+    """Room temperatures for every thermostat, advanced for all rooms at once with NumPy.
+
+    Each room loses heat to the outdoor temperature in proportion to the difference and gains
+    heat while its heater runs. A thermostat that is on drives its heater with a hysteresis band
+    around the setpoint, so rooms drift toward the setpoint and the heater cycles on and off;
+    an off thermostat keeps its heater off. Between ticks the heater state is constant, so each
+    step applies the exact exponential solution, which stays stable for any step length.
+
+    Setpoints and on/off state are copied into the arrays by a change listener, so step() never
+    touches the Thermostat objects. Once attached, every run_simulation tick advances the rooms by
+    the clock time since the previous tick, virtual time included.
+    """
+
+    def __init__(self, automation_system=None, outdoor_temperature=5.0, hysteresis=0.5, loss_rate=1 / 7200,
+                 heater_power=1 / 240, capacity=1024):
+        """Create a model; if an automation system is given, add a room for each of its thermostats."""
+        if np is None:
+            raise ImportError("ThermalModel requires numpy.")
+        self.outdoor_temperature = outdoor_temperature
+        self.hysteresis = hysteresis
+        self.loss_rate = loss_rate
+        self.heater_power = heater_power
+        self.time = 0.0  # Seconds simulated so far
+        self.rooms = ColumnTable({name: np.dtype(dtype) for name, dtype in ROOM_COLUMNS.items()}, capacity=capacity)
+        self._rows = {}  # device_id -> row
+        self._scratch = None  # Work arrays reused by every step, sized to the table's capacity
+        self._decay = None  # (step length, per-room decay factors) cached between steps
+        self._last_tick = None  # Clock time of the previous run_simulation tick
+        if automation_system is not None:
+            self.attach(automation_system)
+
+    def __len__(self):
+        return self.rooms.size
+
+    def attach(self, automation_system):
+        """Add a room for every thermostat, follow their changes and serve their room temperatures."""
+        for device in automation_system.devices:
+            self.thermostat_changed(device)
+        automation_system.thermal_model = self
+        automation_system.add_change_listener(self.thermostat_changed)
+        automation_system.add_tick_listener(self.tick)
+        self._last_tick = None
+
+    def detach(self, automation_system):
+        automation_system.remove_change_listener(self.thermostat_changed)
+        automation_system.remove_tick_listener(self.tick)
+        automation_system.thermal_model = None
+
+    def tick(self):
+        """Tick listener: advance every room by the clock time since the previous tick."""
+        now = get_clock().now()
+        if self._last_tick is not None and now > self._last_tick:
+            self.step(now - self._last_tick)
+        self._last_tick = now
+
+    def add_room(self, thermostat, temperature=None, loss_rate=None, heater_power=None):
+        """Add the room a thermostat controls; it starts at temperature (default: the setpoint)."""
+        if thermostat.device_id in self._rows:
+            raise ValueError(f"Thermostat {thermostat.device_id} already has a room.")
+        row = self._rows[thermostat.device_id] = self.rooms.append(thermostat)
+        columns = self.rooms.columns  # Read after append, which may have grown the columns
+        columns["temperature"][row] = thermostat.temperature if temperature is None else temperature
+        columns["loss_rate"][row] = self.loss_rate if loss_rate is None else loss_rate
+        columns["heater_power"][row] = self.heater_power if heater_power is None else heater_power
+        columns["heater_seconds"][row] = 0.0
+        columns["added_at"][row] = self.time
+        self._decay = None
+        self.thermostat_changed(thermostat)
+        return row
+
+    def thermostat_changed(self, device):
+        """Change listener: copy a thermostat's setpoint and status into its room."""
+        if not isinstance(device, Thermostat):
+            return
+        row = self._rows.get(device.device_id)
+        if row is None:
+            self.add_room(device)
+            return
+        columns = self.rooms.columns
+        columns["setpoint"][row] = device.temperature
+        columns["enabled"][row] = device.status == DeviceStatus.ON
+
+    @timed("thermal_step_seconds", "Duration of one vectorized thermal model step")
+    def step(self, dt):
+        """Advance every room by dt seconds in one vectorized pass."""
+        size = self.rooms.size
+        if not size:
+            self.time += dt
+            return
+        rooms = self.rooms
+        temperature = rooms.column("temperature")
+        setpoint = rooms.column("setpoint")
+        heating = rooms.column("heating")
+        below, above, target = self._work_arrays(size)
+
+        # Thermostat control with hysteresis: start below the band, stop above it, off when disabled
+        np.subtract(setpoint, self.hysteresis, out=target)
+        np.less(temperature, target, out=below)
+        np.add(setpoint, self.hysteresis, out=target)
+        np.greater(temperature, target, out=above)
+        heating |= below
+        np.logical_not(above, out=above)
+        heating &= above
+        heating &= rooms.column("enabled")
+
+        # Exact solution of dT/dt = -loss * (T - outdoor) + power * heating over the step
+        np.multiply(rooms.column("heater_power"), heating, out=target)
+        target /= rooms.column("loss_rate")
+        target += self.outdoor_temperature
+        temperature -= target
+        temperature *= self._decay_factors(dt, size)
+        temperature += target
+
+        heater_seconds = rooms.column("heater_seconds")
+        np.multiply(heating, dt, out=target)
+        heater_seconds += target
+        self.time += dt
+
+    def room_temperature(self, device_id):
+        """Current temperature of a thermostat's room, or None if it has no room."""
+        row = self._rows.get(device_id)
+        return None if row is None else float(self.rooms.columns["temperature"][row])
+
+    def heater_on(self, device_id):
+        """Whether the room's heater is running, or None if it has no room."""
+        row = self._rows.get(device_id)
+        return None if row is None else bool(self.rooms.columns["heating"][row])
+
+    def duty_cycle(self, device_id):
+        """Fraction of the time since the room was added that its heater has been running."""
+        row = self._rows.get(device_id)
+        if row is None:
+            return None
+        elapsed = self.time - self.rooms.columns["added_at"][row]
+        return float(self.rooms.columns["heater_seconds"][row] / elapsed) if elapsed > 0 else 0.0
+
+    def temperatures(self):
+        """All room temperatures, in the order the rooms were added (a view, not a copy)."""
+        return self.rooms.column("temperature")
+
+    def _work_arrays(self, size):
+        capacity = self.rooms.capacity
+        if self._scratch is None or len(self._scratch[2]) != capacity:
+            self._scratch = (np.empty(capacity, bool), np.empty(capacity, bool), np.empty(capacity))
+        return tuple(array[:size] for array in self._scratch)
+
+    def _decay_factors(self, dt, size):
+        # exp(-loss * dt) per room, recomputed only when the step length or the rooms change
+        if self._decay is None or self._decay[0] != dt or len(self._decay[1]) != size:
+            self._decay = (dt, np.exp(-self.rooms.column("loss_rate") * dt))
+        return self._decay[1]
+
@@ -1,27 +1,71 @@
+import sys
+from DeviceStatus import DeviceStatus
+from EventLog import get_log
+from Metrics import counted_command
+
 class InvalidTemperatureError(Exception): # builtin exception
     """Exception raised when an invalid temperature is set for the thermostat."""
     pass
 
 class Thermostat:
+    # Fixed attribute layout: no per-instance __dict__, which matters at fleet scale
+    __slots__ = ("device_id", "_status", "temperature", "automation_system")
+
     DEFAULT_TEMPERATURE = 20  # Default temperature set for the thermostat
     MIN_TEMPERATURE = 10  # Minimum allowable temperature
     MAX_TEMPERATURE = 30  # Maximum allowable temperature
+    POLL_INTERVAL = 10  # Seconds between state polls in the asyncio runtime
+    IO_LATENCY = 0.1  # Simulated network round trip for async commands, in seconds
 
     def __init__(self, device_id, automation_system=None):
         """Initialize the thermostat with a device ID and an optional reference to an automation system."""
-        self.device_id = device_id
-        self.status = "off"  # Initial status of the thermostat is off
+        self.device_id = sys.intern(device_id)  # Interned so equal ids share one string
+        self._status = DeviceStatus.OFF  # Initial status of the thermostat is off
         self.temperature = self.DEFAULT_TEMPERATURE  # Set initial temperature to default
         self.automation_system = automation_system  # Reference to the central automation system
-        self.status_var = None  # GUI variable to display status, initially set to None
+
+    @property
+    def status(self):
+        """Current status of the thermostat, "on" or "off"."""
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        """Set the status and let the automation system re-index the thermostat if it changed."""
+        value = DeviceStatus(value)
+        old_status = self._status
+        self._status = value
+        if old_status != value and self.automation_system:
+            self.automation_system.device_status_changed(self, old_status)
+
+    @property
+    def room_temperature(self):
+        """Simulated temperature of the room, or None if no thermal model is attached."""
+        model = self.automation_system.thermal_model if self.automation_system else None
+        return None if model is None else model.room_temperature(self.device_id)
+
+    @property
+    def heating(self):
+        """Whether the simulated heater is running, or None if no thermal model is attached."""
+        model = self.automation_system.thermal_model if self.automation_system else None
+        return None if model is None else model.heater_on(self.device_id)
 
     def _update_status_var(self):
-        """Private method to update the status variable with the current status and temperature."""
-        if self.status_var is not None:
-            status_info = f"Thermostat {self.device_id} - Status: {self.status.capitalize()}, Temperature: {self.temperature}°C"
-            self.status_var.set(status_info)
-            print(status_info)
+        """Private method to log the current status and temperature and publish the change."""
+        get_log().debug("Thermostat", "Thermostat {} - Status: {}, Temperature: {}°C",
+                        self.device_id, self.status.capitalize(), self.temperature)
+
+        # Publish the change; the automation system and any GUI listening to it pick it up from here
+        if self.automation_system:
+            self.automation_system.device_changed(self)
+
+    async def command_async(self, method_name, *args):
+        """Run a command after the simulated network latency, without blocking the event loop."""
+        import asyncio  # Imported here so headless startup without the asyncio runtime skips it
+        await asyncio.sleep(self.IO_LATENCY)
+        return getattr(self, method_name)(*args)
 
+    @counted_command
     def toggle_thermostat(self):
         """Toggle the thermostat's state between on and off."""
         if self.status == "off":
@@ -30,26 +74,29 @@ class Thermostat:
             self.turn_off()
         self._update_status_var()
 
+    @counted_command
     def turn_on(self):
         """Turn on the thermostat and update its status."""
         self.status = "on"
         self._update_status_var()
-        print(f"Thermostat {self.device_id} is now on.")
+        get_log().info("Thermostat", "Thermostat {} is now on.", self.device_id)
 
+    @counted_command
     def turn_off(self):
         """Turn off the thermostat, reset to default temperature, and update its status."""
         self.status = "off"
         self.temperature = self.DEFAULT_TEMPERATURE
         self._update_status_var()
-        print(f"Thermostat {self.device_id} is now off.")
+        get_log().info("Thermostat", "Thermostat {} is now off.", self.device_id)
 
         # Check and start recording in the automation system if necessary
         if self.automation_system:
             try:
                 self.automation_system.check_and_start_recording()
             except Exception as e:
-                print(f"Error starting recording in automation system: {e}")
+                get_log().error("Thermostat", "Error starting recording in automation system: {}", e)
 
+    @counted_command
     def set_temperature(self, temperature):
         """Set the thermostat's temperature within a valid range if the thermostat is on."""
         try:
@@ -58,15 +105,15 @@ class Thermostat:
                 if self.status == "on":
                     self.temperature = temperature
                     self._update_status_var()
-                    print(f"Temperature of Thermostat {self.device_id} set to {temperature}°C.")
+                    get_log().info("Thermostat", "Temperature of Thermostat {} set to {}°C.", self.device_id, temperature)
                 else:
-                    print(f"Thermostat {self.device_id} is off. Cannot set temperature.")
+                    get_log().warning("Thermostat", "Thermostat {} is off. Cannot set temperature.", self.device_id)
             else:
                 # Raise an error if the temperature is out of bounds
                 raise InvalidTemperatureError(f"Temperature must be between {self.MIN_TEMPERATURE}°C and {self.MAX_TEMPERATURE}°C.")
         except ValueError:
             # Handle non-integer temperature inputs
-            print(f"Invalid temperature input: {temperature}")
+            get_log().warning("Thermostat", "Invalid temperature input: {}", temperature)
         except InvalidTemperatureError as e:
             # Handle invalid temperature range
-            print(e)
+            get_log().warning("Thermostat", "{}", e)
@@ -0,0 +1,108 @@
+# Throughput and latency benchmark for the device message bus: a publisher floods device state
+# messages and one subscriber on home/+/state measures how many arrive per second and how long
+# each took. The socket backend runs the broker and the publisher in their own processes.
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from MessageBus import BusBroker, LocalBus, SocketBus, state_topic
+
+
+def state_messages(count, devices):
+    """Yields (topic, message) pairs shaped like SmartLight state, stamped when they are produced."""
+    for i in range(count):
+        device_id = f"Light{i % devices}"
+        yield state_topic(device_id), {"id": device_id, "type": "SmartLight", "status": "on",
+                                       "brightness": i % 100, "sent": time.perf_counter()}
+
+
+class Receiver:
+    """Subscriber callback recording the latency of every message until `expected` arrived."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.latencies = []
+        self.first_sent = None
+        self.last_received = None
+        self.done = threading.Event()
+
+    def __call__(self, topic, message):
+        now = time.perf_counter()
+        if self.first_sent is None:
+            self.first_sent = message["sent"]
+        self.latencies.append(now - message["sent"])
+        if len(self.latencies) >= self.expected:
+            self.last_received = now
+            self.done.set()
+
+    def report(self, label):
+        received = len(self.latencies)
+        if not received or self.last_received is None:
+            print(f"{label:>18} {received:>9} messages received before the timeout")
+            return
+        latencies = sorted(self.latencies)
+        rate = received / (self.last_received - self.first_sent)
+        p50 = latencies[received // 2] * 1e6
+        p99 = latencies[min(received - 1, int(received * 0.99))] * 1e6
+        print(f"{label:>18} {rate:>12,.0f} {p50:>10.1f} {p99:>10.1f}")
+
+
+def run_broker(path):
+    BusBroker(path).serve_forever()
+
+
+def run_publisher(path, count, devices, batch_size):
+    bus = SocketBus(path, batch_size=batch_size)
+    for topic, message in state_messages(count, devices):
+        bus.publish(topic, message)
+    bus.close()
+
+
+def bench_local(count, devices):
+    bus = LocalBus()
+    receiver = Receiver(count)
+    bus.subscribe("home/+/state", receiver)
+    for topic, message in state_messages(count, devices):
+        bus.publish(topic, message)
+    receiver.report("local")
+
+
+def bench_socket(directory, count, devices, batch_size):
+    path = os.path.join(directory, f"bus-{batch_size}.sock")
+    broker = multiprocessing.Process(target=run_broker, args=(path,), daemon=True)
+    broker.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    subscriber = SocketBus(path)
+    receiver = Receiver(count)
+    subscriber.subscribe("home/+/state", receiver)
+    publisher = multiprocessing.Process(target=run_publisher, args=(path, count, devices, batch_size))
+    publisher.start()
+    receiver.done.wait(timeout=120)
+    publisher.join()
+    subscriber.close()
+    broker.terminate()
+    broker.join()
+    receiver.report(f"socket batch={batch_size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the device message bus.")
+    parser.add_argument("--messages", type=int, default=200000, help="messages to publish per run")
+    parser.add_argument("--devices", type=int, default=1000, help="distinct device topics")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64, 256],
+                        help="socket publish batch sizes")
+    args = parser.parse_args()
+
+    print(f"{args.messages} state messages over {args.devices} devices")
+    print(f"{'backend':>18} {'msgs/s':>12} {'p50 us':>10} {'p99 us':>10}")
+    bench_local(args.messages, args.devices)
+    with tempfile.TemporaryDirectory(prefix="smarthome-bus-") as directory:
+        for batch_size in args.batch_sizes:
+            bench_socket(directory, args.messages, args.devices, batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Benchmark for CommandDispatcher: switching every camera of an idle home on and to recording,
+# with each command paying a simulated blocking driver round trip. One worker reproduces the
+# old one-camera-after-another behaviour; a full pool runs the cameras in parallel.
+import argparse
+import os
+import random
+import time
+from concurrent.futures import wait
+from AutomationSystem import AutomationSystem
+from CommandDispatcher import CommandDispatcher
+from EventLog import EventLog, set_log
+from SecurityCamera import SecurityCamera
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+
+DEFAULT_SIZES = [1, 10, 100, 500]
+
+
+def build_home(cameras):
+    """Builds an idle home (light and thermostat off) with `cameras` cameras that are off."""
+    home = AutomationSystem(rules=())
+    home.add_device(SmartLight("Light0", home))
+    home.add_device(Thermostat("Thermostat0", home))
+    for i in range(cameras):
+        home.add_device(SecurityCamera(f"Camera{i}", home))
+    return home
+
+
+def make_driver(latency, failure_rate, seed=0):
+    """A driver that blocks for `latency` seconds and fails with probability `failure_rate`."""
+    rng = random.Random(seed)
+
+    def driver(device, method_name, args, timeout):
+        time.sleep(latency)
+        if rng.random() < failure_rate:
+            raise ConnectionResetError(f"{device.device_id} dropped the connection")
+    return driver
+
+
+def run(cameras, workers, latency, failure_rate=0.0, retries=0):
+    """Returns (seconds until every camera records, cameras recording, failed commands)."""
+    home = build_home(cameras)
+    dispatcher = CommandDispatcher(home, workers=workers, driver=make_driver(latency, failure_rate),
+                                   retries=retries, retry_delay=latency).attach()
+    start = time.perf_counter()
+    futures = home._start_camera_recording_and_turn_on()
+    wait(futures)
+    elapsed = time.perf_counter() - start
+    dispatcher.close()
+    recording = sum(1 for cam in home.registry.of_type(SecurityCamera) if cam.recording)
+    return elapsed, recording, sum(1 for future in futures if future.exception() is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel device command dispatch.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="camera counts")
+    parser.add_argument("--workers", type=int, default=512, help="dispatcher pool size for the parallel runs")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated driver round trip in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="driver failure rate for the retry runs")
+    args = parser.parse_args()
+
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    print(f"driver round trip {args.latency * 1000:.0f} ms, 2 commands per camera")
+    print(f"{'cameras':>8} {'1 worker s':>11} {'pool s':>8} {'speedup':>8} {'retry s':>8} {'recording':>10} {'failed':>7}")
+    for size in args.sizes:
+        sequential, _, _ = run(size, 1, args.latency)
+        parallel, _, _ = run(size, args.workers, args.latency)
+        flaky, recording, failed = run(size, args.workers, args.latency, args.failure_rate, retries=3)
+        print(f"{size:>8} {sequential:>11.3f} {parallel:>8.3f} {sequential / parallel:>7.1f}x {flaky:>8.3f} "
+              f"{recording:>10} {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
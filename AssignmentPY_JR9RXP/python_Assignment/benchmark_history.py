@@ -0,0 +1,86 @@
+# Benchmark for DeviceHistory: the cost of recording state changes, the memory the ring
+# buffers use, and how long range queries take.
+import argparse
+import os
+import random
+import sys
+import time
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from AutomationSystem import AutomationSystem
+from Clock import VirtualClock, set_clock
+from DeviceHistory import DeviceHistory
+from EventLog import EventLog, set_log
+
+
+def build_home(size):
+    """Builds a home with `size` devices: 90% lights and 10% thermostats, all on."""
+    home = AutomationSystem()
+    thermostats = max(1, size // 10)
+    devices = [SmartLight(f"Light{i}", home) for i in range(size - thermostats)]
+    devices += [Thermostat(f"Thermostat{i}", home) for i in range(thermostats)]
+    for device in devices:
+        home.add_device(device)
+        device.turn_on()
+    return home, devices
+
+
+def change_devices(devices, changes, clock, rng):
+    """Applies random brightness and temperature changes, one per virtual second; returns seconds taken."""
+    start = time.perf_counter()
+    for _ in range(changes):
+        clock.sleep(1)
+        device = rng.choice(devices)
+        if isinstance(device, SmartLight):
+            device.set_brightness(rng.randint(0, 100))
+        else:
+            device.set_temperature(rng.randint(device.MIN_TEMPERATURE, device.MAX_TEMPERATURE))
+    return time.perf_counter() - start
+
+
+def history_size(history):
+    """Bytes used by the history's series objects and their arrays."""
+    total = 0
+    for series in (series for attributes in history._series.values() for series in attributes.values()):
+        rings = [series.raw] + [tier.ring for tier in series.tiers]
+        total += sys.getsizeof(series) + sum(sys.getsizeof(tier) for tier in series.tiers)
+        total += sum(sys.getsizeof(ring) + sum(sys.getsizeof(column) for column in ring.columns) for ring in rings)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-device time-series history.")
+    parser.add_argument("--devices", type=int, default=10000, help="devices in the home")
+    parser.add_argument("--changes", type=int, default=200000, help="state changes to record")
+    parser.add_argument("--queries", type=int, default=10000, help="summary queries to run")
+    args = parser.parse_args()
+
+    # Device logs are discarded so only history work is measured
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    clock = VirtualClock(0)
+    set_clock(clock)
+    rng = random.Random(0)
+    home, devices = build_home(args.devices)
+    baseline = change_devices(devices, args.changes, clock, rng)
+
+    history = DeviceHistory(home)
+    recorded = change_devices(devices, args.changes, clock, rng)
+    memory = history_size(history)
+
+    now = clock.now()
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        device = rng.choice(devices)
+        attribute = "brightness" if isinstance(device, SmartLight) else "temperature"
+        history.summary(device.device_id, attribute, now - rng.uniform(60, args.changes), now)
+    query_time = time.perf_counter() - start
+
+    print(f"{args.changes} changes on {args.devices} devices:")
+    print(f"  {baseline / args.changes * 1e6:.2f} us/change without history, "
+          f"{recorded / args.changes * 1e6:.2f} us/change with history")
+    print(f"  {len(history)} series using {memory / 1024 / 1024:.1f} MiB ({memory / len(history):.0f} bytes/series)")
+    print(f"  {query_time / args.queries * 1e6:.2f} us per summary query")
+
+
+if __name__ == "__main__":
+    main()
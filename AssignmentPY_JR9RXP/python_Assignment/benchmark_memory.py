@@ -0,0 +1,81 @@
+# Memory benchmark: bytes per device for the __slots__ device classes compared with the
+# dict-based attribute layout they used before.
+import argparse
+import gc
+import tracemalloc
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+
+# Copies of the device classes' previous dict-based layout: the same attributes assigned in the
+# same order, so each type gets its own key-sharing instance dicts as it did before __slots__
+
+
+class DictSmartLight:
+    def __init__(self, device_id, automation_system):
+        self.device_id = device_id
+        self._status = "off"
+        self.brightness = 0
+        self.automation_system = automation_system
+        self.status_var = None
+
+
+class DictThermostat:
+    DEFAULT_TEMPERATURE = 20
+
+    def __init__(self, device_id, automation_system=None):
+        self.device_id = device_id
+        self._status = "off"
+        self.temperature = self.DEFAULT_TEMPERATURE
+        self.automation_system = automation_system
+        self.status_var = None
+
+
+class DictSecurityCamera:
+    def __init__(self, device_id, automation_system):
+        self.device_id = device_id
+        self._status = "off"
+        self.recording = False
+        self.infrared = False
+        self.automation_system = automation_system
+        self.status_var = None
+
+
+# Device class -> (id prefix, its previous dict-based layout)
+DEVICE_TYPES = {
+    SmartLight: ("Light", DictSmartLight),
+    Thermostat: ("Thermostat", DictThermostat),
+    SecurityCamera: ("Camera", DictSecurityCamera),
+}
+
+
+def measure(factory, count):
+    """Return the bytes allocated per device while creating count devices with factory(index)."""
+    gc.collect()
+    tracemalloc.start()
+    devices = [factory(i) for i in range(count)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del devices
+    return allocated / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report bytes per device before and after __slots__.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="fleet sizes to measure")
+    args = parser.parse_args()
+
+    print(f"{'device':>15} {'count':>9} {'before B/dev':>13} {'after B/dev':>12} {'saved':>7}")
+    for device_class, (prefix, dict_class) in DEVICE_TYPES.items():
+        for count in args.sizes:
+            before = measure(lambda i: dict_class(f"{prefix}{i}", None), count)
+            after = measure(lambda i: device_class(f"{prefix}{i}", None), count)
+            saved = 1 - after / before
+            print(f"{device_class.__name__:>15} {count:>9} {before:>13.1f} {after:>12.1f} {saved:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
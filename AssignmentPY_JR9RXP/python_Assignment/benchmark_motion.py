@@ -0,0 +1,94 @@
+# Benchmark for MotionPipeline: noisy cameras fire motion triggers at a sustained rate on a
+# virtual clock, handled either directly (detect_motion per trigger) or through the pipeline.
+import argparse
+import os
+import time
+from SecurityCamera import SecurityCamera
+from SmartLight import SmartLight
+from AutomationSystem import AutomationSystem
+from EventLog import EventLog, set_log
+from Metrics import get_metrics
+from MotionPipeline import MotionPipeline
+from Simulator import DiscreteEventSimulator
+
+
+def build_home(cameras):
+    """Builds a home with `cameras` cameras and one light."""
+    home = AutomationSystem()
+    home.add_device(SmartLight("Light0", home))
+    for i in range(cameras):
+        home.add_device(SecurityCamera(f"Camera{i}", home))
+    return home
+
+
+def schedule_sensor(simulator, rate, callback, *args):
+    """Calls callback(*args) at exponentially distributed intervals averaging `rate` per second."""
+    def fire():
+        callback(*args)
+        simulator.schedule(simulator.random.expovariate(rate), fire)
+    simulator.schedule(simulator.random.expovariate(rate), fire)
+
+
+def run(cameras, rate, duration, pipeline_options=None, process_interval=0.05):
+    """Simulates the triggers; returns (triggers, wall seconds, pipeline or None, largest queue seen)."""
+    get_metrics().reset()
+    home = build_home(cameras)
+    simulator = DiscreteEventSimulator(home, seed=1)
+    ids = [device.device_id for device in home.registry.of_type(SecurityCamera)]
+    pipeline = None
+    if pipeline_options is None:
+        for device_id in ids:
+            schedule_sensor(simulator, rate, home.registry.get(device_id).detect_motion)
+    else:
+        pipeline = MotionPipeline(home, **pipeline_options)
+        for device_id in ids:
+            schedule_sensor(simulator, rate, pipeline.submit, device_id)
+        simulator.schedule_periodic(process_interval, pipeline.process)
+    largest_queue = [0]
+
+    def sample_queue():
+        largest_queue[0] = max(largest_queue[0], pipeline.pending())
+    if pipeline is not None:
+        simulator.schedule_periodic(0.01, sample_queue)
+
+    start = time.perf_counter()
+    simulator.run_for(duration)
+    wall_time = time.perf_counter() - start
+    triggers = get_metrics().counter("device_commands_total", device_type="SecurityCamera",
+                                     command="detect_motion").value if pipeline is None else None
+    if pipeline is not None:
+        triggers = pipeline.accepted.value + pipeline.dropped.value + pipeline.debounced.value
+    return triggers, wall_time, pipeline, largest_queue[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark motion ingestion under sustained trigger rates.")
+    parser.add_argument("--cameras", type=int, default=100, help="noisy cameras")
+    parser.add_argument("--rate", type=float, default=200, help="motion triggers per second per camera")
+    parser.add_argument("--duration", type=float, default=10, help="virtual seconds to simulate")
+    args = parser.parse_args()
+
+    # Device logs are discarded so only motion handling is measured
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    scenarios = [
+        ("direct detect_motion", None, 0.05),
+        ("pipeline", {"queue_size": 64, "debounce": 1.0, "coalesce_window": 0.1}, 0.05),
+        ("pipeline, no debounce", {"queue_size": 64, "debounce": 0.0, "coalesce_window": 0.1}, 0.05),
+        ("pipeline, slow consumer", {"queue_size": 64, "debounce": 0.0, "coalesce_window": 0.1}, 2.0),
+    ]
+    print(f"{args.cameras} cameras x {args.rate:.0f} triggers/s for {args.duration:.0f} virtual seconds")
+    print(f"{'scenario':>24} {'triggers':>9} {'handled':>8} {'coalesced':>9} {'debounced':>9} {'dropped':>8} "
+          f"{'max queue':>9} {'us/trigger':>10}")
+    for name, options, interval in scenarios:
+        triggers, wall_time, pipeline, largest_queue = run(args.cameras, args.rate, args.duration, options, interval)
+        if pipeline is None:
+            handled, coalesced, debounced, dropped = triggers, 0, 0, 0
+        else:
+            handled, coalesced = pipeline.handled.value, pipeline.coalesced.value
+            debounced, dropped = pipeline.debounced.value, pipeline.dropped.value
+        print(f"{name:>24} {triggers:>9} {handled:>8} {coalesced:>9} {debounced:>9} {dropped:>8} "
+              f"{largest_queue:>9} {wall_time / triggers * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Benchmark for StateStore: the cost of journaling state changes, and how long a home takes to
+# restore from a memory-mapped snapshot plus the journal tail written after it.
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+from AutomationSystem import AutomationSystem
+from EventLog import EventLog, set_log
+from StateStore import StateStore
+
+
+def build_home(size):
+    """Builds a home with `size` devices: 80% lights, 10% thermostats, 10% cameras."""
+    home = AutomationSystem()
+    thermostats = cameras = max(1, size // 10)
+    devices = [SmartLight(f"Light{i}", home) for i in range(size - thermostats - cameras)]
+    devices += [Thermostat(f"Thermostat{i}", home) for i in range(thermostats)]
+    devices += [SecurityCamera(f"Camera{i}", home) for i in range(cameras)]
+    for device in devices:
+        home.add_device(device)
+    return home, devices
+
+
+def change_devices(devices, changes, rng):
+    """Applies random state changes, returns the elapsed time in seconds."""
+    start = time.perf_counter()
+    for _ in range(changes):
+        device = rng.choice(devices)
+        if isinstance(device, SmartLight):
+            device.toggle_light()
+        elif isinstance(device, Thermostat):
+            device.toggle_thermostat()
+        else:
+            device.toggle_camera()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark journaling and restoring device state.")
+    parser.add_argument("--devices", type=int, default=100000, help="devices in the home")
+    parser.add_argument("--changes", type=int, default=20000, help="state changes journaled after the snapshot")
+    args = parser.parse_args()
+
+    # Device logs are discarded so only persistence work is measured
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    rng = random.Random(0)
+    directory = tempfile.mkdtemp(prefix="smarthome-state-")
+    try:
+        home, devices = build_home(args.devices)
+        baseline = change_devices(devices, args.changes, rng)
+
+        store = StateStore(directory)
+        store.restore(home)
+        store.attach(home)
+        store.checkpoint()
+        journaled = change_devices(devices, args.changes, rng)
+        store.close()
+        expected = {device.device_id: (str(device.status), getattr(device, "brightness", None),
+                                       getattr(device, "recording", None)) for device in devices}
+
+        # A cold start: a fresh system with no devices, restored entirely from disk
+        restored_home = AutomationSystem()
+        start = time.perf_counter()
+        restored = StateStore(directory, background=False).restore(restored_home)
+        restore_time = time.perf_counter() - start
+        actual = {device.device_id: (str(device.status), getattr(device, "brightness", None),
+                                     getattr(device, "recording", None)) for device in restored_home.devices}
+
+        sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in sorted(os.listdir(directory))}
+        print(f"{args.changes} changes: {baseline / args.changes * 1e6:.2f} us/change without journal, "
+              f"{journaled / args.changes * 1e6:.2f} us/change with journal")
+        print(f"Restored {restored} devices in {restore_time:.3f}s; state matches: {actual == expected}")
+        for name, size in sizes.items():
+            print(f"  {name}: {size / 1024:.0f} KiB")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
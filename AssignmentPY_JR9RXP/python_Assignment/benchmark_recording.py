@@ -0,0 +1,73 @@
+# Benchmark for RecordingWriter: a growing number of cameras record synthetic frames in real time
+# through the shared writer into rotating segment files under a disk quota.
+import argparse
+import os
+import tempfile
+import time
+from AutomationSystem import AutomationSystem
+from EventLog import EventLog, set_log
+from Metrics import get_metrics
+from RecordingWriter import RecordingWriter
+from SecurityCamera import SecurityCamera
+
+DEFAULT_SIZES = [1, 4, 16, 64, 128]
+
+
+def build_home(cameras):
+    """Builds a home whose cameras are all on and recording."""
+    home = AutomationSystem(rules=())
+    for i in range(cameras):
+        camera = SecurityCamera(f"Camera{i}", home)
+        home.add_device(camera)
+        camera.turn_on()
+    return home
+
+
+def run(directory, cameras, fps, duration, frame_size, segment_size, quota):
+    """Records for `duration` seconds at `fps`; returns (writer, seconds until every frame was synced)."""
+    get_metrics().reset()
+    home = build_home(cameras)
+    writer = RecordingWriter(directory, segment_size=segment_size, quota=quota, frame_size=frame_size)
+    writer.attach(home)
+    start = time.perf_counter()
+    for tick in range(int(fps * duration)):
+        delay = start + tick / fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        writer.capture()
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return writer, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simulated camera recording to segment files.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="recording camera counts")
+    parser.add_argument("--fps", type=float, default=15, help="frames per second per camera")
+    parser.add_argument("--duration", type=float, default=3, help="seconds to record per run")
+    parser.add_argument("--frame-kib", type=int, default=32, help="frame size in KiB")
+    parser.add_argument("--segment-mib", type=int, default=4, help="segment file size in MiB")
+    parser.add_argument("--quota-mib", type=int, default=512, help="disk quota in MiB")
+    parser.add_argument("--directory", help="where to write segments (default: a temporary directory)")
+    args = parser.parse_args()
+
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    frame_size = args.frame_kib * 1024
+    print(f"{args.fps:.0f} fps x {args.frame_kib} KiB frames for {args.duration:.0f}s, "
+          f"{args.segment_mib} MiB segments, {args.quota_mib} MiB quota")
+    print(f"{'cameras':>8} {'offered MB/s':>12} {'written MB/s':>12} {'frames':>8} {'dropped':>8} "
+          f"{'mean us':>8} {'p99 us <=':>9} {'segments':>8} {'deleted':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="smarthome-recording-", dir=args.directory) as directory:
+            writer, elapsed = run(directory, size, args.fps, args.duration, frame_size,
+                                  args.segment_mib * 1024 * 1024, args.quota_mib * 1024 * 1024)
+        latency = writer.latency
+        mean = latency.sum / latency.count * 1e6 if latency.count else float("nan")
+        print(f"{size:>8} {size * args.fps * frame_size / 1e6:>12.1f} {writer.bytes.value / elapsed / 1e6:>12.1f} "
+              f"{writer.frames.value:>8} {writer.dropped.value:>8} {mean:>8.0f} "
+              f"{latency.quantile(0.99) * 1e6:>9.0f} {writer.rotations.value:>8} {writer.deleted.value:>8}")
+
+
+if __name__ == "__main__":
+    main()
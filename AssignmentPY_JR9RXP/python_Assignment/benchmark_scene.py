@@ -0,0 +1,53 @@
+# Benchmark for the "goodnight" scene: turning off every light and thermostat in the home,
+# once with individual commands and once inside AutomationSystem.batch().
+import os
+import time
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+from AutomationSystem import AutomationSystem
+from EventLog import EventLog, set_log
+
+FLEET_SIZES = [1000, 2000, 4000, 8000, 16000]
+
+
+def build_home(size):
+    """Builds a home with `size` lights, size // 10 thermostats and size // 100 cameras, all on."""
+    home = AutomationSystem()
+    devices = [SmartLight(f"Light{i}", home) for i in range(size)]
+    devices += [Thermostat(f"Thermostat{i}", home) for i in range(max(1, size // 10))]
+    devices += [SecurityCamera(f"Camera{i}", home) for i in range(max(1, size // 100))]
+    for device in devices:
+        home.add_device(device)
+        device.turn_on()
+    return home
+
+
+def goodnight(home, batched):
+    """Turns off every light and thermostat, returns the elapsed time in seconds."""
+    commands = [(device.device_id, "turn_off") for device in home.devices
+                if isinstance(device, (SmartLight, Thermostat))]
+    start = time.perf_counter()
+    if batched:
+        home.apply_bulk(commands)
+    else:
+        for device_id, method_name in commands:
+            getattr(home.registry.get(device_id), method_name)()
+    return time.perf_counter() - start
+
+
+def main():
+    # Device logging goes to a discarded stream so only automation work is measured
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    print(f"{'devices':>8} {'unbatched s':>12} {'batched s':>10} {'batched us/device':>18}")
+    for size in FLEET_SIZES:
+        results = {}
+        for batched in (False, True):
+            home = build_home(size)
+            results[batched] = goodnight(home, batched)
+        per_device = results[True] / len(home.devices) * 1e6
+        print(f"{size:>8} {results[False]:>12.4f} {results[True]:>10.4f} {per_device:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
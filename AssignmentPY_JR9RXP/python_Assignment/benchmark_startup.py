@@ -0,0 +1,57 @@
+# Cold start benchmark for the headless entry point: each run is a fresh interpreter that
+# imports main.py, streams a generated fleet file and exits (python main.py --fleet ... --load-only).
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from FleetLoader import write_fleet
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def fleet_definitions(size):
+    """Yields `size` device definitions: 80% lights, 10% thermostats, 10% cameras, some of them on."""
+    thermostats = cameras = max(1, size // 10)
+    for i in range(size - thermostats - cameras):
+        yield {"id": f"Light{i}", "type": "SmartLight", "status": "on" if i % 3 == 0 else "off",
+               "brightness": 30 + i % 70 if i % 3 == 0 else 0}
+    for i in range(thermostats):
+        yield {"id": f"Thermostat{i}", "type": "Thermostat", "status": "on" if i % 2 else "off", "temperature": 18 + i % 8}
+    for i in range(cameras):
+        yield {"id": f"Camera{i}", "type": "SecurityCamera", "status": "on", "recording": i % 2 == 0, "infrared": False}
+
+
+def cold_start(fleet_path):
+    """Runs the entry point in a new interpreter; returns (wall seconds, seconds main.py reported)."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, os.path.join(HERE, "main.py"), "--fleet", fleet_path, "--load-only",
+                             "--log-file", os.devnull], capture_output=True, text=True, check=True).stdout
+    wall_time = time.perf_counter() - start
+    reported = re.search(r"Startup took ([\d.]+)s", output)
+    return wall_time, float(reported.group(1)) if reported else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of the headless entry point.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="fleet sizes")
+    args = parser.parse_args()
+
+    imported = subprocess.run([sys.executable, "-c", "import main, sys; print('tkinter' in sys.modules)"],
+                              cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    print(f"tkinter imported by the headless entry point: {imported}")
+    print(f"{'devices':>8} {'format':>6} {'process s':>10} {'load s':>8} {'us/device':>10}")
+    with tempfile.TemporaryDirectory(prefix="smarthome-fleet-") as directory:
+        for size in args.sizes:
+            for extension in ("jsonl", "csv"):
+                path = os.path.join(directory, f"fleet-{size}.{extension}")
+                write_fleet(path, fleet_definitions(size))
+                wall_time, load_time = cold_start(path)
+                print(f"{size:>8} {extension:>6} {wall_time:>10.3f} {load_time:>8.3f} {load_time / size * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# Headless benchmark suite for the automation core and the device classes.
+# Results are written as JSON so runs can be compared and regressions caught:
+#   python benchmark_suite.py --output before.json
+#   python benchmark_suite.py --output after.json --compare before.json
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from SmartLight import SmartLight
+from Thermostat import Thermostat
+from SecurityCamera import SecurityCamera
+from AutomationSystem import AutomationSystem
+from EventLog import EventLog, set_log
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+
+
+def create_fleet(size):
+    """Creates an automation system and `size` unregistered devices: 80% lights, 10% thermostats, 10% cameras."""
+    home = AutomationSystem()
+    thermostats = max(1, size // 10)
+    cameras = max(1, size // 10)
+    lights = max(1, size - thermostats - cameras)
+    devices = [SmartLight(f"Light{i}", home) for i in range(lights)]
+    devices += [Thermostat(f"Thermostat{i}", home) for i in range(thermostats)]
+    devices += [SecurityCamera(f"Camera{i}", home) for i in range(cameras)]
+    return home, devices
+
+
+def build_fleet(size):
+    """Creates a fleet of `size` devices and registers them all."""
+    home, devices = create_fleet(size)
+    for device in devices:
+        home.add_device(device)
+    return home
+
+
+def bench_add_device(size, repeat):
+    home, devices = create_fleet(size)
+    start = time.perf_counter()
+    for device in devices:
+        home.add_device(device)
+    return len(devices), time.perf_counter() - start
+
+
+def bench_run_simulation(size, repeat):
+    # Every tenth light is on and dim and every camera is on, so the infrared rule fires each tick
+    home = build_fleet(size)
+    for light in list(home.registry.of_type(SmartLight))[::10]:
+        light.turn_on()
+        light.set_brightness(30)
+    for cam in list(home.registry.of_type(SecurityCamera)):
+        cam.turn_on()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        home.run_simulation()
+    return repeat, time.perf_counter() - start
+
+
+def bench_check_and_start_recording(size, repeat):
+    # All lights and thermostats are off, so the first call turns on and records every camera
+    home = build_fleet(size)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        home.check_and_start_recording()
+    return repeat, time.perf_counter() - start
+
+
+def bench_camera_cascade(size, repeat):
+    # SecurityCamera.turn_on -> detect_motion -> start_recording for every camera
+    home = build_fleet(size)
+    cameras = list(home.registry.of_type(SecurityCamera))
+    start = time.perf_counter()
+    for cam in cameras:
+        cam.turn_on()
+    return len(cameras), time.perf_counter() - start
+
+
+def bench_state_changes(size, repeat):
+    # Toggle every light and thermostat on and back off, including the automation checks on turn_off
+    home = build_fleet(size)
+    lights = list(home.registry.of_type(SmartLight))
+    thermostats = list(home.registry.of_type(Thermostat))
+    start = time.perf_counter()
+    for _ in range(2):
+        for light in lights:
+            light.toggle_light()
+        for thermostat in thermostats:
+            thermostat.toggle_thermostat()
+    return 2 * (len(lights) + len(thermostats)), time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "add_device": bench_add_device,
+    "run_simulation": bench_run_simulation,
+    "check_and_start_recording": bench_check_and_start_recording,
+    "camera_cascade": bench_camera_cascade,
+    "state_changes": bench_state_changes,
+}
+
+
+def run_suite(sizes, repeat, selected):
+    """Runs the selected benchmarks at every size and returns a list of result records."""
+    results = []
+    for name in selected:
+        for size in sizes:
+            ops, seconds = BENCHMARKS[name](size, repeat)
+            result = {"benchmark": name, "size": size, "ops": ops, "seconds": seconds,
+                      "us_per_op": seconds / ops * 1e6 if ops else 0.0}
+            results.append(result)
+            print(f"{name:>26} {size:>9} {ops:>9} {seconds:>10.4f} {result['us_per_op']:>12.2f}", flush=True)
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Prints the change against a previous results file and returns the regressions found."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nComparison with {baseline_path} (regression threshold {threshold:.0%}):")
+    for result in results:
+        previous = baseline.get((result["benchmark"], result["size"]))
+        if previous is None or not previous["us_per_op"]:
+            continue
+        change = result["us_per_op"] / previous["us_per_op"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{result['benchmark']:>26} {result['size']:>9} {change:>+9.1%} {flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the automation core across fleet sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="fleet sizes")
+    parser.add_argument("--max-size", type=int, help="skip sizes above this")
+    parser.add_argument("--repeat", type=int, default=5, help="iterations for per-call benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    # Device logs are discarded so the suite measures automation work, not terminal output
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    sizes = [size for size in args.sizes if args.max_size is None or size <= args.max_size]
+    print(f"{'benchmark':>26} {'size':>9} {'ops':>9} {'seconds':>10} {'us/op':>12}")
+    results = run_suite(sizes, args.repeat, args.only)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
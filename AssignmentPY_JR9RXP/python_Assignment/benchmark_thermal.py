@@ -0,0 +1,97 @@
+# Benchmark for ThermalModel: cost of one vectorized step as the number of rooms grows, against
+# the same physics written as a per-room Python loop, plus a day of simulated rooms as a check.
+import argparse
+import math
+import os
+import random
+import time
+from AutomationSystem import AutomationSystem
+from DeviceStatus import DeviceStatus
+from EventLog import EventLog, set_log
+from ThermalModel import ThermalModel
+from Thermostat import Thermostat
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+
+def build_model(rooms, seed=0):
+    """Rooms with varied insulation and heaters; two thirds of the thermostats are on at 18-23 °C."""
+    rng = random.Random(seed)
+    home = AutomationSystem(rules=())
+    thermostats = []
+    for i in range(rooms):
+        thermostat = Thermostat(f"Thermostat{i}", home)
+        if i % 3:
+            thermostat._status = DeviceStatus.ON
+            thermostat.temperature = 18 + i % 6
+        thermostats.append(thermostat)
+    home.add_devices(thermostats)
+    model = ThermalModel(capacity=rooms)
+    for thermostat in thermostats:
+        model.add_room(thermostat, temperature=rng.uniform(8, 22), loss_rate=rng.uniform(1 / 10800, 1 / 3600),
+                       heater_power=rng.uniform(1 / 400, 1 / 150))
+    model.attach(home)
+    return home, model
+
+
+def python_step(states, dt, outdoor, hysteresis):
+    """The model's step for a list of [temperature, setpoint, enabled, heating, loss, power] rooms."""
+    for room in states:
+        temperature, setpoint, enabled, heating, loss, power = room
+        heating = enabled and (temperature < setpoint - hysteresis or (heating and temperature <= setpoint + hysteresis))
+        target = outdoor + (power / loss if heating else 0.0)
+        room[0] = target + (temperature - target) * math.exp(-loss * dt)
+        room[3] = heating
+
+
+def time_steps(step, dt, budget=0.5):
+    """Average seconds per call of step(dt), repeating for about `budget` seconds."""
+    step(dt)  # Warm up the scratch arrays and the decay cache
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        step(dt)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized thermal model.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="room counts")
+    parser.add_argument("--dt", type=float, default=60, help="simulated seconds per step")
+    args = parser.parse_args()
+
+    set_log(EventLog(stream=open(os.devnull, "w"), background=False))
+    print(f"{'rooms':>8} {'us/step':>10} {'us/1k rooms':>12} {'python us/1k':>13} {'speedup':>8}")
+    for size in args.sizes:
+        home, model = build_model(size)
+        per_step = time_steps(model.step, args.dt)
+        python_per_step = None
+        if size <= 100000:
+            rooms = model.rooms
+            states = [list(row) for row in zip(*(rooms.column(name).tolist() for name in
+                                                 ("temperature", "setpoint", "enabled", "heating", "loss_rate",
+                                                  "heater_power")))]
+            python_per_step = time_steps(lambda dt: python_step(states, dt, model.outdoor_temperature,
+                                                                model.hysteresis), args.dt, budget=1.0)
+        python_text = f"{python_per_step / size * 1e9:>13.1f} {python_per_step / per_step:>7.0f}x" \
+            if python_per_step else f"{'-':>13} {'-':>8}"
+        print(f"{size:>8} {per_step * 1e6:>10.1f} {per_step / size * 1e9:>12.2f} {python_text}")
+
+    # One simulated day of 1000 rooms: thermostats that are on should hold their setpoint
+    home, model = build_model(1000)
+    for _ in range(int(86400 / args.dt)):
+        model.step(args.dt)
+    on = [device for device in home.devices if device.status == "on"]
+    off = [device for device in home.devices if device.status == "off"]
+    error = sum(abs(device.room_temperature - device.temperature) for device in on) / len(on)
+    duty = sum(model.duty_cycle(device.device_id) for device in on) / len(on)
+    print(f"after 24h: rooms on are {error:.2f} °C from their setpoint on average with a {duty:.0%} heater duty "
+          f"cycle; rooms off average {sum(device.room_temperature for device in off) / len(off):.1f} °C "
+          f"(outdoor {model.outdoor_temperature:.0f} °C)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,16 @@ from SmartLight import SmartLight
 from Thermostat import Thermostat
 from SecurityCamera import SecurityCamera
 from AutomationSystem import AutomationSystem
+from Simulator import DiscreteEventSimulator
+from EventLog import EventLog, get_log, set_log
+from Metrics import get_metrics
+from StateStore import StateStore
+from FleetLoader import load_fleet
+from EventTrace import TraceRecorder
+from RecordingWriter import RecordingWriter
+import argparse
+import atexit
+import threading
 import time
 
 # Custom exception class for simulation errors
@@ -21,12 +31,55 @@ def run_simulation(automation_system):
     except Exception as e:
         raise SimulationError(f"Error during simulation: {e}")
 
+def run_event_driven(automation_system):
+    """Runs the automation system in event-driven mode until interrupted."""
+    try:
+        # Rules now run when devices report changes, so the main thread just waits
+        automation_system.enable_event_driven()
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("Event loop interrupted by user.")
+    except Exception as e:
+        raise SimulationError(f"Error during simulation: {e}")
+
+def run_discrete_event(automation_system, days, seed=None):
+    """Simulates the given number of days on a virtual clock, as fast as events can be processed."""
+    simulator = DiscreteEventSimulator(automation_system, seed=seed)
+    simulator.schedule_rule_ticks(5)  # Same 5 second rule tick as the real-time loop
+    simulator.schedule_random_activity(60)  # About one device action per minute
+    start = time.perf_counter()
+    events = simulator.run_for(days * 24 * 60 * 60)
+    elapsed = time.perf_counter() - start
+    get_log().flush()  # Device logs are buffered; write them out before the summary
+    print(f"Simulated {days} day(s), {events} events in {elapsed:.2f}s of wall-clock time.")
+
+async def run_async(automation_system, light=None, thermostat=None, camera=None):
+    """Runs the asyncio runtime, issuing the initial demo device commands concurrently."""
+    import asyncio
+    from AsyncRuntime import AsyncRuntime
+    runtime = AsyncRuntime(automation_system)
+    if light is not None:
+        # Commands to different devices overlap, so this takes one round trip instead of three
+        await asyncio.gather(
+            runtime.submit(light.device_id, "set_brightness", 40),
+            runtime.submit(thermostat.device_id, "turn_off"),
+            runtime.submit(camera.device_id, "turn_on"),
+        )
+    await runtime.run()
+
+def run_gui(automation_system, seed=None):
+    """Opens the GUI for the automation system; tkinter and the GUI modules are only imported here."""
+    from SmartHomeGUI import SmartHomeGUI
+    app = SmartHomeGUI(automation_system, seed=seed)
+    app.simulation_loop()
+    app.mainloop()
+
 def setup_devices(home_automation):
     """Sets up and adds devices to the automation system."""
     # Create instances of SmartLight, Thermostat, and SecurityCamera devices
-    light1 = SmartLight("Light1", home_automation)
-    thermostat1 = Thermostat("Thermostat1", home_automation)
-    camera1 = SecurityCamera("Camera1", home_automation)
+    light1 = home_automation.create_device(SmartLight, "Light1")
+    thermostat1 = home_automation.create_device(Thermostat, "Thermostat1")
+    camera1 = home_automation.create_device(SecurityCamera, "Camera1")
 
     # Add the created devices to the automation system
     home_automation.add_device(light1)
@@ -44,22 +97,103 @@ def simulate_device_behavior(light, thermostat, camera):
     thermostat.turn_off()
     camera.turn_on()
 
-def main():
+def parse_args():
+    """Parses command line options for the headless simulator."""
+    parser = argparse.ArgumentParser(description="Headless smart home automation simulator.")
+    parser.add_argument("--event-driven", action="store_true", help="react to device events instead of polling")
+    parser.add_argument("--simulate-days", type=float, help="run a discrete-event simulation for this many virtual days")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run the asyncio runtime with per-device polling")
+    parser.add_argument("--log-file", help="write device logs to this file instead of stdout")
+    parser.add_argument("--seed", type=int, help="random seed for the discrete-event simulation")
+    parser.add_argument("--fleet", help="JSON Lines or CSV file with the devices to load instead of the demo devices")
+    parser.add_argument("--load-only", action="store_true", help="load the devices, report the startup time and exit")
+    parser.add_argument("--gui", action="store_true", help="open the GUI instead of running headless")
+    parser.add_argument("--rules", help="JSON file with additional automation rules")
+    parser.add_argument("--columnar", action="store_true",
+                        help="keep device state in NumPy columns and evaluate the default rules vectorized")
+    parser.add_argument("--state-dir", help="directory to restore device state from and journal changes to")
+    parser.add_argument("--recording-dir", help="write a simulated frame per rule tick for every recording camera here")
+    parser.add_argument("--trace", help="record device commands, state changes and rule ticks to this file (see replay_trace.py)")
+    parser.add_argument("--metrics-file", help="write Prometheus-format metrics to this file on exit")
+    parser.add_argument("--metrics-socket", help="serve metrics on this Unix socket path, or on a localhost TCP port if numeric")
+    parser.add_argument("--profile", action="store_true", help="include sampling profiler results in the metrics")
+    return parser.parse_args()
+
+def main(event_driven=False, simulate_days=None, seed=None, use_async=False, rules_file=None, state_dir=None,
+         fleet_file=None, load_only=False, gui=False, trace_file=None, columnar=False,
+         recording_dir=None):
     try:
-        # Create an instance of the AutomationSystem
-        home_automation = AutomationSystem()
+        started = time.perf_counter()
+        # Create an instance of the AutomationSystem, with any extra rules from a file
+        store = None
+        if columnar:
+            from FleetStore import FleetStore  # Imports numpy, which is only worth it for the columnar mode
+            store = FleetStore()
+        home_automation = AutomationSystem(store=store)
+        if rules_file:
+            home_automation.rules.load_json(rules_file)
+
+        # Stream the devices from a fleet file, or set up and add the three demo devices
+        if fleet_file:
+            loaded = load_fleet(home_automation, fleet_file)
+            print(f"Loaded {loaded} device(s) from {fleet_file} in {time.perf_counter() - started:.3f}s.")
+            demo_devices = ()
+        else:
+            demo_devices = setup_devices(home_automation)
+
+        # Restore the state saved by a previous run and journal every change from now on
+        restored = 0
+        if state_dir:
+            state_store = StateStore(state_dir)
+            restored = state_store.restore(home_automation)
+            state_store.attach(home_automation)
+            atexit.register(state_store.close)
+            print(f"Restored the state of {restored} device(s) from {state_dir}.")
+
+        # Record everything that happens from here on, starting with the state of every device
+        if trace_file:
+            recorder = TraceRecorder(trace_file).attach(home_automation)
+            atexit.register(recorder.close)
+
+        # Recording cameras write simulated frames to rotating segment files
+        if recording_dir:
+            writer = RecordingWriter(recording_dir)
+            writer.attach(home_automation)
+            atexit.register(writer.close)
+
+        if load_only:
+            print(f"Startup took {time.perf_counter() - started:.3f}s for {len(home_automation.registry)} device(s).")
+            return
+        if gui:
+            run_gui(home_automation, seed)
+            return
 
-        # Set up and add devices to the automation system
-        light1, thermostat1, camera1 = setup_devices(home_automation)
+        # Discover devices in the automation system; a loaded fleet is too large to list
+        if demo_devices:
+            home_automation.discover_devices()
 
-        # Discover devices in the automation system
-        home_automation.discover_devices()
+        if use_async:
+            # Devices are commanded and polled from the asyncio runtime instead
+            if demo_devices:
+                demo_devices[0].turn_on()
+            import asyncio  # Only the asyncio runtime needs it; importing it costs headless startup time
+            try:
+                asyncio.run(run_async(home_automation, *demo_devices))
+            except KeyboardInterrupt:
+                print("Async runtime interrupted by user.")
+            return
 
-        # Simulate initial behavior for devices
-        simulate_device_behavior(light1, thermostat1, camera1)
+        # Simulate initial behavior for the demo devices, unless they continue from a saved state
+        if demo_devices and not restored:
+            simulate_device_behavior(*demo_devices)
 
-        # Run the simulation loop
-        run_simulation(home_automation)
+        # Run the simulation loop, a virtual-time simulation, or react to device events instead of polling
+        if simulate_days is not None:
+            run_discrete_event(home_automation, simulate_days, seed)
+        elif event_driven:
+            run_event_driven(home_automation)
+        else:
+            run_simulation(home_automation)
 
     except SimulationError as e:
         print(f"Simulation error: {e}")
@@ -67,4 +201,17 @@ def main():
         print(f"An unexpected error occurred: {general_error}")
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.log_file:
+        set_log(EventLog(path=args.log_file))
+    if args.metrics_file:
+        atexit.register(get_metrics().dump, args.metrics_file)
+    if args.metrics_socket:
+        address = ("127.0.0.1", int(args.metrics_socket)) if args.metrics_socket.isdigit() else args.metrics_socket
+        get_metrics().serve(address)
+    if args.profile:
+        get_metrics().start_profiler()
+    main(event_driven=args.event_driven, simulate_days=args.simulate_days, seed=args.seed, use_async=args.use_async,
+         rules_file=args.rules, state_dir=args.state_dir, fleet_file=args.fleet, load_only=args.load_only, gui=args.gui,
+         trace_file=args.trace, columnar=args.columnar,
+         recording_dir=args.recording_dir)
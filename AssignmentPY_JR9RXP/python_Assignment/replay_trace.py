@@ -0,0 +1,52 @@
+# Replays a trace recorded with `python main.py --trace FILE` into a headless automation system and
+# reports the achieved event rate, latency percentiles and any difference from the recorded end state.
+import argparse
+import os
+from EventLog import EventLog, set_log
+from EventTrace import TraceError, TraceReplayer
+
+
+def format_latencies(latencies):
+    return " ".join(f"p{point}={value * 1e6:.1f}us" if point != "max" else f"max={value * 1e6:.1f}us"
+                    for point, value in latencies.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded device event trace.")
+    parser.add_argument("trace", help="trace file written by main.py --trace")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="replay speed: 1 for the recorded pace, N for N times faster, 0 for as fast as possible")
+    parser.add_argument("--event-driven", action="store_true", help="replay into an event-driven automation system")
+    parser.add_argument("--rules", help="JSON file with additional automation rules")
+    parser.add_argument("--log-file", default=os.devnull, help="where device logs go (default: discarded)")
+    args = parser.parse_args()
+
+    set_log(EventLog(path=args.log_file, background=False))
+    replayer = TraceReplayer(args.trace, event_driven=args.event_driven)
+    if args.rules:
+        replayer.automation_system.rules.load_json(args.rules)
+    try:
+        report = replayer.run(speed=args.speed or None)
+    except TraceError as e:
+        raise SystemExit(f"Cannot replay: {e}")
+
+    pace = f"{args.speed:g}x" if args.speed else "max speed"
+    print(f"Replayed {report.events} events ({report.commands} commands, {report.ticks} rule ticks) "
+          f"at {pace} in {report.elapsed:.3f}s: {report.events_per_second:,.0f} events/s")
+    if args.speed:
+        print(f"Largest lag behind the recorded pace: {report.max_lag * 1000:.1f} ms")
+    for kind, latencies in report.latencies.items():
+        if latencies:
+            print(f"  {kind} latency: {format_latencies(latencies)}")
+    for name, quantiles in report.rule_latencies.items():
+        print(f"  rule {name}: {quantiles['count']} runs, p50<={quantiles[50] * 1e6:.0f}us p99<={quantiles[99] * 1e6:.0f}us")
+    if report.differences:
+        print(f"{len(report.differences)} device(s) differ from the recorded end state:")
+        for device_id, recorded, replayed in report.differences[:20]:
+            print(f"  {device_id}: recorded {recorded}, replayed {replayed}")
+    else:
+        print("End state matches the recording.")
+
+
+if __name__ == "__main__":
+    main()